@@ -0,0 +1,29 @@
+"""Add token_version to users for access token revocation
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17
+
+Changes:
+1. Add users.token_version; tokens carrying an older version are rejected
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'users',
+        sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,50 @@
+"""Add pg_trgm GIN indexes for product search
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17
+
+Changes:
+1. Enable the pg_trgm extension
+2. Add trigram GIN indexes on products name_th, name_en, sku and barcode so
+   ILIKE '%q%' and similarity searches stop scanning the whole table
+
+The indexes are built CONCURRENTLY, outside the migration transaction, so the
+products table stays writable while they build.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_COLUMNS = ('name_th', 'name_en', 'sku', 'barcode')
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    with op.get_context().autocommit_block():
+        for column in TRIGRAM_COLUMNS:
+            op.create_index(
+                f'ix_products_{column}_trgm',
+                'products',
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in TRIGRAM_COLUMNS:
+            op.drop_index(
+                f'ix_products_{column}_trgm',
+                table_name='products',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,67 @@
+"""Add indexes for keyset pagination of order and lot lists
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17
+
+Changes:
+1. Add (created_at, id) indexes on sales_orders, purchase_orders and
+   inventory_lots, matching the newest-first order of their list endpoints
+2. Add the same key behind the common list filters (order status, lot product
+   and warehouse) so filtered pages are index range scans too
+
+products.sku and customers.code already have unique indexes, which serve the
+product and customer lists.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+KEYSET_INDEXES = (
+    ('ix_sales_orders_created_at_id', 'sales_orders', ['created_at', 'id']),
+    ('ix_sales_orders_status_created_at_id', 'sales_orders', ['status', 'created_at', 'id']),
+    ('ix_purchase_orders_created_at_id', 'purchase_orders', ['created_at', 'id']),
+    (
+        'ix_purchase_orders_status_created_at_id',
+        'purchase_orders',
+        ['status', 'created_at', 'id'],
+    ),
+    ('ix_inventory_lots_created_at_id', 'inventory_lots', ['created_at', 'id']),
+    (
+        'ix_inventory_lots_product_id_created_at_id',
+        'inventory_lots',
+        ['product_id', 'created_at', 'id'],
+    ),
+    (
+        'ix_inventory_lots_warehouse_id_created_at_id',
+        'inventory_lots',
+        ['warehouse_id', 'created_at', 'id'],
+    ),
+)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in KEYSET_INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(KEYSET_INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,44 @@
+"""Add index for the terminal catalog feed
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17
+
+Changes:
+1. Add an expression index on products (coalesce(updated_at, created_at), id)
+   so GET /inventory/products/changes?since=... reads only the products changed
+   after the watermark, in order
+
+Built CONCURRENTLY, outside the migration transaction, so the products table
+stays writable while it builds.
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_products_changed_at',
+            'products',
+            [sa.text('coalesce(updated_at, created_at)'), 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_products_changed_at',
+            table_name='products',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -3,33 +3,114 @@ API Dependencies
 Common dependencies for API endpoints
 """
 
-from typing import Generator
+import asyncio
+from typing import AsyncGenerator, Callable, Coroutine, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
+from app.core import statements
 from app.core.config import settings
-from app.core.database import SessionLocal
+from app.core.database import (
+    cancel_running_query,
+    get_db,
+    get_read_db,
+    set_statement_timeout,
+)
+from app.core.metrics import registry
+from app.core.principals import Principal, principal_cache
+from app.core.refresh_tokens import refresh_token_families
+from app.core.resource_versions import matches, not_modified, resource_versions
 from app.core.security import decode_token
-from app.models.user import User, UserRole
+from app.models.user import UserRole
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/auth/login")
 
+# How often report requests check whether the client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
 
-def get_db() -> Generator:
-    """Get database session"""
-    db = SessionLocal()
+queries_cancelled = registry.counter(
+    "db_queries_cancelled_total", "Report queries cancelled because the client disconnected"
+)
+
+
+def statement_timeout_for(route_name: str) -> int:
+    """Statement timeout in milliseconds for a report route"""
+    return settings.STATEMENT_TIMEOUT_OVERRIDES_MS.get(
+        route_name, settings.REPORT_STATEMENT_TIMEOUT_MS
+    )
+
+
+async def _cancel_on_disconnect(request: Request, dbapi_connection) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    cancel_running_query(dbapi_connection)
+    queries_cancelled.inc(route=request.scope["route"].path)
+
+
+async def get_report_db(
+    request: Request, db: Session = Depends(get_read_db)
+) -> AsyncGenerator[Session, None]:
+    """Read session for heavy reports
+
+    Applies the route's statement timeout and cancels the running query on the
+    server if the client disconnects before the report is done. Routes using it
+    must be declared with ``ReportRoute``, which stops the watcher once the
+    endpoint returns.
+    """
+    route_name = request.scope["route"].name
+    await run_in_threadpool(set_statement_timeout, db, statement_timeout_for(route_name))
+    connection = await run_in_threadpool(db.connection)
+
+    watcher = asyncio.create_task(
+        _cancel_on_disconnect(request, connection.connection.dbapi_connection)
+    )
+    request.state.disconnect_watcher = watcher
     try:
         yield db
     finally:
-        db.close()
+        watcher.cancel()
+
+
+class ReportRoute(APIRoute):
+    """Route that stops the disconnect watcher before the response is sent
+
+    Dependency teardown only runs after the response has gone out, and by then
+    the client hanging up is no reason to cancel anything; the watcher would
+    see that disconnect and count a finished report as cancelled.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[None, None, Response]]:
+        handler = super().get_route_handler()
+
+        async def report_handler(request: Request) -> Response:
+            try:
+                return await handler(request)
+            finally:
+                watcher = getattr(request.state, "disconnect_watcher", None)
+                if watcher is not None:
+                    watcher.cancel()
+
+        return report_handler
+
+
+def _load_principal(db: Session, email: str) -> Optional[Principal]:
+    user = db.scalars(statements.user_by_email(email)).first()
+    return Principal.from_user(user) if user is not None else None
 
 
 async def get_current_user(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
-    """Get current authenticated user"""
+) -> Principal:
+    """Get current authenticated user
+
+    Authorizes from the token claims. The user's current token version comes from
+    the principal cache; the users row is only loaded on a cache miss. Revoked
+    token families are checked against the local revocation filter.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -44,19 +125,64 @@ async def get_current_user(
     if email is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
+    current = principal_cache.get(email)
+    if current is None:
+        # Sync session: keep the query off the event loop
+        current = await run_in_threadpool(_load_principal, db, email)
+        if current is None:
+            raise credentials_exception
+        principal_cache.put(email, current)
 
-    if not user.is_active:
+    if not current.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
 
-    return user
+    # Tokens issued before the last version bump are revoked
+    if payload.get("ver", 0) != current.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Families revoked for refresh token reuse; the local filter answers most checks
+    family = payload.get("fam")
+    revocations = refresh_token_families.revocations
+    if family is not None and revocations.needs_lookup(family):
+        if await run_in_threadpool(revocations.is_revoked, family):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    return Principal.from_claims(payload) or current
+
+
+def conditional_get(resource: str):
+    """Dependency answering 304 when the client already has the current list
+
+    Declare it after the auth dependency so unauthenticated requests never get a
+    304. On a miss the response carries the ETag of the current version. With
+    read replicas, a list read within replication lag of a write can carry the
+    new version's tag; it is corrected by the next write.
+    """
+
+    def dependency(request: Request, response: Response) -> None:
+        etag = resource_versions.etag(resource, request.url.path, request.url.query)
+        if etag is None:
+            return
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if matches(request.headers.get("if-none-match"), etag):
+            not_modified.inc(resource=resource)
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
 
 
 def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
@@ -66,7 +192,7 @@ def get_current_active_user(
 def require_role(*required_roles: UserRole):
     """Dependency to check if user has required role"""
 
-    def role_checker(current_user: User = Depends(get_current_active_user)) -> User:
+    def role_checker(current_user: Principal = Depends(get_current_active_user)) -> Principal:
         if current_user.role not in required_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions"
@@ -77,14 +203,14 @@ def require_role(*required_roles: UserRole):
 
 
 # Role-specific dependencies
-def get_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+def get_admin_user(current_user: Principal = Depends(get_current_active_user)) -> Principal:
     """Require admin role"""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return current_user
 
 
-def get_manager_or_admin(current_user: User = Depends(get_current_active_user)) -> User:
+def get_manager_or_admin(current_user: Principal = Depends(get_current_active_user)) -> Principal:
     """Require manager or admin role"""
     if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
         raise HTTPException(
@@ -93,7 +219,9 @@ def get_manager_or_admin(current_user: User = Depends(get_current_active_user))
     return current_user
 
 
-def get_pharmacist_or_above(current_user: User = Depends(get_current_active_user)) -> User:
+def get_pharmacist_or_above(
+    current_user: Principal = Depends(get_current_active_user),
+) -> Principal:
     """Require pharmacist, manager, or admin role"""
     if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER, UserRole.PHARMACIST]:
         raise HTTPException(
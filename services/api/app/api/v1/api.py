@@ -4,6 +4,7 @@ from app.api.v1.endpoints import (
     auth,
     categories,
     customers,
+    internal,
     inventory,
     products,
     purchase,
@@ -26,3 +27,4 @@ api_router.include_router(purchase.router, prefix="/purchase", tags=["Purchase"]
 api_router.include_router(suppliers.router, prefix="/purchase/suppliers", tags=["Suppliers"])
 api_router.include_router(customers.router, prefix="/customers", tags=["Customers"])
 api_router.include_router(reports.router, prefix="/reports", tags=["Reports"])
+api_router.include_router(internal.router, prefix="/internal", tags=["Internal"])
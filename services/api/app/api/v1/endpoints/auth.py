@@ -1,17 +1,19 @@
 from typing import Any, cast
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, get_db
-from app.core.security import (
-    create_access_token,
-    create_refresh_token,
-    decode_token,
-    get_password_hash,
-    verify_password,
-)
+from app.core import statements
+from app.core.database import get_async_db
+from app.core.hashing import password_hasher
+from app.core.principals import Principal
+from app.core.rate_limit import login_throttle
+from app.core.refresh_tokens import Rotation, refresh_token_families
+from app.core.security import create_access_token, create_refresh_token, decode_token, token_claims
 from app.models.user import User
 from app.schemas.auth import RefreshTokenRequest, Token, UserCreate, UserResponse
 
@@ -19,10 +21,13 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_in: UserCreate, db: Session = Depends(get_db)) -> Any:
-    """Register new user"""
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)) -> Any:
+    """Register new user
+
+    bcrypt runs on the password hashing pool; a full pool answers 503.
+    """
     # Check if user exists
-    user = db.query(User).filter(User.email == user_in.email).first()
+    user = (await db.scalars(statements.user_by_email(user_in.email))).first()
     if user:
         raise HTTPException(
             status_code=400,
@@ -32,23 +37,44 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)) -> Any:
     # Create new user
     user = User(
         email=user_in.email,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await password_hasher.hash(user_in.password),
         full_name=user_in.full_name,
         role=user_in.role,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
 
     return user
 
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> Any:
-    """OAuth2 compatible token login"""
-    user = db.query(User).filter(User.email == form_data.username).first()
+async def login(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+) -> Any:
+    """OAuth2 compatible token login
+
+    Attempts are throttled per client IP and per account before any hashing
+    (429). bcrypt runs on the password hashing pool; a full pool answers 503, as
+    does an unreachable refresh token store.
+    """
+    # Behind a trusted proxy (FORWARDED_ALLOW_IPS) the server has already replaced
+    # the peer with the address from X-Forwarded-For
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = await run_in_threadpool(login_throttle.check, form_data.username, client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts. Please wait before trying again.",
+            headers={"Retry-After": str(retry_after)},
+        )
 
-    if not user or not verify_password(form_data.password, cast(str, user.password_hash)):
+    user = (await db.scalars(statements.user_by_email(form_data.username))).first()
+
+    if not user or not await password_hasher.verify(
+        form_data.password, cast(str, user.password_hash)
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -57,9 +83,11 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
-    # Create tokens
-    access_token = create_access_token(data={"sub": user.email})
-    refresh_token = create_refresh_token(data={"sub": user.email})
+    # Create tokens; every login starts a new refresh token family
+    family, token_id = await run_in_threadpool(refresh_token_families.start)
+    claims = {**token_claims(user), "fam": family}
+    access_token = create_access_token(data=claims)
+    refresh_token = create_refresh_token(data={**claims, "jti": token_id})
 
     return {
         "access_token": access_token,
@@ -70,7 +98,12 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 @router.post("/refresh", response_model=Token)
 def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)) -> Any:
-    """Refresh access token"""
+    """Refresh access token
+
+    Rotates the refresh token. Presenting one that was already rotated revokes
+    its whole family, access tokens included. An unreachable refresh token store
+    answers 503.
+    """
     payload = decode_token(request.refresh_token)
     if not payload or payload.get("type") != "refresh":
         raise HTTPException(
@@ -79,7 +112,7 @@ def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)) -
         )
 
     email = payload.get("sub")
-    user = db.query(User).filter(User.email == email).first()
+    user = db.scalars(statements.user_by_email(email)).first()
 
     if not user or not user.is_active:
         raise HTTPException(
@@ -87,9 +120,35 @@ def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)) -
             detail="User not found or inactive",
         )
 
+    # Refresh always checks the token version against the database
+    if payload.get("ver", 0) != user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token has been revoked",
+        )
+
+    # Rotate: only the family's latest refresh token may be used, once
+    family, token_id = payload.get("fam"), payload.get("jti")
+    if family is None or token_id is None:
+        # Issued before rotation existed; move it onto a family of its own
+        family, next_token_id = refresh_token_families.start()
+    else:
+        rotation, next_token_id = refresh_token_families.rotate(family, token_id)
+        if rotation is Rotation.REUSED:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token reuse detected; please sign in again",
+            )
+        if rotation is Rotation.UNKNOWN:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token has been revoked",
+            )
+
     # Create new tokens
-    access_token = create_access_token(data={"sub": user.email})
-    new_refresh_token = create_refresh_token(data={"sub": user.email})
+    claims = {**token_claims(user), "fam": family}
+    access_token = create_access_token(data=claims)
+    new_refresh_token = create_refresh_token(data={**claims, "jti": next_token_id})
 
     return {
         "access_token": access_token,
@@ -99,6 +158,11 @@ def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)) -
 
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)) -> Any:
+def get_me(
+    current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)
+) -> Any:
     """Get current user information"""
-    return current_user
+    user = db.scalars(statements.user_by_email(current_user.email)).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
@@ -4,12 +4,20 @@ Categories API endpoints
 
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_current_active_user, get_db, get_manager_or_admin
+from app.api.deps import (
+    conditional_get,
+    get_current_active_user,
+    get_db,
+    get_manager_or_admin,
+)
+from app.core.database import get_read_db
+from app.core.pagination import TotalMode, count_total, paginate
+from app.core.principals import Principal
+from app.core.resource_versions import CATEGORIES, resource_versions
 from app.models.product import Category
-from app.models.user import User
 from app.schemas.category import (
     CategoryCreate,
     CategoryList,
@@ -24,21 +32,23 @@ router = APIRouter()
 def get_categories(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    total_mode: TotalMode = Query("exact", alias="total"),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get(CATEGORIES)),
 ) -> Any:
-    """Get all categories"""
+    """Get all categories; ``total=estimate`` or ``total=none`` skip the exact count"""
     query = db.query(Category).filter(Category.is_active)
-    total = query.count()
-    categories = query.offset(skip).limit(limit).all()
-    return {"items": categories, "total": total}
+    total = count_total(query, total_mode)
+    page = paginate(query, None, None, skip, limit)
+    return {"items": page.items, "total": total, "has_more": page.has_more}
 
 
 @router.post("/", response_model=CategoryResponse)
 def create_category(
     category_data: CategoryCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_manager_or_admin),
+    current_user: Principal = Depends(get_manager_or_admin),
 ) -> Any:
     """Create new category"""
     # Check if code exists
@@ -55,7 +65,7 @@ def create_category(
     category = Category(**category_data.model_dump())
     db.add(category)
     db.commit()
-    db.refresh(category)
+    resource_versions.bump(CATEGORIES)
 
     return category
 
@@ -64,7 +74,7 @@ def create_category(
 def get_category(
     category_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Get category by ID"""
     category = db.query(Category).filter(Category.id == category_id).first()
@@ -78,7 +88,7 @@ def update_category(
     category_id: str,
     category_data: CategoryUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_manager_or_admin),
+    current_user: Principal = Depends(get_manager_or_admin),
 ) -> Any:
     """Update category"""
     category = db.query(Category).filter(Category.id == category_id).first()
@@ -102,7 +112,7 @@ def update_category(
         setattr(category, field, value)
 
     db.commit()
-    db.refresh(category)
+    resource_versions.bump(CATEGORIES)
 
     return category
 
@@ -111,7 +121,7 @@ def update_category(
 def delete_category(
     category_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_manager_or_admin),
+    current_user: Principal = Depends(get_manager_or_admin),
 ) -> Any:
     """Delete (deactivate) category"""
     category = db.query(Category).filter(Category.id == category_id).first()
@@ -129,5 +139,6 @@ def delete_category(
     # Soft delete
     category.is_active = False
     db.commit()
+    resource_versions.bump(CATEGORIES)
 
     return {"message": "Category deleted successfully"}
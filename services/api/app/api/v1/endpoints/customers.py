@@ -9,8 +9,10 @@ from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_active_user, get_db
+from app.core.database import get_read_db
+from app.core.pagination import Keyset, TotalMode, count_total, paginate
+from app.core.principals import Principal
 from app.models.customer import Customer
-from app.models.user import User
 from app.schemas.customer import (
     CustomerCreate,
     CustomerList,
@@ -20,16 +22,24 @@ from app.schemas.customer import (
 
 router = APIRouter()
 
+CUSTOMER_KEYSET = Keyset("customers", Customer.code)
+
 
 @router.get("/", response_model=CustomerList)
 def get_customers(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = Query("exact", alias="total"),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
-    """Get all customers"""
+    """Get all customers, ordered by code
+
+    Pass the returned ``next_cursor`` as ``cursor`` to page without OFFSET.
+    ``total=estimate`` or ``total=none`` skip the exact count.
+    """
     query = db.query(Customer).filter(Customer.is_active)
 
     if search:
@@ -42,17 +52,22 @@ def get_customers(
             )
         )
 
-    total = query.count()
-    customers = query.offset(skip).limit(limit).all()
+    total = count_total(query, total_mode)
+    page = paginate(query, CUSTOMER_KEYSET, cursor, skip, limit)
 
-    return {"items": customers, "total": total}
+    return {
+        "items": page.items,
+        "total": total,
+        "next_cursor": page.next_cursor,
+        "has_more": page.has_more,
+    }
 
 
 @router.post("/", response_model=CustomerResponse)
 def create_customer(
     customer_data: CustomerCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Create new customer"""
     # Check if code exists
@@ -63,7 +78,6 @@ def create_customer(
     customer = Customer(**customer_data.model_dump())
     db.add(customer)
     db.commit()
-    db.refresh(customer)
 
     return customer
 
@@ -72,8 +86,8 @@ def create_customer(
 def search_customers(
     q: str = Query(..., min_length=1),
     limit: int = 20,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Quick search customers"""
     customers = (
@@ -97,7 +111,7 @@ def search_customers(
 def get_customer(
     customer_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Get customer by ID"""
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
@@ -111,7 +125,7 @@ def update_customer(
     customer_id: str,
     customer_data: CustomerUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Update customer"""
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
@@ -124,7 +138,6 @@ def update_customer(
         setattr(customer, field, value)
 
     db.commit()
-    db.refresh(customer)
 
     return customer
 
@@ -133,7 +146,7 @@ def update_customer(
 def delete_customer(
     customer_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Delete (deactivate) customer"""
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
@@ -152,7 +165,7 @@ def update_loyalty_points(
     customer_id: str,
     points_change: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Update customer loyalty points"""
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
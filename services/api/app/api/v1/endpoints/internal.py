@@ -0,0 +1,24 @@
+"""
+Internal operations API endpoints
+"""
+
+from typing import Any
+
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_admin_user
+from app.core.db_metrics import pool_status
+from app.core.metrics import registry
+from app.core.principals import Principal
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics(current_user: Principal = Depends(get_admin_user)) -> Any:
+    """Get in-process metrics for this worker (admin only)
+
+    Includes connection pool saturation and checkout-wait / connection-lifetime
+    histograms for sizing the pool per worker.
+    """
+    return {"pools": pool_status(), "metrics": registry.snapshot()}
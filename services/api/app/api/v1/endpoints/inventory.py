@@ -1,13 +1,14 @@
 from datetime import datetime, timedelta
-from typing import Any
+from typing import Any, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 
 from app.api.v1.endpoints.auth import get_current_user
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
+from app.core.pagination import Keyset, TotalMode, count_total, paginate
+from app.core.principals import Principal
 from app.models.inventory import InventoryLot
-from app.models.user import User
 from app.schemas.inventory import (
     ExpiringLotsResponse,
     InventoryAdjustmentResponse,
@@ -17,6 +18,8 @@ from app.schemas.inventory import (
 
 router = APIRouter()
 
+LOT_KEYSET = Keyset("inventory_lots", InventoryLot.created_at, InventoryLot.id, descending=True)
+
 
 @router.get("/", response_model=InventoryLotList)
 def get_inventory_lots(
@@ -24,10 +27,16 @@ def get_inventory_lots(
     limit: int = 100,
     product_id: str = None,
     warehouse_id: str = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = Query("exact", alias="total"),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
-    """Get all inventory lots with product, warehouse, and supplier details"""
+    """Get all inventory lots with product, warehouse, and supplier details
+
+    Newest lots first. Pass the returned ``next_cursor`` as ``cursor`` to page
+    without OFFSET. ``total=estimate`` or ``total=none`` skip the exact count.
+    """
     query = db.query(InventoryLot).options(
         joinedload(InventoryLot.product),
         joinedload(InventoryLot.warehouse),
@@ -40,19 +49,22 @@ def get_inventory_lots(
     if warehouse_id:
         query = query.filter(InventoryLot.warehouse_id == warehouse_id)
 
-    total = query.count()
-    lots = query.offset(skip).limit(limit).all()
+    total = count_total(query, total_mode)
+    page = paginate(query, LOT_KEYSET, cursor, skip, limit)
 
     return InventoryLotList(
-        items=[InventoryLotResponse.model_validate(lot) for lot in lots], total=total
+        items=[InventoryLotResponse.model_validate(lot) for lot in page.items],
+        total=total,
+        next_cursor=page.next_cursor,
+        has_more=page.has_more,
     )
 
 
 @router.get("/expiring", response_model=ExpiringLotsResponse)
 def get_expiring_lots(
     days: int = Query(default=30, ge=1, le=365),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Get lots expiring within specified days with product details"""
     expiry_threshold = datetime.now().date() + timedelta(days=days)
@@ -83,7 +95,7 @@ def adjust_inventory(
     quantity_change: int,
     reason: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Adjust inventory quantity"""
     lot = db.query(InventoryLot).filter(InventoryLot.id == lot_id).first()
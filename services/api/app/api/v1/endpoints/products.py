@@ -1,17 +1,55 @@
 from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import or_
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
 
+from app.api.deps import conditional_get, get_manager_or_admin
 from app.api.v1.endpoints.auth import get_current_user
-from app.core.database import get_db
+from app.core import database, statements
+from app.core.database import get_async_db, get_db, get_read_db
+from app.core.pagination import Keyset, TotalMode, count_total, paginate
+from app.core.principals import Principal
+from app.core.product_index import IndexedProduct, product_code_index
+from app.core.resource_versions import PRODUCTS, resource_versions
 from app.models.product import Product
-from app.models.user import User
-from app.schemas.product import ProductCreate, ProductList, ProductResponse, ProductUpdate
+from app.schemas.product import (
+    ProductCreate,
+    ProductImportResult,
+    ProductList,
+    ProductRepriceRequest,
+    ProductRepriceResult,
+    ProductResponse,
+    ProductScanRecord,
+    ProductUpdate,
+)
+from app.services import product_repricing, product_sync
+from app.services.ngram_search import product_search_index
+from app.services.product_import import ImportFileError, ProductImporter, read_rows
+from app.services.product_search import apply_search, match_condition, rank_order
 
 router = APIRouter()
 
+PRODUCT_KEYSET = Keyset("products", Product.sku)
+
+
+def _index_product(product: Product) -> None:
+    """Bring this worker's in-process product indexes up to date after a write"""
+    product_code_index.put(product)
+    product_search_index.put(product)
+
 
 @router.get("/", response_model=ProductList)
 def get_products(
@@ -21,22 +59,26 @@ def get_products(
     category_id: Optional[str] = None,
     drug_type: Optional[str] = None,
     is_active: bool = True,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = Query("exact", alias="total"),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+    _etag: None = Depends(conditional_get(PRODUCTS)),
 ) -> Any:
-    """Get all products with filters"""
+    """Get all products with filters
+
+    Listed by SKU; pass the returned ``next_cursor`` as ``cursor`` to page
+    without OFFSET. A ``search`` without a cursor ranks best matches first and
+    pages with ``skip``. ``total=estimate`` or ``total=none`` skip the exact
+    count.
+    """
     query = db.query(Product)
+    dialect_name = db.get_bind().dialect.name
 
     # Apply filters
     if search:
-        query = query.filter(
-            or_(
-                Product.name_th.ilike(f"%{search}%"),
-                Product.name_en.ilike(f"%{search}%"),
-                Product.sku.ilike(f"%{search}%"),
-                Product.barcode.ilike(f"%{search}%"),
-            )
-        )
+        search = search.strip()
+        query = query.filter(match_condition(search, dialect_name))
 
     if category_id:
         query = query.filter(Product.category_id == category_id)
@@ -48,74 +90,217 @@ def get_products(
         query = query.filter(Product.is_active == is_active)
 
     # Get total count
-    total = query.count()
+    total = count_total(query, total_mode)
 
     # Apply pagination
-    products = query.offset(skip).limit(limit).all()
+    if search and not cursor:
+        page = paginate(query.order_by(*rank_order(search, dialect_name)), None, None, skip, limit)
+    else:
+        page = paginate(query, PRODUCT_KEYSET, cursor, skip, limit)
 
-    return {"items": products, "total": total, "skip": skip, "limit": limit}
+    return {
+        "items": page.items,
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": page.next_cursor,
+        "has_more": page.has_more,
+    }
+
+
+async def _search(db: AsyncSession, q: str, limit: int) -> List[Product]:
+    statement = apply_search(
+        select(Product).where(Product.is_active), q, db.get_bind().dialect.name
+    )
+    return list(await db.scalars(statement.limit(limit)))
 
 
 @router.get("/search", response_model=List[ProductResponse])
-def search_products(
+async def search_products(
     q: str = Query(..., min_length=1),
     limit: int = 20,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """Quick search products by name, SKU, or barcode
+
+    Exact SKU/barcode matches come first, then names ranked by similarity.
+    """
+    return await _search(db, q, limit)
+
+
+@router.get(
+    "/search/ngram",
+    response_class=Response,
+    responses={
+        200: {
+            "model": List[ProductResponse],
+            "description": "Matching products, best first",
+        }
+    },
+)
+async def search_products_ngram(
+    q: str = Query(..., min_length=1),
+    limit: int = 20,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
-    """Quick search products by name, SKU, or barcode"""
-    products = (
-        db.query(Product)
-        .filter(
-            Product.is_active,
-            or_(
-                Product.name_th.ilike(f"%{q}%"),
-                Product.name_en.ilike(f"%{q}%"),
-                Product.sku.ilike(f"%{q}%"),
-                Product.barcode.ilike(f"%{q}%"),
-            ),
-        )
-        .limit(limit)
-        .all()
+    """Search names, generic names and active ingredients in the n-gram index
+
+    Ranked in this worker's index without a database round trip. The index keeps
+    each product's ProductResponse JSON, so the body is joined from those bytes
+    instead of going through a response_model. Queries shorter than two
+    characters, or a worker without the index, use the database search.
+    """
+    if not product_search_index.ready or len(q.strip()) < 2:
+        bodies = [
+            ProductResponse.model_validate(product).model_dump_json().encode()
+            for product in await _search(db, q, limit)
+        ]
+        return Response(content=b"[" + b",".join(bodies) + b"]", media_type="application/json")
+
+    background = None
+    if product_search_index.needs_refresh():
+        background = BackgroundTask(product_search_index.refresh, database.engine)
+    bodies = product_search_index.search(q, limit)
+    return Response(
+        content=b"[" + b",".join(bodies) + b"]",
+        media_type="application/json",
+        background=background,
     )
 
-    return products
+
+@router.get("/barcode/{code}", response_model=ProductScanRecord)
+async def get_product_by_barcode(
+    code: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """Get active product by exact barcode, or by SKU for items without one (POS scan)
+
+    Served from the in-process code index; a miss falls back to the unique
+    barcode/SKU indexes and fills the index.
+    """
+    body = product_code_index.get(code)
+    if body is None:
+        product = await db.scalar(statements.active_product_by_code(code))
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        product_code_index.put(product)
+        body = IndexedProduct.from_product(product).body
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/changes")
+async def get_product_changes(
+    since: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """Catalog feed for terminals' local product cache, as NDJSON
+
+    The first line is ``{"watermark": ..., "snapshot": ...}``; each further line
+    is a ProductSyncRecord. Omit ``since`` for a snapshot of all active
+    products; afterwards pass the last watermark to get only the products
+    created, changed or deactivated since.
+    """
+    try:
+        since_at = product_sync.parse_watermark(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid watermark")
+    return StreamingResponse(
+        product_sync.stream_changes(since_at), media_type="application/x-ndjson"
+    )
 
 
 @router.post("/", response_model=ProductResponse, status_code=201)
 def create_product(
     product_in: ProductCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Create new product"""
     # Check if SKU exists
-    existing = db.query(Product).filter(Product.sku == product_in.sku).first()
+    existing = db.scalars(statements.product_by_sku(product_in.sku)).first()
     if existing:
         raise HTTPException(status_code=400, detail="SKU already exists")
 
     # Check if barcode exists
     if product_in.barcode:
-        existing = db.query(Product).filter(Product.barcode == product_in.barcode).first()
+        existing = db.scalars(statements.product_by_barcode(product_in.barcode)).first()
         if existing:
             raise HTTPException(status_code=400, detail="Barcode already exists")
 
     product = Product(**product_in.model_dump())
     db.add(product)
     db.commit()
-    db.refresh(product)
+    _index_product(product)
+    resource_versions.bump(PRODUCTS)
 
     return product
 
 
+@router.post("/import", response_model=ProductImportResult)
+def import_products(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_manager_or_admin),
+) -> Any:
+    """Bulk-create products from a CSV (UTF-8) or XLSX sheet
+
+    The header row names ProductCreate fields; ``sku`` and ``name_th`` are
+    required. Valid rows with a new SKU and barcode are created; every other
+    row is reported with its row number and reason.
+    """
+    try:
+        result = ProductImporter(db).run(read_rows(file.file, file.filename or ""))
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+
+    if result.created:
+        resource_versions.bump(PRODUCTS)
+        # New products reach the code index on their first scan
+        if product_search_index.ready:
+            background_tasks.add_task(product_search_index.refresh, database.engine)
+    return result
+
+
+@router.post("/reprice", response_model=ProductRepriceResult)
+def reprice_products(
+    request: ProductRepriceRequest,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_manager_or_admin),
+) -> Any:
+    """Change prices or VAT of every product matching a filter at once
+
+    Runs as a single UPDATE in one transaction; ``dry_run`` returns the same
+    result without writing.
+    """
+    skipped = product_repricing.count_skipped(db, request)
+    if request.dry_run:
+        items = product_repricing.preview(db, request)
+        return {"dry_run": True, "matched": len(items), "skipped": skipped, "items": items}
+
+    items = product_repricing.apply(db, request)
+    db.commit()
+
+    if items:
+        resource_versions.bump(PRODUCTS)
+        products = db.scalars(select(Product).where(Product.id.in_([p.id for p in items]))).all()
+        product_code_index.load(products)
+        product_search_index.put_many(products)
+    return {"dry_run": False, "matched": len(items), "skipped": skipped, "items": items}
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 def get_product(
     product_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Get product by ID"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.scalars(statements.product_by_id(product_id)).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -126,10 +311,10 @@ def update_product(
     product_id: str,
     product_in: ProductUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Update product"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.scalars(statements.product_by_id(product_id)).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
@@ -138,7 +323,8 @@ def update_product(
         setattr(product, field, value)
 
     db.commit()
-    db.refresh(product)
+    _index_product(product)
+    resource_versions.bump(PRODUCTS)
 
     return product
 
@@ -147,14 +333,16 @@ def update_product(
 def delete_product(
     product_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Soft delete product"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.scalars(statements.product_by_id(product_id)).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
     product.is_active = False
     db.commit()
+    _index_product(product)
+    resource_versions.bump(PRODUCTS)
 
     return {"message": "Product deleted successfully"}
@@ -1,15 +1,16 @@
 from datetime import date, datetime
 from decimal import Decimal
-from typing import Any
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.api.v1.endpoints.auth import get_current_user
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
+from app.core.pagination import Keyset, TotalMode, count_total, paginate
+from app.core.principals import Principal
 from app.models.inventory import InventoryLot, QualityStatus
 from app.models.purchase import PurchaseOrder, PurchaseOrderItem, PurchaseOrderStatus
-from app.models.user import User
 from app.schemas.purchase import (
     PurchaseOrderCreate,
     PurchaseOrderList,
@@ -20,27 +21,39 @@ from app.schemas.purchase import (
 
 router = APIRouter()
 
+PURCHASE_ORDER_KEYSET = Keyset(
+    "purchase_orders", PurchaseOrder.created_at, PurchaseOrder.id, descending=True
+)
+
 
 @router.get("/orders/", response_model=PurchaseOrderList)
 def get_purchase_orders(
     skip: int = 0,
     limit: int = 100,
     status: str = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = Query("exact", alias="total"),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
-    """Get all purchase orders"""
+    """Get all purchase orders, newest first
+
+    Pass the returned ``next_cursor`` as ``cursor`` to page without OFFSET.
+    ``total=estimate`` or ``total=none`` skip the exact count.
+    """
     query = db.query(PurchaseOrder)
 
     if status:
         query = query.filter(PurchaseOrder.status == status)
 
-    total = query.count()
-    orders = query.offset(skip).limit(limit).all()
+    total = count_total(query, total_mode)
+    page = paginate(query, PURCHASE_ORDER_KEYSET, cursor, skip, limit)
 
     return PurchaseOrderList(
-        items=[PurchaseOrderResponse.model_validate(order) for order in orders],
+        items=[PurchaseOrderResponse.model_validate(order) for order in page.items],
         total=total,
+        next_cursor=page.next_cursor,
+        has_more=page.has_more,
     )
 
 
@@ -48,7 +61,7 @@ def get_purchase_orders(
 def create_purchase_order(
     order_data: PurchaseOrderCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Create new purchase order"""
     # Generate PO number
@@ -95,7 +108,6 @@ def create_purchase_order(
         db.add(item)
 
     db.commit()
-    db.refresh(order)
 
     return PurchaseOrderResponse.model_validate(order)
 
@@ -105,7 +117,7 @@ def receive_purchase_order(
     order_id: str,
     receiving_data: ReceivePurchaseOrderRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Receive purchase order and create inventory lots"""
     order = db.query(PurchaseOrder).filter(PurchaseOrder.id == order_id).first()
@@ -136,7 +148,9 @@ def receive_purchase_order(
         if hasattr(po_item, "is_vat_included") and po_item.is_vat_included:
             # ถ้ารวม VAT แล้ว หารออกเพื่อได้ราคาก่อน VAT
             vat_rate = po_item.vat_rate if hasattr(po_item, "vat_rate") else Decimal("7.00")
-            unit_cost = po_item.unit_price / (Decimal("1") + Decimal(str(vat_rate)) / Decimal("100"))
+            unit_cost = po_item.unit_price / (
+                Decimal("1") + Decimal(str(vat_rate)) / Decimal("100")
+            )
 
         lot = InventoryLot(
             product_id=item_data.product_id,
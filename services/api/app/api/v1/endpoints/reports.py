@@ -4,23 +4,24 @@ from typing import Any
 from fastapi import APIRouter, Depends, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy import and_, func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
+from app.api.deps import ReportRoute, get_report_db
 from app.api.v1.endpoints.auth import get_current_user
-from app.core.database import get_db
+from app.core.principals import Principal
+from app.core.query_budget import query_budget
 from app.models.inventory import InventoryLot
 from app.models.product import Product
 from app.models.purchase import PurchaseOrder, PurchaseOrderStatus
 from app.models.sales import OrderStatus, SalesOrder, SalesOrderItem
-from app.models.user import User
 from app.services.export_service import ExcelExportService, PDFExportService
 
-router = APIRouter()
+router = APIRouter(route_class=ReportRoute)
 
 
 @router.get("/dashboard-summary")
 def get_dashboard_summary(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_report_db), current_user: Principal = Depends(get_current_user)
 ) -> Any:
     """Get dashboard summary statistics"""
     # Today's sales
@@ -69,8 +70,8 @@ def get_dashboard_summary(
 def get_sales_report(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Get sales report for date range"""
     sales = (
@@ -98,7 +99,7 @@ def get_sales_report(
 
 @router.get("/inventory-report")
 def get_inventory_report(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_report_db), current_user: Principal = Depends(get_current_user)
 ) -> Any:
     """Get inventory summary report"""
     # Total inventory value
@@ -121,8 +122,8 @@ def get_inventory_report(
 @router.get("/expiry-report")
 def get_expiry_report(
     days: int = Query(default=90, ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Get expiry report"""
     expiry_threshold = datetime.now().date() + timedelta(days=days)
@@ -145,12 +146,12 @@ def get_expiry_report(
 # ============================================
 
 
-@router.get("/vat-purchases")
+@router.get("/vat-purchases", dependencies=[Depends(query_budget(5))])
 def get_vat_purchases_report(
     start_date: date = Query(..., description="Start date for report"),
     end_date: date = Query(..., description="End date for report"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     รายงานภาษีซื้อ (Input VAT / VAT Purchases)
@@ -159,6 +160,7 @@ def get_vat_purchases_report(
     # Get all received purchase orders in date range
     purchases = (
         db.query(PurchaseOrder)
+        .options(selectinload(PurchaseOrder.items))
         .filter(
             and_(
                 PurchaseOrder.actual_delivery_date >= start_date,
@@ -250,12 +252,12 @@ def get_vat_purchases_report(
     }
 
 
-@router.get("/vat-sales")
+@router.get("/vat-sales", dependencies=[Depends(query_budget(5))])
 def get_vat_sales_report(
     start_date: date = Query(..., description="Start date for report"),
     end_date: date = Query(..., description="End date for report"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     รายงานภาษีขาย (Output VAT / VAT Sales)
@@ -264,6 +266,7 @@ def get_vat_sales_report(
     # Get all completed sales orders in date range
     sales = (
         db.query(SalesOrder)
+        .options(selectinload(SalesOrder.items))
         .filter(
             and_(
                 SalesOrder.order_date >= start_date,
@@ -344,8 +347,8 @@ def get_vat_sales_report(
 def get_cogs_report(
     start_date: date = Query(..., description="Start date for report"),
     end_date: date = Query(..., description="End date for report"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     รายงานต้นทุนขาย (Cost of Goods Sold)
@@ -438,8 +441,8 @@ def get_cogs_report(
 def get_profit_loss_report(
     start_date: date = Query(..., description="Start date for report"),
     end_date: date = Query(..., description="End date for report"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     รายงานกำไร-ขาดทุน (Profit & Loss Statement)
@@ -541,8 +544,8 @@ def get_profit_loss_report(
 def export_profit_loss_pdf(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Export Profit & Loss Statement as PDF"""
     # Get report data
@@ -564,8 +567,8 @@ def export_profit_loss_pdf(
 def export_profit_loss_excel(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Export Profit & Loss Statement as Excel"""
     # Get report data
@@ -587,8 +590,8 @@ def export_profit_loss_excel(
 def export_vat_sales_pdf(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Export VAT Sales Report as PDF"""
     # Get report data
@@ -610,8 +613,8 @@ def export_vat_sales_pdf(
 def export_vat_sales_excel(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Export VAT Sales Report as Excel"""
     # Get report data
@@ -633,8 +636,8 @@ def export_vat_sales_excel(
 def export_vat_purchases_pdf(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Export VAT Purchases Report as PDF"""
     # Get report data
@@ -656,8 +659,8 @@ def export_vat_purchases_pdf(
 def export_vat_purchases_excel(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Export VAT Purchases Report as Excel"""
     # Get report data
@@ -679,8 +682,8 @@ def export_vat_purchases_excel(
 def export_cogs_pdf(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Export COGS Report as PDF"""
     # Get report data
@@ -702,8 +705,8 @@ def export_cogs_pdf(
 def export_cogs_excel(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_report_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Export COGS Report as Excel"""
     # Get report data
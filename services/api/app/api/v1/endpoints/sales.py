@@ -1,17 +1,20 @@
+import uuid
 from datetime import datetime
 from decimal import Decimal
-from typing import Any
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 from app.api.deps import get_current_user
-from app.core.database import get_db
-from app.models.inventory import InventoryLot
-from app.models.product import Product
+from app.core import statements
+from app.core.database import get_async_db, get_db, get_read_db
+from app.core.pagination import Keyset, TotalMode, count_total, paginate
+from app.core.principals import Principal
+from app.core.query_budget import query_budget
 from app.models.sales import OrderStatus, PaymentStatus, SalesOrder, SalesOrderItem
-from app.models.user import User
 from app.schemas.sales import (
     SalesOrderComplete,
     SalesOrderCreate,
@@ -22,32 +25,56 @@ from app.services.receipt_service import ReceiptService
 
 router = APIRouter()
 
+SALES_ORDER_KEYSET = Keyset("sales_orders", SalesOrder.created_at, SalesOrder.id, descending=True)
+
+
+def _canonical_id(value: str) -> str:
+    """Lower-case hyphenated form of a UUID, as ``str(product.id)`` gives it"""
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        # Not a UUID; it matches no product and is reported as not found
+        return value
+
 
 @router.get("/orders/", response_model=SalesOrderList)
 def get_sales_orders(
     skip: int = 0,
     limit: int = 100,
     status_filter: str = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = Query("exact", alias="total"),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
-    """Get all sales orders"""
+    """Get all sales orders, newest first
+
+    Pass the returned ``next_cursor`` as ``cursor`` to page without OFFSET.
+    ``total=estimate`` or ``total=none`` skip the exact count.
+    """
     query = db.query(SalesOrder)
 
     if status_filter:
         query = query.filter(SalesOrder.status == status_filter)
 
-    total = query.count()
-    orders = query.offset(skip).limit(limit).all()
+    total = count_total(query, total_mode)
+    page = paginate(query, SALES_ORDER_KEYSET, cursor, skip, limit)
 
-    return {"items": orders, "total": total, "skip": skip, "limit": limit}
+    return {
+        "items": page.items,
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": page.next_cursor,
+        "has_more": page.has_more,
+    }
 
 
 @router.get("/orders/{order_id}", response_model=SalesOrderResponse)
 def get_sales_order(
     order_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Get sales order by ID"""
     order = db.query(SalesOrder).filter(SalesOrder.id == order_id).first()
@@ -57,10 +84,10 @@ def get_sales_order(
 
 
 @router.post("/orders/", response_model=SalesOrderResponse, status_code=status.HTTP_201_CREATED)
-def create_sales_order(
+async def create_sales_order(
     order_data: SalesOrderCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Create new sales order with VAT calculation
 
@@ -94,9 +121,14 @@ def create_sales_order(
         total_vat = Decimal("0")
         items = []
 
+        # Load all products in one query instead of one per line item
+        product_ids = list({_canonical_id(item_data.product_id) for item_data in order_data.items})
+        products = await db.scalars(statements.products_by_ids(product_ids))
+        products_by_id = {str(product.id): product for product in products}
+
         for item_data in order_data.items:
             # Get product
-            product = db.query(Product).filter(Product.id == item_data.product_id).first()
+            product = products_by_id.get(_canonical_id(item_data.product_id))
             if not product:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -130,12 +162,8 @@ def create_sales_order(
             # CRITICAL: Use with_for_update() to lock the row and prevent race conditions
             lot = None
             if item_data.lot_id:
-                lot = (
-                    db.query(InventoryLot)
-                    .filter(InventoryLot.id == item_data.lot_id)
-                    .with_for_update()  # Row-level lock to prevent concurrent modifications
-                    .first()
-                )
+                # Row-level lock to prevent concurrent modifications
+                lot = await db.scalar(statements.lot_by_id_for_update(item_data.lot_id))
                 if not lot:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -144,12 +172,9 @@ def create_sales_order(
             else:
                 # Find available lot with row-level lock
                 # This ensures that concurrent orders don't oversell the same lot
-                lot = (
-                    db.query(InventoryLot)
-                    .filter(InventoryLot.product_id == item_data.product_id)
-                    .filter(InventoryLot.quantity_available >= item_data.quantity)
-                    .with_for_update()  # Row-level lock to prevent concurrent modifications
-                    .first()
+                # Row-level lock to prevent concurrent modifications
+                lot = await db.scalar(
+                    statements.available_lot_for_update(product.id, item_data.quantity)
                 )
 
             if not lot:
@@ -169,7 +194,7 @@ def create_sales_order(
                 )
 
             item = SalesOrderItem(
-                product_id=item_data.product_id,
+                product_id=product.id,
                 lot_id=str(lot.id),
                 quantity=item_data.quantity,
                 unit_price=float(unit_price),
@@ -190,26 +215,22 @@ def create_sales_order(
         order.tax_amount = float(total_vat)
         order.total_amount = float(subtotal + total_vat - Decimal(str(order.discount_amount)))
 
-        db.add(order)
-        db.flush()
-
         # Add items
-        for item in items:
-            item.sales_order_id = str(order.id)
-            db.add(item)
+        order.items = items
+        db.add(order)
 
-        db.commit()
-        db.refresh(order)
+        await db.commit()
 
+        # Items and server defaults are already loaded (INSERT ... RETURNING)
         return order
 
     except HTTPException:
         # Re-raise HTTP exceptions (business logic errors)
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
         # Rollback on any unexpected error
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create sales order: {str(e)}",
@@ -217,11 +238,11 @@ def create_sales_order(
 
 
 @router.post("/orders/{order_id}/complete", response_model=SalesOrderResponse)
-def complete_sales_order(
+async def complete_sales_order(
     order_id: str,
     payment_data: SalesOrderComplete,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """Complete sales order and process payment
 
@@ -230,7 +251,7 @@ def complete_sales_order(
     """
     try:
         # Get order with lock to prevent concurrent completion attempts
-        order = db.query(SalesOrder).filter(SalesOrder.id == order_id).with_for_update().first()
+        order = await db.scalar(statements.sales_order_with_items_for_update(order_id))
         if not order:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
 
@@ -262,46 +283,50 @@ def complete_sales_order(
 
         # Deduct inventory (move from reserved to sold) with row-level locking
         for item in order.items:
-            lot = (
-                db.query(InventoryLot)
-                .filter(InventoryLot.id == item.lot_id)
-                .with_for_update()
-                .first()
-            )
+            lot = await db.scalar(statements.lot_by_id_for_update(item.lot_id))
             if lot:
                 lot.quantity_reserved -= item.quantity
                 # quantity_available was already deducted when order was created
 
-        db.commit()
-        db.refresh(order)
+        await db.commit()
 
+        # Items were loaded with the lock; updated_at comes back via UPDATE ... RETURNING
         return order
 
     except HTTPException:
         # Re-raise HTTP exceptions (business logic errors)
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
         # Rollback on any unexpected error
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to complete sales order: {str(e)}",
         )
 
 
-@router.get("/orders/{order_id}/receipt/pdf")
+@router.get("/orders/{order_id}/receipt/pdf", dependencies=[Depends(query_budget(6))])
 def download_receipt_pdf(
     order_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
     """Download receipt as PDF (Thai Tax Invoice format)
 
     Generates a Thai-formatted tax invoice/receipt PDF for the specified order.
     """
-    # Get order with items
-    order = db.query(SalesOrder).filter(SalesOrder.id == order_id).first()
+    # Get order with customer, cashier and items (with products) up front
+    order = (
+        db.query(SalesOrder)
+        .options(
+            joinedload(SalesOrder.customer),
+            joinedload(SalesOrder.cashier),
+            selectinload(SalesOrder.items).joinedload(SalesOrderItem.product),
+        )
+        .filter(SalesOrder.id == order_id)
+        .first()
+    )
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
 
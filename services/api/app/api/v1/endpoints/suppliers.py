@@ -4,12 +4,20 @@ Suppliers API endpoints
 
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_current_active_user, get_db, get_manager_or_admin
+from app.api.deps import (
+    conditional_get,
+    get_current_active_user,
+    get_db,
+    get_manager_or_admin,
+)
+from app.core.database import get_read_db
+from app.core.pagination import TotalMode, count_total, paginate
+from app.core.principals import Principal
+from app.core.resource_versions import SUPPLIERS, resource_versions
 from app.models.supplier import Supplier
-from app.models.user import User
 from app.schemas.supplier import (
     SupplierCreate,
     SupplierList,
@@ -25,26 +33,28 @@ def get_suppliers(
     skip: int = 0,
     limit: int = 100,
     is_active: bool = True,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    total_mode: TotalMode = Query("exact", alias="total"),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get(SUPPLIERS)),
 ) -> Any:
-    """Get all suppliers"""
+    """Get all suppliers; ``total=estimate`` or ``total=none`` skip the exact count"""
     query = db.query(Supplier)
 
     if is_active is not None:
         query = query.filter(Supplier.is_active == is_active)
 
-    total = query.count()
-    suppliers = query.offset(skip).limit(limit).all()
+    total = count_total(query, total_mode)
+    page = paginate(query, None, None, skip, limit)
 
-    return {"items": suppliers, "total": total}
+    return {"items": page.items, "total": total, "has_more": page.has_more}
 
 
 @router.post("/", response_model=SupplierResponse)
 def create_supplier(
     supplier_data: SupplierCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_manager_or_admin),
+    current_user: Principal = Depends(get_manager_or_admin),
 ) -> Any:
     """Create new supplier"""
     # Check if code exists
@@ -55,7 +65,7 @@ def create_supplier(
     supplier = Supplier(**supplier_data.model_dump())
     db.add(supplier)
     db.commit()
-    db.refresh(supplier)
+    resource_versions.bump(SUPPLIERS)
 
     return supplier
 
@@ -64,7 +74,7 @@ def create_supplier(
 def get_supplier(
     supplier_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Get supplier by ID"""
     supplier = db.query(Supplier).filter(Supplier.id == supplier_id).first()
@@ -78,7 +88,7 @@ def update_supplier(
     supplier_id: str,
     supplier_data: SupplierUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_manager_or_admin),
+    current_user: Principal = Depends(get_manager_or_admin),
 ) -> Any:
     """Update supplier"""
     supplier = db.query(Supplier).filter(Supplier.id == supplier_id).first()
@@ -91,6 +101,6 @@ def update_supplier(
         setattr(supplier, field, value)
 
     db.commit()
-    db.refresh(supplier)
+    resource_versions.bump(SUPPLIERS)
 
     return supplier
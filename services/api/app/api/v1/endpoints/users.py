@@ -8,6 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_admin_user, get_db
+from app.core.principals import Principal, principal_cache
 from app.core.security import get_password_hash
 from app.models.user import User
 from app.schemas.auth import UserCreate, UserResponse, UserUpdate
@@ -20,7 +21,7 @@ def get_users(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
 ) -> Any:
     """Get all users (admin only)"""
     users = db.query(User).offset(skip).limit(limit).all()
@@ -31,7 +32,7 @@ def get_users(
 def create_user(
     user_in: UserCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
 ) -> Any:
     """Create new user (admin only)"""
     # Check if user exists
@@ -47,7 +48,6 @@ def create_user(
     )
     db.add(user)
     db.commit()
-    db.refresh(user)
 
     return user
 
@@ -56,7 +56,7 @@ def create_user(
 def get_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
 ) -> Any:
     """Get user by ID (admin only)"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -70,7 +70,7 @@ def update_user(
     user_id: str,
     user_data: UserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
 ) -> Any:
     """Update user (admin only)"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -86,11 +86,20 @@ def update_user(
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
 
+    previous_email = user.email
+    revoke = any(
+        field in update_data and update_data[field] != getattr(user, field)
+        for field in ("role", "is_active")
+    )
     for field, value in update_data.items():
         setattr(user, field, value)
 
+    # Tokens carry the role; make holders of the old one refresh
+    if revoke:
+        user.token_version = user.token_version + 1
+
     db.commit()
-    db.refresh(user)
+    principal_cache.invalidate(previous_email, user.email)
 
     return user
 
@@ -99,7 +108,7 @@ def update_user(
 def deactivate_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
 ) -> Any:
     """Deactivate user (admin only)"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -111,6 +120,26 @@ def deactivate_user(
         raise HTTPException(status_code=400, detail="Cannot deactivate yourself")
 
     user.is_active = False
+    user.token_version = user.token_version + 1
     db.commit()
+    principal_cache.invalidate(user.email)
 
     return {"message": "User deactivated successfully"}
+
+
+@router.post("/{user_id}/revoke-tokens")
+def revoke_user_tokens(
+    user_id: str,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_admin_user),
+) -> Any:
+    """Revoke every outstanding access and refresh token of a user (admin only)"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user.token_version = user.token_version + 1
+    db.commit()
+    principal_cache.invalidate(user.email)
+
+    return {"message": "Tokens revoked successfully"}
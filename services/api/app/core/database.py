@@ -1,39 +1,291 @@
-from typing import Any
+import itertools
+import uuid
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, AsyncGenerator, Optional
 
-from sqlalchemy import create_engine
+from fastapi import Depends
+from sqlalchemy import Float, Numeric, create_engine, event, make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool, StaticPool
 
 from app.core.config import settings
+from app.core.db_metrics import (
+    InstrumentedAsyncAdaptedQueuePool,
+    InstrumentedQueuePool,
+    instrument_engine,
+)
+
+
+def _unique_statement_name() -> str:
+    # PgBouncer may run the next transaction on another server connection, where
+    # asyncpg's sequential names (__asyncpg_stmt_1__, ...) can already exist
+    return f"__asyncpg_{uuid.uuid4().hex}__"
+
+
+def pgbouncer_connect_args(url: str) -> dict[str, Any]:
+    """Driver options that keep prepared statements safe behind PgBouncer
+
+    In transaction pooling mode a client connection is bound to a server connection
+    only for one transaction, so prepared statements must not be cached across
+    transactions. psycopg2 never uses server-side prepared statements.
+    """
+    driver = make_url(url).get_driver_name()
+    if driver == "asyncpg":
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": _unique_statement_name,
+        }
+    if driver == "psycopg":
+        return {"prepare_threshold": None}
+    return {}
+
+
+def _pool_kwargs(url: str, queue_pool: type) -> dict[str, Any]:
+    """Pool configuration for a server database (PostgreSQL)"""
+    if not settings.DB_PGBOUNCER:
+        return {
+            "poolclass": queue_pool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+        }
+
+    # PgBouncer (transaction pooling) owns the server connections. Hold none, or
+    # only a few client connections per worker, and never keep session state.
+    kwargs: dict[str, Any] = {"connect_args": pgbouncer_connect_args(url)}
+    if settings.DB_PGBOUNCER_POOL_SIZE <= 0:
+        kwargs.update({"poolclass": NullPool, "pool_pre_ping": False})
+    else:
+        kwargs.update(
+            {
+                "poolclass": queue_pool,
+                "pool_size": settings.DB_PGBOUNCER_POOL_SIZE,
+                "max_overflow": 0,
+                "pool_timeout": settings.DB_POOL_TIMEOUT,
+            }
+        )
+    return kwargs
+
+
+def _engine_kwargs(url: str) -> dict[str, Any]:
+    """Engine configuration based on database type"""
+    kwargs: dict[str, Any] = {"pool_pre_ping": True}
+
+    # SQLite doesn't support pool_size and max_overflow
+    if "sqlite" not in url.lower():
+        kwargs.update(_pool_kwargs(url, InstrumentedQueuePool))
+    else:
+        # For SQLite, use StaticPool for in-memory databases
+        if ":memory:" in url or "mode=memory" in url:
+            kwargs.update({"connect_args": {"check_same_thread": False}, "poolclass": StaticPool})
+    return kwargs
+
 
 # Create database engine with conditional configuration based on database type
 db_url = settings.DATABASE_URL
-engine_kwargs: dict[str, Any] = {"pool_pre_ping": True}
-
-# SQLite doesn't support pool_size and max_overflow
-if "sqlite" not in db_url.lower():
-    engine_kwargs.update({"pool_size": 10, "max_overflow": 20})
-else:
-    # For SQLite, use StaticPool for in-memory databases
-    if ":memory:" in db_url or "mode=memory" in db_url:
-        engine_kwargs.update(
-            {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool}
-        )
+engine_kwargs = _engine_kwargs(db_url)
 
 engine = create_engine(db_url, **engine_kwargs)
+instrument_engine(engine, "primary")
+
+# Create SessionLocal class. Objects stay loaded after commit, so write endpoints
+# respond from memory instead of reloading every attribute. That is safe because
+# server-generated columns come back with RETURNING (eager_defaults) and numeric
+# values are rounded to their column's scale at flush (see below).
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Read replicas (optional). Reports and list endpoints read from these; writes and
+# SELECT ... FOR UPDATE always stay on the primary engine above.
+read_engines = [create_engine(url, **_engine_kwargs(url)) for url in settings.database_read_urls]
+ReadSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    for read_engine in read_engines
+]
+for index, read_engine in enumerate(read_engines):
+    instrument_engine(read_engine, f"replica-{index}")
+_read_session_cycle = itertools.cycle(ReadSessionLocals) if ReadSessionLocals else None
+
+# Async drivers for the event-loop based endpoints (POS checkout, search, barcode scan)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> Optional[str]:
+    """Map a sync database URL to its async driver, or None if there is none"""
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return None
+    if scheme in ASYNC_DRIVERS.values():
+        return url
+    async_scheme = ASYNC_DRIVERS.get(scheme)
+    if async_scheme is None:
+        return None
+    return f"{async_scheme}://{rest}"
+
+
+def _async_engine_kwargs(async_url: str) -> dict[str, Any]:
+    """Async engine configuration based on database type"""
+    kwargs: dict[str, Any] = {"pool_pre_ping": True}
+    if "sqlite" not in async_url:
+        kwargs.update(_pool_kwargs(async_url, InstrumentedAsyncAdaptedQueuePool))
+    elif ":memory:" in async_url or "mode=memory" in async_url:
+        kwargs.update({"poolclass": StaticPool})
+    return kwargs
+
+
+def _create_async_engine(url: str) -> Optional[AsyncEngine]:
+    async_url = to_async_url(url)
+    if async_url is None:
+        return None
+    return create_async_engine(async_url, **_async_engine_kwargs(async_url))
+
+
+async_engine = _create_async_engine(db_url)
+if async_engine is not None:
+    instrument_engine(async_engine, "async")
+
+# Async sessions never expire on commit: attributes must not lazy-load after an await
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+)
+
+
+class _ModelBase:
+    # Fetch server-generated values (created_at, updated_at) with INSERT/UPDATE ...
+    # RETURNING instead of a SELECT when the attribute is next read
+    __mapper_args__ = {"eager_defaults": True}
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create Base class for models
-Base = declarative_base()
+Base = declarative_base(cls=_ModelBase)
+
+
+@event.listens_for(Base, "before_insert", propagate=True)
+def _set_onupdate_columns_on_insert(mapper: Any, connection: Any, target: Any) -> None:
+    # Columns that only have an onupdate default (updated_at) are inserted as NULL.
+    # Record that on the object, otherwise eager_defaults SELECTs them back.
+    for prop in mapper.column_attrs:
+        column = prop.columns[0]
+        if (
+            column.onupdate is not None
+            and column.default is None
+            and column.server_default is None
+            and prop.key not in target.__dict__
+        ):
+            setattr(target, prop.key, None)
+
+
+def _round_numeric_columns(target: Any, mapper: Any, *, inserting: bool) -> None:
+    for prop in mapper.column_attrs:
+        column = prop.columns[0]
+        scale = getattr(column.type, "scale", None)
+        if not isinstance(column.type, Numeric) or isinstance(column.type, Float) or scale is None:
+            continue
+        if prop.key in target.__dict__:
+            value = target.__dict__[prop.key]
+        elif inserting and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+        else:
+            continue
+        if not isinstance(value, (int, float, Decimal)) or isinstance(value, bool):
+            continue
+        # PostgreSQL rounds numeric half away from zero
+        rounded = Decimal(str(value)).quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP)
+        if not isinstance(value, Decimal) or value.as_tuple() != rounded.as_tuple():
+            setattr(target, prop.key, rounded)
+
+
+@event.listens_for(Base, "before_insert", propagate=True)
+def _round_numeric_columns_on_insert(mapper: Any, connection: Any, target: Any) -> None:
+    # Sessions don't expire on commit, so responses are built from these objects.
+    # Hold fixed-point values as the column stores them (Numeric(10, 2) keeps
+    # 0.7385 as 0.74), including scalar defaults the INSERT would fill in.
+    _round_numeric_columns(target, mapper, inserting=True)
+
+
+@event.listens_for(Base, "before_update", propagate=True)
+def _round_numeric_columns_on_update(mapper: Any, connection: Any, target: Any) -> None:
+    _round_numeric_columns(target, mapper, inserting=False)
+
+
+# SQLSTATE for query_canceled: raised by statement_timeout and by cancel requests
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+def set_statement_timeout(db: Session, timeout_ms: int) -> None:
+    """Bound every statement in the session's current transaction (PostgreSQL only)
+
+    Uses SET LOCAL semantics, so the setting ends with the transaction and never
+    leaks to the next user of the pooled connection.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {"timeout": str(int(timeout_ms))},
+    )
+
+
+def cancel_running_query(dbapi_connection: Any) -> None:
+    """Ask the server to cancel whatever the connection is running (thread-safe)"""
+    if hasattr(dbapi_connection, "cancel"):  # psycopg2
+        dbapi_connection.cancel()
+    elif hasattr(dbapi_connection, "interrupt"):  # sqlite3
+        dbapi_connection.interrupt()
+
+
+def is_query_canceled(exc: Exception) -> bool:
+    """Whether a database error was a statement timeout or cancel request"""
+    orig = getattr(exc, "orig", None) if isinstance(exc, DBAPIError) else None
+    return getattr(orig, "pgcode", None) == QUERY_CANCELED_SQLSTATE
 
 
 def get_db():
-    """Dependency to get database session"""
+    """Dependency to get the request-scoped database session
+
+    This is the only sync session dependency: FastAPI caches it per request, so
+    authentication and the endpoint share one session. Sessions connect lazily, so a
+    pooled connection is only checked out once the first query runs.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db(db: Session = Depends(get_db)):
+    """Dependency to get a read-only session on a replica
+
+    Replicas are picked round-robin. Without replicas this is the request's primary
+    session, so no second connection is checked out. Use only for GET endpoints that
+    never write and can tolerate replication lag.
+    """
+    if _read_session_cycle is None:
+        yield db
+        return
+
+    read_db = next(_read_session_cycle)()
+    try:
+        yield read_db
+    finally:
+        read_db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
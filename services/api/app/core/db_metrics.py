@@ -0,0 +1,148 @@
+"""
+Connection pool telemetry
+Records checkout wait time, pool saturation, pre-ping failures and connection lifetimes
+"""
+
+import time
+from typing import Any, Dict, Union
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from app.core.metrics import registry
+
+# Connection lifetimes in seconds, up to several hours
+LIFETIME_BUCKETS = (1.0, 10.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0, 21600.0)
+
+checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection"
+)
+connection_lifetime = registry.histogram(
+    "db_pool_connection_lifetime_seconds",
+    "Age of DBAPI connections when they are closed",
+    buckets=LIFETIME_BUCKETS,
+)
+checkout_timeouts = registry.counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a connection"
+)
+checkout_errors = registry.counter(
+    "db_pool_checkout_errors_total", "Checkouts that failed to open a connection"
+)
+connections_opened = registry.counter("db_pool_connections_opened_total", "New DBAPI connections")
+connections_closed = registry.counter(
+    "db_pool_connections_closed_total", "Closed DBAPI connections"
+)
+pre_ping_failures = registry.counter(
+    "db_pool_pre_ping_failures_total", "pool_pre_ping checks that found a dead connection"
+)
+invalidations = registry.counter("db_pool_invalidations_total", "Invalidated pooled connections")
+checked_out = registry.gauge("db_pool_checked_out", "Connections currently checked out")
+overflow = registry.gauge("db_pool_overflow", "Checked-out connections beyond pool_size")
+checked_out_peak = registry.gauge("db_pool_checked_out_peak", "Highest checked-out count seen")
+
+_instrumented: Dict[str, Pool] = {}
+
+
+class _TimedCheckoutMixin:
+    """Times how long a checkout waits on the pool queue"""
+
+    metrics_label = "primary"
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()  # type: ignore[misc]
+        except exc.TimeoutError:
+            checkout_timeouts.inc(pool=self.metrics_label)
+            raise
+        except Exception:
+            checkout_errors.inc(pool=self.metrics_label)
+            raise
+        finally:
+            checkout_wait.observe(time.perf_counter() - start, pool=self.metrics_label)
+
+    def recreate(self) -> Any:
+        # engine.dispose() swaps in a new pool; keep reporting under the same label
+        new_pool = super().recreate()  # type: ignore[misc]
+        new_pool.metrics_label = self.metrics_label
+        _instrumented[self.metrics_label] = new_pool
+        return new_pool
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _update_saturation(pool: Pool, label: str, returning: int = 0) -> None:
+    if not isinstance(pool, QueuePool):
+        return
+    # The checkin event fires before the pool has taken the connection back
+    current = pool.checkedout() - returning
+    checked_out.set(current, pool=label)
+    overflow.set(max(current - pool.size(), 0), pool=label)
+    if current > checked_out_peak.value(pool=label):
+        checked_out_peak.set(current, pool=label)
+
+
+def instrument_engine(engine: Union[Engine, AsyncEngine], label: str) -> None:
+    """Attach pool telemetry listeners to an engine"""
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    pool = sync_engine.pool
+    if isinstance(pool, _TimedCheckoutMixin):
+        pool.metrics_label = label
+    _instrumented[label] = pool
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        connection_record.info["connected_at"] = time.monotonic()
+        connections_opened.inc(pool=label)
+
+    @event.listens_for(pool, "close")
+    def on_close(dbapi_connection: Any, connection_record: Any) -> None:
+        connections_closed.inc(pool=label)
+        connected_at = connection_record.info.pop("connected_at", None)
+        if connected_at is not None:
+            connection_lifetime.observe(time.monotonic() - connected_at, pool=label)
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+        _update_saturation(_instrumented.get(label, pool), label)
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection: Any, connection_record: Any) -> None:
+        _update_saturation(_instrumented.get(label, pool), label, returning=1)
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection: Any, connection_record: Any, exception: Any) -> None:
+        invalidations.inc(pool=label)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_handle_error(context: Any) -> None:
+        if context.is_pre_ping:
+            pre_ping_failures.inc(pool=label)
+
+
+def pool_status() -> Dict[str, Dict[str, Any]]:
+    """Current size and saturation of every instrumented pool"""
+    status = {}
+    for label, pool in sorted(_instrumented.items()):
+        entry: Dict[str, Any] = {"class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(
+                {
+                    "size": pool.size(),
+                    "max_overflow": pool._max_overflow,
+                    "checked_in": pool.checkedin(),
+                    "checked_out": pool.checkedout(),
+                    "overflow": max(pool.overflow(), 0),
+                    "peak_checked_out": checked_out_peak.value(pool=label),
+                }
+            )
+        status[label] = entry
+    return status
@@ -0,0 +1,119 @@
+"""
+Password hashing worker pool
+Runs bcrypt in a dedicated, size-limited process pool so login bursts neither
+hold the GIL nor starve the threadpool that serves the sync endpoints
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from app.core import security
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+hash_pending = registry.gauge(
+    "auth_password_hash_pending", "Password hashes queued or running in the worker pool"
+)
+hash_rejected = registry.counter(
+    "auth_password_hash_rejected_total", "Password hashes refused because the pool was full"
+)
+hash_seconds = registry.histogram(
+    "auth_password_hash_seconds", "Time from submitting a password hash to its result"
+)
+hash_pool_restarts = registry.counter(
+    "auth_password_hash_pool_restarts_total", "Worker pools replaced after a worker died"
+)
+
+
+class PasswordHasherBusyError(Exception):
+    """Too many password hashes are already queued; the caller should retry later"""
+
+
+class PasswordHasher:
+    """bcrypt on a bounded process pool
+
+    At most ``max_pending`` hashes may be queued or running; further requests fail
+    fast with PasswordHasherBusyError instead of piling up behind a login burst. The
+    counter is only touched from the event loop, so it needs no lock. A pool
+    broken by a dead worker is replaced once per call; the app lifespan shuts
+    the workers down.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Optional[Executor]:
+        # No workers: the event loop's default threadpool
+        if self.workers == 0:
+            return None
+        if self._executor is None:
+            # spawn: forking a process that already runs an event loop and threads
+            # is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _replace_broken(self, executor: Optional[Executor]) -> None:
+        # Concurrent calls all see the same broken pool; only the first replaces it
+        if executor is not None and self._executor is executor:
+            logger.warning("Password hashing worker died; starting a new pool")
+            hash_pool_restarts.inc()
+            executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.max_pending:
+            hash_rejected.inc()
+            raise PasswordHasherBusyError()
+
+        self.pending += 1
+        hash_pending.set(self.pending)
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                # A worker was killed (OOM, signal); the pool refuses all work from then on
+                self._replace_broken(executor)
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            hash_pending.set(self.pending)
+            hash_seconds.observe(time.perf_counter() - start)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return bool(await self._run(security.verify_password, plain_password, hashed_password))
+
+    async def hash(self, password: str) -> str:
+        return str(await self._run(security.get_password_hash, password))
+
+    async def start(self) -> None:
+        """Start the worker processes ahead of the first login"""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(executor, time.sleep, 0) for _ in range(self.workers))
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS, max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,216 @@
+"""
+Startup warm-up and graceful shutdown
+Pre-opens pooled connections before traffic arrives. On SIGTERM the worker first
+drains (readiness fails, new requests get 503, in-flight ones finish) and only
+then lets uvicorn close the listener and dispose the engines.
+"""
+
+import asyncio
+import logging
+import math
+import signal
+import time
+from types import FrameType
+from typing import Any, Callable, Optional
+
+import uvicorn
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DRAIN_POLL_SECONDS = 0.05
+
+# Paths that keep answering while draining, so probes see the 503 from readiness
+PROBE_PATHS = ("/health", "/health/ready")
+
+# Small, hot tables every worker reads; loading them pulls their pages into the
+# server's buffer cache before the first checkout needs them
+REFERENCE_TABLES = ("categories", "warehouses")
+
+requests_in_flight = registry.gauge("http_requests_in_flight", "Requests being handled")
+requests_rejected_draining = registry.counter(
+    "http_requests_rejected_draining_total", "Requests refused because the worker is draining"
+)
+
+
+class RequestTracker:
+    """Counts in-flight requests and whether the worker is shutting down"""
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.draining = False
+
+    def reset(self) -> None:
+        self.active = 0
+        self.draining = False
+        requests_in_flight.set(0)
+
+    def start_draining(self) -> None:
+        self.draining = True
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no request is in flight; False if the timeout ran out first"""
+        deadline = time.monotonic() + timeout
+        while self.active > 0:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(DRAIN_POLL_SECONDS)
+        return True
+
+
+tracker = RequestTracker()
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that drains before its own shutdown on SIGTERM
+
+    uvicorn closes the listener as soon as it handles the signal, so a load
+    balancer would only learn the worker is gone from refused connections.
+    Draining first keeps the listener open while readiness reports 503 and the
+    in-flight requests finish. A second SIGTERM, or SIGINT, skips the drain.
+    """
+
+    def __init__(self, config: uvicorn.Config, drain_timeout: float):
+        super().__init__(config)
+        self.drain_timeout = drain_timeout
+        self.drain_task: Optional[asyncio.Task] = None
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if sig != signal.SIGTERM or self.drain_task is not None:
+            super().handle_exit(sig, frame)
+            return
+        self.drain_task = asyncio.get_running_loop().create_task(self._drain_then_exit(sig))
+
+    async def _drain_then_exit(self, sig: int) -> None:
+        started = time.monotonic()
+        tracker.start_draining()
+        if not await tracker.wait_idle(self.drain_timeout):
+            logger.warning("Drain timed out with %d request(s) still in flight", tracker.active)
+        # uvicorn's own graceful shutdown gets what is left of the same budget
+        remaining = self.drain_timeout - (time.monotonic() - started)
+        self.config.timeout_graceful_shutdown = max(math.ceil(remaining), 1)
+        super().handle_exit(sig, None)
+
+
+def server_config(
+    app: Any, host: str, port: int, drain_timeout: float, forwarded_allow_ips: str
+) -> uvicorn.Config:
+    """uvicorn configuration for the production server
+
+    Client addresses come from X-Forwarded-For when the request arrives from one
+    of ``forwarded_allow_ips``, so per-IP limits see terminals, not the proxy.
+    """
+    return uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        proxy_headers=True,
+        forwarded_allow_ips=forwarded_allow_ips,
+        timeout_graceful_shutdown=math.ceil(drain_timeout),
+    )
+
+
+def serve(app: Any, host: str, port: int, drain_timeout: float, forwarded_allow_ips: str) -> None:
+    """Run ``app`` with uvicorn, draining for up to ``drain_timeout`` seconds on SIGTERM"""
+    config = server_config(app, host, port, drain_timeout, forwarded_allow_ips)
+    DrainingServer(config, drain_timeout).run()
+
+
+class DrainMiddleware:
+    """ASGI middleware that tracks in-flight requests and refuses new work while draining"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if tracker.draining and scope.get("path") not in PROBE_PATHS:
+            requests_rejected_draining.inc()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"connection", b"close"),
+                        (b"retry-after", b"1"),
+                    ],
+                }
+            )
+            await send(
+                {"type": "http.response.body", "body": b'{"detail":"Server is shutting down"}'}
+            )
+            return
+
+        tracker.active += 1
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            tracker.active -= 1
+            requests_in_flight.dec()
+
+
+def _warm_pool_size(pool: Any, connections: int) -> int:
+    # NullPool (PgBouncer mode) and StaticPool keep nothing worth pre-opening
+    if not isinstance(pool, QueuePool):
+        return 0
+    return max(min(connections, pool.size()), 0)
+
+
+def warm_pool(engine: Engine, connections: int) -> int:
+    """Open up to ``connections`` pooled connections and return them to the pool
+
+    Returns the number of connections opened.
+    """
+    count = _warm_pool_size(engine.pool, connections)
+    opened = []
+    try:
+        for _ in range(count):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
+async def warm_async_pool(engine: AsyncEngine, connections: int) -> int:
+    """Async engine counterpart of warm_pool; connections are opened concurrently"""
+    count = _warm_pool_size(engine.sync_engine.pool, connections)
+    results = await asyncio.gather(
+        *(engine.connect().start() for _ in range(count)), return_exceptions=True
+    )
+    opened = [result for result in results if not isinstance(result, BaseException)]
+    await asyncio.gather(*(connection.close() for connection in opened))
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return len(opened)
+
+
+def dispose_engine(engine: Engine) -> None:
+    """Close the engine's pooled connections
+
+    StaticPool engines are left alone: an in-memory SQLite database lives in its
+    only connection.
+    """
+    if isinstance(engine.pool, StaticPool):
+        return
+    engine.dispose()
+
+
+def warm_reference_data(engine: Engine) -> int:
+    """Read the small reference tables once; returns the number of rows read"""
+    rows = 0
+    with engine.connect() as connection:
+        for table in REFERENCE_TABLES:
+            rows += len(connection.execute(text(f"SELECT * FROM {table}")).all())
+    return rows
@@ -0,0 +1,168 @@
+"""
+In-process metrics
+Thread-safe counters, gauges and histograms exposed on the internal metrics endpoint
+"""
+
+import math
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Latency buckets in seconds, from sub-millisecond lookups to slow reports
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _label_str(key: LabelKey) -> str:
+    return ",".join(f"{name}={value}" for name, value in key)
+
+
+class Counter:
+    """Monotonically increasing value per label set"""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            values = {_label_str(key): value for key, value in self._values.items()}
+        return {"type": "counter", "description": self.description, "values": values}
+
+
+class Gauge:
+    """Value that can go up and down per label set"""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            values = {_label_str(key): value for key, value in self._values.items()}
+        return {"type": "gauge", "description": self.description, "values": values}
+
+
+class Histogram:
+    """Cumulative bucketed distribution per label set"""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels: Any) -> int:
+        state = self._values.get(_label_key(labels))
+        return state[-1] if state else 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        values = {}
+        with self._lock:
+            for key, state in self._values.items():
+                cumulative = 0
+                buckets = {}
+                for upper, bucket_count in zip(self.buckets, state):
+                    cumulative += bucket_count
+                    buckets["+Inf" if upper == math.inf else str(upper)] = cumulative
+                values[_label_str(key)] = {"buckets": buckets, "sum": state[-2], "count": state[-1]}
+        return {"type": "histogram", "description": self.description, "values": values}
+
+
+class MetricsRegistry:
+    """Named metrics, created on first use"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls: type, name: str, description: str, **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, description, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(
+        self, name: str, description: str = "", buckets: Optional[Sequence[float]] = None
+    ) -> Histogram:
+        kwargs = {"buckets": buckets} if buckets is not None else {}
+        return self._get_or_create(Histogram, name, description, **kwargs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
+
+
+registry = MetricsRegistry()
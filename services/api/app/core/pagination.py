@@ -0,0 +1,198 @@
+"""
+Keyset (cursor) pagination
+Lists are ordered by a unique key such as (created_at, id); a page after a
+cursor is a range condition on that key, which the matching index answers
+directly instead of reading and discarding every row of the earlier pages.
+Totals are optional: screens that only scroll ask for an estimate or none.
+"""
+
+import base64
+import binascii
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, List, Literal, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.sql.visitors import InternalTraversal
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# exact: COUNT(*) per request; estimate: planner estimate (PostgreSQL) or a
+# recent count, cached per worker; none: no total, only has_more
+TotalMode = Literal["exact", "estimate", "none"]
+
+count_estimates = registry.counter(
+    "list_count_estimates_total", "List totals answered by estimate, by source"
+)
+
+
+class Keyset:
+    """Unique sort key of a list and the cursors that point into it"""
+
+    def __init__(self, name: str, *columns: Any, descending: bool = False):
+        self.name = name
+        self.columns = columns
+        self.descending = descending
+
+    def order_by(self) -> list:
+        return [column.desc() if self.descending else column.asc() for column in self.columns]
+
+    def cursor_for(self, row: Any) -> str:
+        values = []
+        for column in self.columns:
+            value = getattr(row, column.key)
+            values.append(value.isoformat() if isinstance(value, datetime) else str(value))
+        payload = json.dumps({"k": self.name, "v": values}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def _decode(self, cursor: str) -> List[Any]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if payload["k"] != self.name or len(payload["v"]) != len(self.columns):
+                raise ValueError("cursor belongs to another list")
+            values = []
+            for column, raw in zip(self.columns, payload["v"]):
+                python_type = column.type.python_type
+                if python_type is datetime:
+                    values.append(datetime.fromisoformat(raw))
+                elif python_type is uuid.UUID:
+                    values.append(uuid.UUID(raw))
+                else:
+                    values.append(raw)
+            return values
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    def after(self, cursor: str) -> Any:
+        """Condition selecting the rows that come after ``cursor``"""
+        values = self._decode(cursor)
+        key = tuple_(*self.columns)
+        return key < tuple_(*values) if self.descending else key > tuple_(*values)
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: Optional[str]
+    has_more: bool
+
+
+def paginate(
+    query: Query, keyset: Optional[Keyset], cursor: Optional[str], skip: int, limit: int
+) -> Page:
+    """One page of ``query`` in keyset order, plus the cursor of the next page
+
+    With a cursor the page starts right after it and ``skip`` is ignored;
+    without one, ``skip`` still works for existing callers. One row past the
+    page is fetched to tell whether another page follows. Without a keyset the
+    query keeps its own order and only ``skip`` applies.
+    """
+    if keyset is not None:
+        query = query.order_by(*keyset.order_by())
+    if cursor and keyset is not None:
+        query = query.filter(keyset.after(cursor))
+    else:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = keyset.cursor_for(rows[-1]) if has_more and keyset and rows else None
+    return Page(rows, next_cursor, has_more)
+
+
+class CountEstimates:
+    """Per-worker cache of approximate list totals, keyed by the filtered query"""
+
+    def __init__(self, ttl_seconds: float, max_size: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, count = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return count
+
+    def put(self, key: str, count: int) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, count)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+count_estimates_cache = CountEstimates(ttl_seconds=settings.LIST_COUNT_ESTIMATE_TTL_SECONDS)
+
+
+class ExplainJSON(Executable, ClauseElement):
+    """``EXPLAIN (FORMAT JSON)`` of a statement
+
+    Compiled as part of the statement, so its parameters go through the column
+    types and expanding IN lists are rendered like in any other execution.
+    """
+
+    inherit_cache = True
+    _traverse_internals = [("statement", InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, statement: Any):
+        self.statement = statement
+
+
+@compiles(ExplainJSON)
+def _compile_explain(element: ExplainJSON, compiler: Any, **kw: Any) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _planner_rows(query: Query) -> Optional[int]:
+    """PostgreSQL's row estimate for ``query``, read from EXPLAIN without running it"""
+    result = query.session.connection().execute(ExplainJSON(query.statement)).scalar()
+    plan = json.loads(result) if isinstance(result, str) else result
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_total(query: Query, mode: TotalMode) -> Optional[int]:
+    """Total rows of a filtered list query, as requested by ``mode``"""
+    if mode == "none":
+        return None
+    query = query.enable_eagerloads(False).order_by(None)
+    if mode == "exact":
+        return query.count()
+
+    compiled = query.statement.compile(dialect=query.session.get_bind().dialect)
+    key = f"{compiled}|{sorted(compiled.params.items(), key=lambda item: item[0])!r}"
+    cached = count_estimates_cache.get(key)
+    if cached is not None:
+        count_estimates.inc(source="cache")
+        return cached
+
+    if compiled.dialect.name == "postgresql":
+        count = _planner_rows(query)
+        count_estimates.inc(source="planner")
+    else:
+        count = query.count()
+        count_estimates.inc(source="count")
+    count_estimates_cache.put(key, count)
+    return count
@@ -0,0 +1,113 @@
+"""
+Authenticated principals
+A small immutable view of the current user, built from the access token claims.
+The current token version of each user is cached per token subject, so that
+authenticated requests do not load the users row every time
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.user import User, UserRole
+
+principal_cache_hits = registry.counter(
+    "auth_principal_cache_hits_total", "Authenticated requests served from the principal cache"
+)
+principal_cache_misses = registry.counter(
+    "auth_principal_cache_misses_total", "Authenticated requests that loaded the user row"
+)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Who is making the request: enough for authorization, nothing more"""
+
+    id: str
+    email: str
+    role: UserRole
+    is_active: bool
+    token_version: int = 0
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=str(user.id),
+            email=user.email,
+            role=user.role,
+            is_active=user.is_active,
+            token_version=user.token_version or 0,
+        )
+
+    @classmethod
+    def from_claims(cls, claims: Dict[str, Any]) -> Optional["Principal"]:
+        """Principal from access token claims; None for tokens issued without them"""
+        if not all(claims.get(key) is not None for key in ("sub", "uid", "role")):
+            return None
+        return cls(
+            id=claims["uid"],
+            email=claims["sub"],
+            role=UserRole(claims["role"]),
+            is_active=True,
+            token_version=claims.get("ver", 0),
+        )
+
+
+class PrincipalCache:
+    """Bounded LRU of principals keyed by token subject, with a short TTL
+
+    The cache is per process: invalidate() only reaches the current worker, and
+    other workers pick up a change once their entry expires.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, subject: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                principal_cache_misses.inc()
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.monotonic():
+                del self._entries[subject]
+                principal_cache_misses.inc()
+                return None
+            self._entries.move_to_end(subject)
+        principal_cache_hits.inc()
+        return principal
+
+    def put(self, subject: str, principal: Principal) -> None:
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *subjects: str) -> None:
+        with self._lock:
+            for subject in subjects:
+                self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+)
@@ -0,0 +1,155 @@
+"""
+In-process barcode/SKU index for POS scans
+Maps each active product's barcode and SKU to its pre-serialized scan record, so
+a scan is answered from a dict without touching the database. Product writes on
+this worker update the index immediately; writes on other workers are picked up
+when the entry expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.product import Product
+from app.schemas.product import ProductScanRecord
+
+index_hits = registry.counter(
+    "product_code_index_hits_total", "Scans answered from the in-process code index"
+)
+index_misses = registry.counter(
+    "product_code_index_misses_total", "Scans that fell back to the database"
+)
+
+BARCODE_PREFIX = "b:"
+SKU_PREFIX = "s:"
+
+
+@dataclass(frozen=True)
+class IndexedProduct:
+    id: str
+    keys: Tuple[str, ...]
+    # ProductScanRecord as JSON, ready to send
+    body: bytes
+
+    @classmethod
+    def from_product(cls, product: Product) -> "IndexedProduct":
+        keys = [SKU_PREFIX + product.sku]
+        if product.barcode:
+            keys.insert(0, BARCODE_PREFIX + product.barcode)
+        record = ProductScanRecord.model_validate(product)
+        return cls(id=str(product.id), keys=tuple(keys), body=record.model_dump_json().encode())
+
+
+class ProductCodeIndex:
+    """Bounded LRU of active products keyed by barcode and by SKU
+
+    A barcode match wins over a SKU match for the same code. Only active
+    products are kept; writing an inactive product removes it.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, IndexedProduct]]" = OrderedDict()
+        self._ids: Dict[str, IndexedProduct] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str, now: float) -> Optional[IndexedProduct]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, item = entry
+        if expires_at <= now:
+            self._remove(item.id)
+            return None
+        self._entries.move_to_end(key)
+        return item
+
+    def get(self, code: str) -> Optional[bytes]:
+        """Serialized scan record for a barcode or SKU, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._get(BARCODE_PREFIX + code, now) or self._get(SKU_PREFIX + code, now)
+        if item is None:
+            index_misses.inc()
+            return None
+        index_hits.inc()
+        return item.body
+
+    def _remove(self, product_id: str) -> None:
+        item = self._ids.pop(product_id, None)
+        if item is not None:
+            for key in item.keys:
+                self._entries.pop(key, None)
+
+    def _put(self, item: IndexedProduct, expires_at: float) -> None:
+        self._remove(item.id)
+        self._ids[item.id] = item
+        for key in item.keys:
+            self._entries[key] = (expires_at, item)
+        while len(self._ids) > self.max_size:
+            _, (_, oldest) = next(iter(self._entries.items()))
+            self._remove(oldest.id)
+
+    def put(self, product: Product) -> None:
+        """Add or refresh a product; inactive products are removed instead"""
+        if not product.is_active:
+            self.remove(str(product.id))
+            return
+        if self.max_size <= 0:
+            return
+        item = IndexedProduct.from_product(product)
+        with self._lock:
+            self._put(item, time.monotonic() + self._ttl())
+
+    def load(self, products: Iterable[Product]) -> int:
+        """Bulk-add products; returns the number indexed"""
+        items: List[IndexedProduct] = [
+            IndexedProduct.from_product(p) for p in products if p.is_active
+        ][: max(self.max_size, 0)]
+        expires_at = time.monotonic() + self._ttl()
+        with self._lock:
+            for item in items:
+                self._put(item, expires_at)
+        return len(items)
+
+    def remove(self, product_id: str) -> None:
+        with self._lock:
+            self._remove(product_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+
+    def _ttl(self) -> float:
+        # 0 means entries only change through writes on this worker
+        return self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+product_code_index = ProductCodeIndex(
+    ttl_seconds=settings.PRODUCT_CODE_INDEX_TTL_SECONDS,
+    max_size=settings.PRODUCT_CODE_INDEX_MAX_SIZE,
+)
+
+
+def warm_product_code_index(engine: Engine) -> int:
+    """Load active products into the index, up to its size bound"""
+    if product_code_index.max_size <= 0:
+        return 0
+    with Session(engine) as session:
+        products = session.scalars(
+            select(Product).where(Product.is_active).limit(product_code_index.max_size)
+        )
+        return product_code_index.load(products)
@@ -0,0 +1,142 @@
+"""
+Per-request SQL query counting and budgets
+Catches N+1 query patterns before they reach production-sized data
+"""
+
+import logging
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+# Queries per request: 1, 2, ... 100
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+queries_per_request = registry.histogram(
+    "db_queries_per_request", "SQL statements executed per request", buckets=QUERY_COUNT_BUCKETS
+)
+budget_exceeded = registry.counter(
+    "db_query_budget_exceeded_total", "Requests that executed more queries than their budget"
+)
+
+
+class QueryBudgetExceededError(RuntimeError):
+    """Raised in enforcing mode when a request runs more queries than its budget"""
+
+
+class QueryStats:
+    """SQL statements executed while handling one request"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.budget: Optional[int] = None
+        self.statements: StatementCounter = StatementCounter()
+
+    def repeated_statements(self, threshold: int) -> list:
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    stats = _current_stats.get()
+    if stats is None:
+        return
+
+    stats.count += 1
+    stats.statements[statement] += 1
+
+    if stats.budget is not None and stats.count > stats.budget and settings.QUERY_BUDGET_ENFORCE:
+        raise QueryBudgetExceededError(
+            f"Query budget of {stats.budget} exceeded; statement #{stats.count}: {statement}"
+        )
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats for the request being handled, if any"""
+    return _current_stats.get()
+
+
+def query_budget(max_queries: int) -> Callable[[], None]:
+    """Dependency declaring the most SQL statements an endpoint may run
+
+    Usage: ``@router.get("/", dependencies=[Depends(query_budget(5))])``. The budget
+    covers the whole request, including authentication.
+    """
+
+    def declare_budget() -> None:
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.budget = max_queries
+
+    return declare_budget
+
+
+class QueryCountMiddleware:
+    """ASGI middleware that counts SQL statements per request
+
+    Adds an ``X-Query-Count`` response header, records the count in metrics and
+    logs requests that exceed their budget or repeat the same statement.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_count(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER.lower().encode(), str(stats.count).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _current_stats.reset(token)
+            self._report(scope, stats)
+
+    @staticmethod
+    def _report(scope: dict, stats: QueryStats) -> None:
+        route = scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        queries_per_request.observe(stats.count, route=path)
+
+        if stats.budget is not None and stats.count > stats.budget:
+            budget_exceeded.inc(route=path)
+            logger.warning(
+                "%s %s ran %d queries (budget %d)",
+                scope.get("method"),
+                path,
+                stats.count,
+                stats.budget,
+            )
+
+        for statement, times in stats.repeated_statements(settings.QUERY_REPEAT_WARN_THRESHOLD):
+            logger.warning(
+                "%s %s repeated a statement %d times (possible N+1): %s",
+                scope.get("method"),
+                path,
+                times,
+                statement,
+            )
@@ -0,0 +1,146 @@
+"""
+Login throttling
+Token buckets per account and per client IP, checked before any password hashing
+so a client retrying in a loop is refused cheaply instead of burning bcrypt CPU
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit:login:"
+
+login_throttled = registry.counter(
+    "auth_login_throttled_total", "Login attempts refused before hashing, by bucket"
+)
+
+
+class MemoryTokenBuckets:
+    """Per-process token buckets, bounded to the most recently used keys
+
+    Each worker keeps its own buckets, so the effective limit is per worker.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / refill_per_second
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+# Refill, then take one token if there is one; returns the wait in milliseconds
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return wait
+"""
+
+
+class RedisTokenBuckets:
+    """Token buckets shared by every worker; each take is one script call
+
+    Fails open: while Redis is unreachable logins are not throttled, rather than
+    not possible at all.
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        try:
+            wait_ms = self._take(
+                keys=[KEY_PREFIX + key], args=[capacity, refill_per_second, time.time()]
+            )
+        except Exception as e:
+            logger.warning("Could not check login rate limit, allowing attempt: %s", e)
+            return 0.0
+        return int(wait_ms) / 1000
+
+
+class LoginThrottle:
+    """One bucket per client IP and one per account name"""
+
+    def __init__(self, buckets: Any):
+        self.buckets = buckets
+
+    def check(self, username: str, client_ip: str) -> int:
+        """Charge one login attempt; returns 0 if allowed, else Retry-After seconds
+
+        The IP bucket is charged first, so spraying many accounts from one
+        address is caught even though every account bucket is full.
+        """
+        limits = (
+            (
+                "ip",
+                f"ip:{client_ip}",
+                settings.LOGIN_RATE_IP_BURST,
+                settings.LOGIN_RATE_IP_PER_MINUTE,
+            ),
+            (
+                "account",
+                f"account:{username.strip().lower()}",
+                settings.LOGIN_RATE_ACCOUNT_BURST,
+                settings.LOGIN_RATE_ACCOUNT_PER_MINUTE,
+            ),
+        )
+        for scope, key, burst, per_minute in limits:
+            if burst <= 0 or per_minute <= 0:
+                continue
+            wait = self.buckets.take(key, burst, per_minute / 60)
+            if wait > 0:
+                login_throttled.inc(bucket=scope)
+                return max(math.ceil(wait), 1)
+        return 0
+
+
+def _build_buckets() -> Any:
+    if settings.LOGIN_RATE_LIMIT_BACKEND == "redis":
+        import redis
+
+        return RedisTokenBuckets(redis.Redis.from_url(settings.REDIS_URL))
+    return MemoryTokenBuckets()
+
+
+login_throttle = LoginThrottle(_build_buckets())
@@ -0,0 +1,282 @@
+"""
+Refresh token rotation
+Every login starts a token family; each refresh must present the family's latest
+refresh token and gets the next one. Presenting an older token means it was
+copied, so the whole family is revoked, including its outstanding access tokens.
+
+Families live in Redis (an in-memory store stands in for tests). Access token
+checks ask a local Bloom filter of revoked families, synced from the store every
+few seconds, and only go to the store when the filter says "maybe". If the store
+cannot be reached, logins and refreshes fail with RefreshTokenStoreUnavailableError
+(503) instead of issuing tokens that could never be rotated.
+"""
+
+import enum
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Tuple
+
+from app.core.bloom import BloomFilter
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+FAMILY_KEY_PREFIX = "refresh:family:"
+REVOKED_KEY = "refresh:revoked"
+
+reuse_detected = registry.counter(
+    "auth_refresh_token_reuse_total", "Refresh tokens presented after they were rotated"
+)
+revocation_lookups = registry.counter(
+    "auth_revocation_lookups_total", "Revocation checks answered by the filter or the store"
+)
+
+
+class RefreshTokenStoreUnavailableError(Exception):
+    """The family store could not be reached; the caller should retry later"""
+
+
+class Rotation(str, enum.Enum):
+    ROTATED = "rotated"
+    # The presented token was already rotated: someone else holds a copy
+    REUSED = "reused"
+    # Family expired, revoked or never existed
+    UNKNOWN = "unknown"
+
+
+def new_token_id() -> str:
+    return uuid.uuid4().hex
+
+
+class MemoryRefreshTokenStore:
+    """Process-local family store for tests and single-worker development"""
+
+    def __init__(self) -> None:
+        self._families: Dict[str, Tuple[str, float]] = {}
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def start_family(self, family: str, token_id: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._families[family] = (token_id, time.time() + ttl_seconds)
+
+    def rotate(self, family: str, token_id: str, new_token_id: str, ttl_seconds: float) -> Rotation:
+        with self._lock:
+            entry = self._families.get(family)
+            if entry is None or entry[1] <= time.time():
+                self._families.pop(family, None)
+                return Rotation.UNKNOWN
+            if entry[0] != token_id:
+                return Rotation.REUSED
+            self._families[family] = (new_token_id, time.time() + ttl_seconds)
+            return Rotation.ROTATED
+
+    def revoke_family(self, family: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._families.pop(family, None)
+            self._revoked[family] = time.time() + ttl_seconds
+
+    def is_revoked(self, family: str) -> bool:
+        with self._lock:
+            return self._revoked.get(family, 0.0) > time.time()
+
+    def revoked_families(self) -> List[str]:
+        now = time.time()
+        with self._lock:
+            for family in [f for f, expires_at in self._revoked.items() if expires_at <= now]:
+                del self._revoked[family]
+            return list(self._revoked)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._families.clear()
+            self._revoked.clear()
+
+
+# Compare-and-set of the family's current token id; 1 rotated, 0 reused, -1 unknown
+_ROTATE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return -1
+end
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+_ROTATION_RESULTS = {1: Rotation.ROTATED, 0: Rotation.REUSED, -1: Rotation.UNKNOWN}
+
+
+class RedisRefreshTokenStore:
+    """Family store shared by every worker
+
+    Each family is a key holding its current token id. Revoked families are kept
+    in a sorted set scored by when they stop mattering, so a sync only reads the
+    live ones.
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+        self._rotate = client.register_script(_ROTATE_SCRIPT)
+
+    def start_family(self, family: str, token_id: str, ttl_seconds: float) -> None:
+        self.client.set(FAMILY_KEY_PREFIX + family, token_id, ex=int(ttl_seconds))
+
+    def rotate(self, family: str, token_id: str, new_token_id: str, ttl_seconds: float) -> Rotation:
+        result = self._rotate(
+            keys=[FAMILY_KEY_PREFIX + family], args=[token_id, new_token_id, int(ttl_seconds)]
+        )
+        return _ROTATION_RESULTS[int(result)]
+
+    def revoke_family(self, family: str, ttl_seconds: float) -> None:
+        now = time.time()
+        pipeline = self.client.pipeline()
+        pipeline.delete(FAMILY_KEY_PREFIX + family)
+        pipeline.zadd(REVOKED_KEY, {family: now + ttl_seconds})
+        pipeline.zremrangebyscore(REVOKED_KEY, "-inf", now)
+        pipeline.execute()
+
+    def is_revoked(self, family: str) -> bool:
+        expires_at = self.client.zscore(REVOKED_KEY, family)
+        return expires_at is not None and expires_at > time.time()
+
+    def revoked_families(self) -> List[str]:
+        families = self.client.zrangebyscore(REVOKED_KEY, time.time(), "+inf")
+        return [f.decode() if isinstance(f, bytes) else f for f in families]
+
+
+class RevocationFilter:
+    """Local Bloom filter of revoked families, rebuilt from the store periodically
+
+    A family added on this worker is visible immediately; one revoked on another
+    worker becomes visible at the next sync.
+    """
+
+    def __init__(self, store: Any, sync_seconds: float, capacity: int, error_rate: float):
+        self.store = store
+        self.sync_seconds = sync_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._synced_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _stale(self) -> bool:
+        return time.monotonic() - self._synced_at >= self.sync_seconds
+
+    def needs_lookup(self, family: str) -> bool:
+        """False when the filter alone proves the family is not revoked"""
+        if self._stale() or family in self._bloom:
+            return True
+        revocation_lookups.inc(source="filter")
+        return False
+
+    def sync(self) -> None:
+        with self._lock:
+            if not self._stale():
+                return
+            try:
+                families = self.store.revoked_families()
+            except Exception as e:
+                # Keep the previous filter and retry at the next interval
+                logger.warning("Could not sync revoked token families: %s", e)
+                self._synced_at = time.monotonic()
+                return
+            self._bloom = BloomFilter.from_items(
+                families, max(self.capacity, len(families)), self.error_rate
+            )
+            self._synced_at = time.monotonic()
+
+    def add(self, family: str) -> None:
+        self._bloom.add(family)
+
+    def is_revoked(self, family: str) -> bool:
+        """Whether the family is revoked; goes to the store only for filter hits"""
+        if self._stale():
+            self.sync()
+        if family not in self._bloom:
+            revocation_lookups.inc(source="filter")
+            return False
+        revocation_lookups.inc(source="store")
+        try:
+            return bool(self.store.is_revoked(family))
+        except Exception as e:
+            logger.warning("Could not confirm revocation of token family %s: %s", family, e)
+            return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+            self._synced_at = float("-inf")
+
+
+class RefreshTokenFamilies:
+    """Issues, rotates and revokes refresh token families"""
+
+    def __init__(self, store: Any, revocations: RevocationFilter):
+        self.store = store
+        self.revocations = revocations
+
+    @property
+    def family_ttl_seconds(self) -> float:
+        return settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+
+    @property
+    def revocation_ttl_seconds(self) -> float:
+        # A revoked family's refresh tokens are already dead in the store, so the
+        # revocation only has to outlive its access tokens
+        return settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    def start(self) -> Tuple[str, str]:
+        """New family; returns (family id, first refresh token id)"""
+        family, token_id = new_token_id(), new_token_id()
+        try:
+            self.store.start_family(family, token_id, self.family_ttl_seconds)
+        except Exception as e:
+            logger.warning("Could not start refresh token family: %s", e)
+            raise RefreshTokenStoreUnavailableError() from e
+        return family, token_id
+
+    def rotate(self, family: str, token_id: str) -> Tuple[Rotation, str]:
+        """Swap the family's current refresh token id; revokes the family on reuse"""
+        next_token_id = new_token_id()
+        try:
+            result = self.store.rotate(family, token_id, next_token_id, self.family_ttl_seconds)
+        except Exception as e:
+            logger.warning("Could not rotate refresh token family %s: %s", family, e)
+            raise RefreshTokenStoreUnavailableError() from e
+        if result is Rotation.REUSED:
+            reuse_detected.inc()
+            logger.warning("Refresh token reuse detected; revoking token family %s", family)
+            self.revoke(family)
+        return result, next_token_id
+
+    def revoke(self, family: str) -> None:
+        self.store.revoke_family(family, self.revocation_ttl_seconds)
+        self.revocations.add(family)
+
+
+def _build_store() -> Any:
+    if settings.REFRESH_TOKEN_STORE == "memory":
+        return MemoryRefreshTokenStore()
+
+    import redis
+
+    return RedisRefreshTokenStore(redis.Redis.from_url(settings.REDIS_URL))
+
+
+refresh_token_store = _build_store()
+refresh_token_families = RefreshTokenFamilies(
+    refresh_token_store,
+    RevocationFilter(
+        refresh_token_store,
+        sync_seconds=settings.REVOCATION_SYNC_SECONDS,
+        capacity=settings.REVOCATION_FILTER_CAPACITY,
+        error_rate=settings.REVOCATION_FILTER_ERROR_RATE,
+    ),
+)
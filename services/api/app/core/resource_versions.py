@@ -0,0 +1,124 @@
+"""
+Version counters for rarely changing reference data
+Every write to products, categories or suppliers bumps that resource's version.
+List responses carry the version in a strong ETag, so a terminal that already
+has the current list gets 304 Not Modified from the version alone, without a
+database query.
+"""
+
+import hashlib
+import logging
+import secrets
+import threading
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "version:"
+
+PRODUCTS = "products"
+CATEGORIES = "categories"
+SUPPLIERS = "suppliers"
+
+not_modified = registry.counter(
+    "conditional_get_not_modified_total", "GETs answered 304 from the resource version"
+)
+
+
+def _initial_version() -> int:
+    # Random start, so versions handed out before a restart or a Redis flush are
+    # never handed out again for different content
+    return secrets.randbits(48)
+
+
+class MemoryVersionStore:
+    """Per-process versions; only coherent with a single worker (tests, dev)"""
+
+    def __init__(self) -> None:
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, resource: str) -> int:
+        with self._lock:
+            return self._versions.setdefault(resource, _initial_version())
+
+    def bump(self, resource: str) -> int:
+        with self._lock:
+            version = self._versions.get(resource, _initial_version()) + 1
+            self._versions[resource] = version
+            return version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+
+
+class RedisVersionStore:
+    """Versions shared by all workers, one INCR counter per resource"""
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    def get(self, resource: str) -> int:
+        key = KEY_PREFIX + resource
+        version = self.client.get(key)
+        if version is None:
+            self.client.set(key, _initial_version(), nx=True)
+            version = self.client.get(key)
+        return int(version)
+
+    def bump(self, resource: str) -> int:
+        return int(self.client.incr(KEY_PREFIX + resource))
+
+
+class ResourceVersions:
+    """Current versions and the ETags derived from them"""
+
+    def __init__(self, store: Any):
+        self.store = store
+
+    def bump(self, resource: str) -> None:
+        """Call after committing a write to ``resource``"""
+        try:
+            self.store.bump(resource)
+        except Exception as e:
+            logger.warning("Could not bump %s version: %s", resource, e)
+
+    def etag(self, resource: str, path: str, query: str) -> Optional[str]:
+        """Strong ETag for a GET of ``path?query``, or None if the version is unavailable
+
+        The query string is part of the tag, since filters and pages of the same
+        resource are different representations.
+        """
+        try:
+            version = self.store.get(resource)
+        except Exception as e:
+            logger.warning("Could not read %s version: %s", resource, e)
+            return None
+        digest = hashlib.blake2b(f"{path}?{query}".encode(), digest_size=8).hexdigest()
+        return f'"{resource}-{version}-{digest}"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag`` (weak comparison, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def _build_store() -> Any:
+    if settings.RESOURCE_VERSION_STORE == "memory":
+        return MemoryVersionStore()
+
+    import redis
+
+    return RedisVersionStore(redis.Redis.from_url(settings.REDIS_URL))
+
+
+resource_versions = ResourceVersions(_build_store())
@@ -1,13 +1,27 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Any, Optional, cast
+from typing import Any, Optional, Tuple, cast
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.metrics import registry
+
+token_cache_hits = registry.counter(
+    "auth_token_cache_hits_total", "Tokens whose verified payload came from the cache"
+)
+token_cache_misses = registry.counter(
+    "auth_token_cache_misses_total", "Tokens that had to be verified and decoded"
+)
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -20,6 +34,16 @@ def get_password_hash(password: str) -> str:
     return cast(str, pwd_context.hash(password))
 
 
+def token_claims(user: Any) -> dict[str, Any]:
+    """Claims that let a request be authorized without loading the user"""
+    return {
+        "sub": user.email,
+        "uid": str(user.id),
+        "role": user.role.value if hasattr(user.role, "value") else user.role,
+        "ver": user.token_version or 0,
+    }
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -42,10 +66,75 @@ def create_refresh_token(data: dict) -> str:
     return cast(str, encoded_jwt)
 
 
+class TokenCache:
+    """Bounded LRU of verified token payloads, keyed by a digest of the raw token
+
+    An entry lives until the token's own ``exp``, so a cached token stops being
+    accepted at the same moment jwt.decode would start rejecting it. Only tokens
+    that verified are stored.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[float, dict[Any, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict[Any, Any]]:
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                token_cache_misses.inc()
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                token_cache_misses.inc()
+                return None
+            self._entries.move_to_end(key)
+        token_cache_hits.inc()
+        # Callers get their own copy; the cached payload must stay untouched
+        return dict(payload)
+
+    def put(self, token: str, payload: dict[Any, Any]) -> None:
+        expires_at = payload.get("exp")
+        if self.max_size <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (float(expires_at), dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = TokenCache(max_size=settings.TOKEN_CACHE_MAX_SIZE)
+
+
 def decode_token(token: str) -> Optional[dict[Any, Any]]:
-    """Decode JWT token"""
+    """Decode JWT token
+
+    Verified payloads are cached until they expire, so a terminal reusing one
+    token skips the signature check on every request after the first.
+    """
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return cast(dict[Any, Any], payload)
     except JWTError:
         return None
+    token_cache.put(token, payload)
+    return cast(dict[Any, Any], payload)
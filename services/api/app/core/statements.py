@@ -0,0 +1,128 @@
+"""
+Cached statements for hot primary-key and unique lookups
+Built with lambda_stmt so the SQL construct and its compiled form are cached once
+per process instead of being rebuilt on every request
+"""
+
+import logging
+import uuid
+from typing import Any, Callable, Iterable, List, Tuple
+
+from sqlalchemy import lambda_stmt, or_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+
+from app.models.inventory import InventoryLot
+from app.models.product import Product
+from app.models.sales import SalesOrder
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def product_by_id(product_id: Any) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Product).where(Product.id == product_id))
+
+
+def products_by_ids(product_ids: List[Any]) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Product).where(Product.id.in_(product_ids)))
+
+
+def product_by_sku(sku: str) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Product).where(Product.sku == sku))
+
+
+def product_by_barcode(barcode: str) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Product).where(Product.barcode == barcode))
+
+
+def active_product_by_code(code: str) -> StatementLambdaElement:
+    """Active product whose barcode or SKU is ``code``; a barcode match wins"""
+    return lambda_stmt(
+        lambda: select(Product)
+        .where(or_(Product.barcode == code, Product.sku == code), Product.is_active)
+        .order_by((Product.barcode == code).desc())
+        .limit(1)
+    )
+
+
+def user_by_email(email: str) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(User).where(User.email == email))
+
+
+def lot_by_id_for_update(lot_id: Any) -> StatementLambdaElement:
+    return lambda_stmt(
+        lambda: select(InventoryLot).where(InventoryLot.id == lot_id).with_for_update()
+    )
+
+
+def available_lot_for_update(product_id: Any, quantity: int) -> StatementLambdaElement:
+    return lambda_stmt(
+        lambda: select(InventoryLot)
+        .where(InventoryLot.product_id == product_id)
+        .where(InventoryLot.quantity_available >= quantity)
+        .limit(1)
+        .with_for_update()
+    )
+
+
+def sales_order_with_items_for_update(order_id: Any) -> StatementLambdaElement:
+    return lambda_stmt(
+        lambda: select(SalesOrder)
+        .options(selectinload(SalesOrder.items))
+        .where(SalesOrder.id == order_id)
+        .with_for_update()
+    )
+
+
+def _warmup_statements() -> Iterable[Tuple[str, Callable[[], StatementLambdaElement]]]:
+    """Every cached statement with placeholder parameters that match no rows"""
+    nil = uuid.UUID(int=0)
+    return [
+        ("product_by_id", lambda: product_by_id(nil)),
+        ("products_by_ids", lambda: products_by_ids([nil])),
+        ("product_by_sku", lambda: product_by_sku("")),
+        ("product_by_barcode", lambda: product_by_barcode("")),
+        ("active_product_by_code", lambda: active_product_by_code("")),
+        ("user_by_email", lambda: user_by_email("")),
+        ("lot_by_id_for_update", lambda: lot_by_id_for_update(nil)),
+        ("available_lot_for_update", lambda: available_lot_for_update(nil, 0)),
+        ("sales_order_with_items_for_update", lambda: sales_order_with_items_for_update(nil)),
+    ]
+
+
+def warm_statement_cache(engine: Engine) -> int:
+    """Compile every cached statement into the engine's compiled cache
+
+    Runs each lookup once through an ORM session, with parameters that match
+    nothing, inside a transaction that is rolled back. Returns the number of
+    statements warmed.
+    """
+    warmed = 0
+    with Session(engine) as session:
+        for name, build in _warmup_statements():
+            try:
+                session.execute(build()).all()
+                warmed += 1
+            except Exception as e:
+                logger.warning("Could not warm statement %s: %s", name, e)
+                session.rollback()
+        session.rollback()
+    return warmed
+
+
+async def warm_async_statement_cache(engine: AsyncEngine) -> int:
+    """Async engine counterpart of warm_statement_cache"""
+    warmed = 0
+    async with AsyncSession(engine) as session:
+        for name, build in _warmup_statements():
+            try:
+                (await session.execute(build())).all()
+                warmed += 1
+            except Exception as e:
+                logger.warning("Could not warm statement %s: %s", name, e)
+                await session.rollback()
+        await session.rollback()
+    return warmed
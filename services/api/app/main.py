@@ -1,9 +1,109 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
 
 from app.api.v1.api import api_router
+from app.core import database
 from app.core.config import settings
+from app.core.database import is_query_canceled
+from app.core.hashing import PasswordHasherBusyError, password_hasher
+from app.core.lifecycle import (
+    DrainMiddleware,
+    dispose_engine,
+    serve,
+    tracker,
+    warm_async_pool,
+    warm_pool,
+    warm_reference_data,
+)
+from app.core.metrics import registry
+from app.core.product_index import warm_product_code_index
+from app.core.query_budget import QUERY_COUNT_HEADER, QueryCountMiddleware
+from app.core.refresh_tokens import RefreshTokenStoreUnavailableError
+from app.core.statements import warm_async_statement_cache, warm_statement_cache
+from app.services.ngram_search import warm_product_search_index
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_up() -> None:
+    """Open pooled connections and fill caches before the first request"""
+    connections = settings.DB_POOL_WARMUP_CONNECTIONS
+    try:
+        await run_in_threadpool(warm_pool, database.engine, connections)
+        for read_engine in database.read_engines:
+            await run_in_threadpool(warm_pool, read_engine, connections)
+        if database.async_engine is not None:
+            await warm_async_pool(database.async_engine, connections)
+    except Exception as e:
+        logger.warning("Connection pool warm-up failed: %s", e)
+
+    # Compile the hot lookup statements before the first request needs them
+    try:
+        await run_in_threadpool(warm_statement_cache, database.engine)
+        if database.async_engine is not None:
+            await warm_async_statement_cache(database.async_engine)
+    except Exception as e:
+        logger.warning("Statement cache warm-up failed: %s", e)
+
+    try:
+        await run_in_threadpool(warm_reference_data, database.engine)
+    except Exception as e:
+        logger.warning("Reference data warm-up failed: %s", e)
+
+    try:
+        await run_in_threadpool(warm_product_code_index, database.engine)
+    except Exception as e:
+        logger.warning("Product code index warm-up failed: %s", e)
+
+    try:
+        await run_in_threadpool(warm_product_search_index, database.engine)
+    except Exception as e:
+        logger.warning("Product search index build failed: %s", e)
+
+    # Spawning the bcrypt workers takes a moment; do it before the first login
+    try:
+        await password_hasher.start()
+    except Exception as e:
+        logger.warning("Password hashing pool warm-up failed: %s", e)
+
+
+async def _drain_and_dispose() -> None:
+    """Let in-flight requests finish, then close every pooled connection
+
+    Under DrainingServer the SIGTERM drain has already run and this returns
+    without waiting; other shutdowns (SIGINT, plain uvicorn) still wait here.
+    """
+    tracker.start_draining()
+    if not await tracker.wait_idle(settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS):
+        logger.warning("Shutting down with %d request(s) still in flight", tracker.active)
+
+    for sync_engine in [database.engine, *database.read_engines]:
+        await run_in_threadpool(dispose_engine, sync_engine)
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown hooks
+
+    On SIGTERM, DrainingServer (``python -m app.main``) drains before uvicorn stops
+    accepting connections and runs the shutdown half.
+    """
+    tracker.reset()
+    await _warm_up()
+
+    yield
+
+    await _drain_and_dispose()
+    await run_in_threadpool(password_hasher.shutdown)
+
 
 # Create FastAPI application
 app = FastAPI(
@@ -13,6 +113,7 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_PREFIX}/openapi.json",
     docs_url=f"{settings.API_V1_PREFIX}/docs",
     redoc_url=f"{settings.API_V1_PREFIX}/redoc",
+    lifespan=lifespan,
 )
 
 # CORS Middleware
@@ -22,11 +123,58 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[QUERY_COUNT_HEADER],
 )
 
+# Count SQL statements per request (X-Query-Count header, N+1 warnings)
+app.add_middleware(QueryCountMiddleware)
+
+# Outermost: track in-flight requests and refuse new work while shutting down
+app.add_middleware(DrainMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
+statement_timeouts = registry.counter(
+    "db_statement_timeouts_total", "Requests aborted by a statement timeout"
+)
+
+
+@app.exception_handler(OperationalError)
+async def statement_timeout_handler(request: Request, exc: OperationalError):
+    """Turn statement timeouts into a clean 504 instead of a 500"""
+    if not is_query_canceled(exc):
+        raise exc
+
+    route = request.scope.get("route")
+    statement_timeouts.inc(route=getattr(route, "path", "unmatched"))
+    return JSONResponse(
+        status_code=504,
+        content={"detail": "The query took too long. Please narrow the date range."},
+    )
+
+
+@app.exception_handler(PasswordHasherBusyError)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusyError):
+    """Shed logins and registrations while the password hashing pool is full"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-in attempts in progress. Please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(RefreshTokenStoreUnavailableError)
+async def refresh_token_store_unavailable_handler(
+    request: Request, exc: RefreshTokenStoreUnavailableError
+):
+    """Refuse logins and refreshes while refresh token families cannot be stored"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Sign-in is temporarily unavailable. Please retry shortly."},
+        headers={"Retry-After": "5"},
+    )
+
 
 @app.get("/")
 async def root():
@@ -60,6 +208,11 @@ async def readiness_check():
 
     health_status = {"status": "ready", "service": "api", "checks": {}}
 
+    # Shutting down: take this worker out of the load balancer
+    if tracker.draining:
+        health_status["status"] = "draining"
+        return JSONResponse(status_code=503, content=health_status)
+
     # Check database connection
     try:
         db = SessionLocal()
@@ -75,11 +228,12 @@ async def readiness_check():
 
 
 if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(
-        "app.main:app",
+    # Container entry point; for auto-reload in development run
+    # `uvicorn app.main:app --reload` instead
+    serve(
+        app,
         host="0.0.0.0",
         port=8000,
-        reload=settings.DEBUG,
+        drain_timeout=settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS,
+        forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS,
     )
@@ -1,7 +1,7 @@
 import enum
 import uuid
 
-from sqlalchemy import Boolean, Column, DateTime, Enum, String
+from sqlalchemy import Boolean, Column, DateTime, Enum, Integer, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 
@@ -26,6 +26,8 @@ class User(Base):
     role: Column[UserRole] = Column(Enum(UserRole), nullable=False, default=UserRole.STAFF)  # type: ignore[assignment]
     phone = Column(String(20))
     is_active = Column(Boolean, default=True)
+    # Bumped to revoke every outstanding token (role change, deactivation, admin revoke)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -4,6 +4,7 @@ from typing import Optional
 from pydantic import BaseModel, EmailStr
 
 from app.models.user import UserRole
+from app.schemas.common import IdStr
 
 
 class UserBase(BaseModel):
@@ -31,7 +32,7 @@ class UserUpdate(BaseModel):
 
 
 class UserResponse(UserBase):
-    id: str
+    id: IdStr
     is_active: bool
     created_at: datetime
 
@@ -81,4 +81,7 @@ class CategoryList(BaseModel):
     """Schema for paginated category list"""
 
     items: list[CategoryResponse]
-    total: int
+    # None when requested with total=none; approximate with total=estimate
+    total: Optional[int]
+    # Another page follows this one
+    has_more: bool = False
@@ -0,0 +1,17 @@
+"""
+Shared schema types
+"""
+
+import uuid
+from typing import Annotated, Any
+
+from pydantic import BeforeValidator
+
+
+def _id_to_str(value: Any) -> Any:
+    return str(value) if isinstance(value, uuid.UUID) else value
+
+
+# UUID keys exposed as strings. ORM objects hold uuid.UUID values, both when loaded
+# from PostgreSQL and when their Python-side default has just been applied.
+IdStr = Annotated[str, BeforeValidator(_id_to_str)]
@@ -79,7 +79,12 @@ class InventoryLotResponse(InventoryLotBase):
 
 class InventoryLotList(BaseModel):
     items: List[InventoryLotResponse]
-    total: int
+    # None when requested with total=none; approximate with total=estimate
+    total: Optional[int]
+    # Pass as ``cursor`` to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
+    # Another page follows this one
+    has_more: bool = False
 
 
 class ExpiringLotsResponse(BaseModel):
@@ -1,8 +1,11 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+from app.models.product import DrugType
+from app.schemas.common import IdStr
 
 
 class ProductBase(BaseModel):
@@ -12,7 +15,7 @@ class ProductBase(BaseModel):
     name_en: Optional[str] = None
     generic_name: Optional[str] = None
     description: Optional[str] = None
-    category_id: Optional[str] = None
+    category_id: Optional[IdStr] = None
     active_ingredient: Optional[str] = None
     dosage_form: Optional[str] = None
     strength: Optional[str] = None
@@ -42,7 +45,7 @@ class ProductUpdate(BaseModel):
     name_en: Optional[str] = None
     generic_name: Optional[str] = None
     description: Optional[str] = None
-    category_id: Optional[str] = None
+    category_id: Optional[IdStr] = None
     active_ingredient: Optional[str] = None
     dosage_form: Optional[str] = None
     strength: Optional[str] = None
@@ -61,7 +64,7 @@ class ProductUpdate(BaseModel):
 
 
 class ProductResponse(ProductBase):
-    id: str
+    id: IdStr
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -69,8 +72,122 @@ class ProductResponse(ProductBase):
         from_attributes = True
 
 
+class ProductScanRecord(BaseModel):
+    """What the POS needs to ring up a scanned item"""
+
+    id: IdStr
+    sku: str
+    barcode: Optional[str] = None
+    name_th: str
+    name_en: Optional[str] = None
+    strength: Optional[str] = None
+    unit_of_measure: Optional[str] = None
+    drug_type: Optional[str] = None
+    selling_price: Decimal
+    is_vat_applicable: Optional[bool] = None
+    vat_rate: Optional[Decimal] = None
+    is_prescription_required: Optional[bool] = None
+    is_controlled_substance: Optional[bool] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ProductSyncRecord(ProductScanRecord):
+    """A product in the terminal catalog feed; inactive ones are to be dropped"""
+
+    is_active: bool
+
+
 class ProductList(BaseModel):
     items: List[ProductResponse]
-    total: int
+    # None when requested with total=none; approximate with total=estimate
+    total: Optional[int]
     skip: int
     limit: int
+    # Pass as ``cursor`` to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
+    # Another page follows this one
+    has_more: bool = False
+
+
+class ProductImportError(BaseModel):
+    # Row number in the sheet; the header is row 1
+    row: int
+    message: str
+
+
+class ProductImportResult(BaseModel):
+    """Summary of a bulk product import"""
+
+    rows: int
+    created: int
+    failed: int
+    # The first failed rows, in sheet order; ``failed`` counts them all
+    errors: List[ProductImportError] = []
+
+
+class ProductRepriceRequest(BaseModel):
+    """Which products to reprice and how
+
+    Operations:
+    - ``set_price``: selling price becomes ``value``
+    - ``percent_change``: selling price changes by ``value`` percent
+    - ``margin_over_cost``: selling price becomes cost price plus ``value`` percent
+    - ``set_vat``: VAT category and/or rate become ``vat_category``/``vat_rate``
+    """
+
+    # Filters; at least one of these is required
+    product_ids: Optional[List[IdStr]] = Field(None, max_length=10000)
+    category_id: Optional[IdStr] = None
+    manufacturer: Optional[str] = None
+    drug_type: Optional[DrugType] = None
+    # None matches active and inactive products
+    is_active: Optional[bool] = True
+
+    operation: Literal["set_price", "percent_change", "margin_over_cost", "set_vat"]
+    value: Optional[Decimal] = None
+    vat_category: Optional[str] = None
+    vat_rate: Optional[Decimal] = Field(None, ge=0, le=100)
+    # Preview the new prices without changing anything
+    dry_run: bool = False
+
+    @model_validator(mode="after")
+    def check_filter_and_operation(self) -> "ProductRepriceRequest":
+        """Require a filter and the inputs of the chosen operation"""
+        filters = (self.product_ids, self.category_id, self.manufacturer, self.drug_type)
+        if all(f is None for f in filters):
+            raise ValueError(
+                "Give product_ids, category_id, manufacturer or drug_type to select products"
+            )
+        if self.operation == "set_vat":
+            if self.vat_category is None and self.vat_rate is None:
+                raise ValueError("set_vat needs vat_category or vat_rate")
+        elif self.value is None:
+            raise ValueError(f"{self.operation} needs a value")
+        elif self.operation == "percent_change" and self.value <= -100:
+            raise ValueError("percent_change must be greater than -100")
+        elif self.value < 0:
+            raise ValueError(f"{self.operation} value cannot be negative")
+        return self
+
+
+class RepricedProduct(BaseModel):
+    id: IdStr
+    sku: str
+    name_th: str
+    old_selling_price: Decimal
+    selling_price: Decimal
+    vat_category: Optional[str] = None
+    vat_rate: Optional[Decimal] = None
+
+
+class ProductRepriceResult(BaseModel):
+    """Products matched by a reprice, with their prices before and after"""
+
+    dry_run: bool
+    matched: int
+    # Matched by the filters but left unchanged: margin_over_cost skips products
+    # without a cost price
+    skipped: int = 0
+    items: List[RepricedProduct]
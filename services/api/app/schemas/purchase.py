@@ -5,6 +5,8 @@ from typing import List, Optional
 
 from pydantic import BaseModel
 
+from app.schemas.common import IdStr
+
 
 class PurchaseOrderStatus(str, Enum):
     DRAFT = "draft"
@@ -16,7 +18,7 @@ class PurchaseOrderStatus(str, Enum):
 
 
 class PurchaseOrderItemBase(BaseModel):
-    product_id: str
+    product_id: IdStr
     quantity_ordered: int
     unit_price: Decimal
     discount_amount: Decimal = Decimal("0.00")
@@ -31,8 +33,8 @@ class PurchaseOrderItemCreate(BaseModel):
 
 
 class PurchaseOrderItemResponse(PurchaseOrderItemBase):
-    id: str
-    purchase_order_id: str
+    id: IdStr
+    purchase_order_id: IdStr
     quantity_received: int = 0
     created_at: datetime
 
@@ -41,7 +43,7 @@ class PurchaseOrderItemResponse(PurchaseOrderItemBase):
 
 
 class PurchaseOrderBase(BaseModel):
-    supplier_id: str
+    supplier_id: IdStr
     order_date: date
     expected_delivery_date: Optional[date] = None
     notes: Optional[str] = None
@@ -56,7 +58,7 @@ class PurchaseOrderCreate(BaseModel):
 
 
 class PurchaseOrderResponse(PurchaseOrderBase):
-    id: str
+    id: IdStr
     po_number: str
     subtotal: Decimal
     discount_amount: Decimal = Decimal("0.00")
@@ -65,8 +67,8 @@ class PurchaseOrderResponse(PurchaseOrderBase):
     total_amount: Decimal
     status: PurchaseOrderStatus
     actual_delivery_date: Optional[date] = None
-    created_by: Optional[str] = None
-    approved_by: Optional[str] = None
+    created_by: Optional[IdStr] = None
+    approved_by: Optional[IdStr] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -76,7 +78,12 @@ class PurchaseOrderResponse(PurchaseOrderBase):
 
 class PurchaseOrderList(BaseModel):
     items: List[PurchaseOrderResponse]
-    total: int
+    # None when requested with total=none; approximate with total=estimate
+    total: Optional[int]
+    # Pass as ``cursor`` to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
+    # Another page follows this one
+    has_more: bool = False
 
 
 class ReceiveItemData(BaseModel):
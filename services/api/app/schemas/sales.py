@@ -4,6 +4,8 @@ from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
+from app.schemas.common import IdStr
+
 
 class SalesOrderItemCreate(BaseModel):
     """Schema for creating sales order item"""
@@ -18,8 +20,8 @@ class SalesOrderItemCreate(BaseModel):
 class SalesOrderItemResponse(BaseModel):
     """Schema for sales order item response"""
 
-    id: str
-    product_id: str
+    id: IdStr
+    product_id: IdStr
     quantity: int
     unit_price: Decimal
     discount_amount: Decimal
@@ -28,7 +30,7 @@ class SalesOrderItemResponse(BaseModel):
     vat_amount: Decimal
     price_before_vat: Decimal
     price_including_vat: Decimal
-    lot_id: Optional[str] = None
+    lot_id: Optional[IdStr] = None
     created_at: datetime
 
     class Config:
@@ -49,9 +51,9 @@ class SalesOrderCreate(BaseModel):
 class SalesOrderResponse(BaseModel):
     """Schema for sales order response"""
 
-    id: str
+    id: IdStr
     order_number: str
-    customer_id: Optional[str] = None
+    customer_id: Optional[IdStr] = None
     prescription_number: Optional[str] = None
     # Financial
     subtotal: Decimal
@@ -67,8 +69,8 @@ class SalesOrderResponse(BaseModel):
     # Status
     status: str
     # References
-    cashier_id: Optional[str] = None
-    pharmacist_id: Optional[str] = None
+    cashier_id: Optional[IdStr] = None
+    pharmacist_id: Optional[IdStr] = None
     notes: Optional[str] = None
     # Items
     items: List[SalesOrderItemResponse] = []
@@ -94,6 +96,11 @@ class SalesOrderList(BaseModel):
     """Schema for paginated sales order list"""
 
     items: List[SalesOrderResponse]
-    total: int
+    # None when requested with total=none; approximate with total=estimate
+    total: Optional[int]
     skip: int
     limit: int
+    # Pass as ``cursor`` to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
+    # Another page follows this one
+    has_more: bool = False
@@ -167,4 +167,7 @@ class SupplierList(BaseModel):
     """Schema for paginated supplier list"""
 
     items: list[SupplierResponse]
-    total: int
+    # None when requested with total=none; approximate with total=estimate
+    total: Optional[int]
+    # Another page follows this one
+    has_more: bool = False
@@ -0,0 +1,312 @@
+"""
+In-process n-gram search over product names
+Thai is written without spaces between words, so names are indexed as overlapping
+character bigrams and trigrams rather than words. Postings are compact integer
+arrays and hits are ranked with BM25, so a partial Thai name finds its products
+without a database round trip per keystroke.
+"""
+
+import heapq
+import logging
+import math
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.product import Product
+from app.schemas.product import ProductResponse
+
+logger = logging.getLogger(__name__)
+
+GRAM_SIZES = (2, 3)
+SEARCH_FIELDS = ("name_th", "name_en", "generic_name", "active_ingredient")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# A document must contain at least this share of the query's grams
+MIN_GRAM_MATCH = 0.6
+
+# Grams in more than this share of documents (e.g. "ยา") barely rank anything;
+# they are skipped when the query has rarer ones
+COMMON_GRAM_RATIO = 0.5
+
+# Compact postings once this share of documents are superseded or deleted
+COMPACT_RATIO = 0.25
+
+search_seconds = registry.histogram(
+    "product_ngram_search_seconds", "Time to rank a query in the n-gram product index"
+)
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFC", text).casefold().replace("\u200b", "")
+    return " ".join(text.split())
+
+
+def grams(text: str, n: int) -> List[str]:
+    return [text[i : i + n] for i in range(len(text) - n + 1)]
+
+
+class NgramIndex:
+    """Character n-gram inverted index with BM25 ranking
+
+    Documents get dense integer ids. Updating a product appends a new document
+    and marks the old one dead; postings are compacted once enough are dead.
+    Each document carries its ProductResponse JSON so results are served as-is
+    (see the /search/ngram route).
+    """
+
+    def __init__(self) -> None:
+        self._docs: Dict[str, array] = {}
+        self._tfs: Dict[str, array] = {}
+        self._lengths = array("I")
+        self._alive = bytearray()
+        self._product_ids: List[str] = []
+        self._bodies: List[Optional[bytes]] = []
+        self._doc_of: Dict[str, int] = {}
+        self._total_length = 0
+        # BM25 length normalization per document, -1 for dead ones; recomputed
+        # after writes, since it depends on the average length
+        self._norms: Optional[array] = None
+        self._lock = threading.Lock()
+        self.built_at = time.monotonic()
+
+    @property
+    def live_count(self) -> int:
+        return len(self._doc_of)
+
+    def _add(self, product_id: str, texts: Iterable[str], body: bytes) -> None:
+        self._remove(product_id)
+        doc = len(self._product_ids)
+        counts: Counter = Counter()
+        length = 0
+        for text in texts:
+            text = normalize(text)
+            length += len(text)
+            for n in GRAM_SIZES:
+                counts.update(grams(text, n))
+        for gram, tf in counts.items():
+            if gram not in self._docs:
+                self._docs[gram] = array("I")
+                self._tfs[gram] = array("H")
+            self._docs[gram].append(doc)
+            self._tfs[gram].append(min(tf, 0xFFFF))
+        self._lengths.append(length)
+        self._alive.append(1)
+        self._product_ids.append(product_id)
+        self._bodies.append(body)
+        self._doc_of[product_id] = doc
+        self._total_length += length
+        self._norms = None
+
+    def _remove(self, product_id: str) -> None:
+        doc = self._doc_of.pop(product_id, None)
+        if doc is None:
+            return
+        self._alive[doc] = 0
+        self._bodies[doc] = None
+        self._total_length -= self._lengths[doc]
+        self._norms = None
+        if len(self._alive) - self.live_count > COMPACT_RATIO * max(len(self._alive), 1):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Drop dead documents and renumber the live ones"""
+        remap = array("i", [-1]) * len(self._alive)
+        lengths, alive = array("I"), bytearray()
+        product_ids: List[str] = []
+        bodies: List[Optional[bytes]] = []
+        for doc, is_alive in enumerate(self._alive):
+            if is_alive:
+                remap[doc] = len(product_ids)
+                lengths.append(self._lengths[doc])
+                alive.append(1)
+                product_ids.append(self._product_ids[doc])
+                bodies.append(self._bodies[doc])
+
+        for gram in list(self._docs):
+            docs, tfs = array("I"), array("H")
+            for doc, tf in zip(self._docs[gram], self._tfs[gram]):
+                if remap[doc] >= 0:
+                    docs.append(remap[doc])
+                    tfs.append(tf)
+            if docs:
+                self._docs[gram], self._tfs[gram] = docs, tfs
+            else:
+                del self._docs[gram], self._tfs[gram]
+
+        self._lengths, self._alive = lengths, alive
+        self._product_ids, self._bodies = product_ids, bodies
+        self._doc_of = {product_id: doc for doc, product_id in enumerate(product_ids)}
+
+    def _length_norms(self) -> array:
+        if self._norms is None:
+            avg_length = self._total_length / max(self.live_count, 1) or 1.0
+            self._norms = array(
+                "d",
+                (
+                    K1 * (1 - B + B * length / avg_length) if alive else -1.0
+                    for length, alive in zip(self._lengths, self._alive)
+                ),
+            )
+        return self._norms
+
+    def put(self, product: Product) -> None:
+        """Index or re-index a product; inactive products are removed"""
+        self.put_many([product])
+
+    def put_many(self, products: Iterable[Product]) -> None:
+        """``put`` for several products, taking the lock once"""
+        entries = []
+        for product in products:
+            if product.is_active:
+                texts = [getattr(product, field) or "" for field in SEARCH_FIELDS]
+                body = ProductResponse.model_validate(product).model_dump_json().encode()
+                entries.append((str(product.id), texts, body))
+            else:
+                entries.append((str(product.id), None, None))
+        with self._lock:
+            for product_id, texts, body in entries:
+                if body is None:
+                    self._remove(product_id)
+                else:
+                    self._add(product_id, texts, body)
+
+    def remove(self, product_id: str) -> None:
+        with self._lock:
+            self._remove(product_id)
+
+    def search(self, q: str, limit: int) -> List[bytes]:
+        """ProductResponse JSON of the best matches for ``q``, best first"""
+        start = time.perf_counter()
+        q = normalize(q)
+        n = max((size for size in GRAM_SIZES if size <= len(q)), default=None)
+        if n is None:
+            return []
+
+        with self._lock:
+            total = self.live_count
+            if total == 0:
+                return []
+            query = Counter(grams(q, n))
+            by_df = sorted(query, key=lambda gram: len(self._docs.get(gram, ())))
+            rare = [g for g in by_df if len(self._docs.get(g, ())) <= COMMON_GRAM_RATIO * total]
+            used = rare or by_df
+            min_match = math.ceil(MIN_GRAM_MATCH * len(used))
+            norms = self._length_norms()
+
+            scores: Dict[int, float] = defaultdict(float)
+            matched: Counter = Counter()
+            for gram in used:
+                docs = self._docs.get(gram)
+                if not docs:
+                    continue
+                df = len(docs)
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                weight = idf * query[gram] * (K1 + 1)
+                for doc, tf in zip(docs, self._tfs[gram]):
+                    norm = norms[doc]
+                    if norm >= 0:
+                        scores[doc] += weight * tf / (tf + norm)
+                # Dead documents are counted too but never have a score
+                matched.update(docs)
+
+            candidates = [doc for doc in scores if matched[doc] >= min_match]
+            top = heapq.nlargest(limit, candidates, key=scores.__getitem__)
+            results = [self._bodies[doc] for doc in top]
+
+        search_seconds.observe(time.perf_counter() - start)
+        return [body for body in results if body is not None]
+
+
+class ProductSearchIndex:
+    """The current n-gram index, rebuilt from the database now and then
+
+    Writes on this worker update the index directly; a periodic rebuild picks up
+    writes made by other workers.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.index: Optional[NgramIndex] = None
+        self._rebuilding = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    def needs_refresh(self) -> bool:
+        if self.index is None or self.refresh_seconds <= 0:
+            return False
+        return time.monotonic() - self.index.built_at >= self.refresh_seconds
+
+    def rebuild(self, engine: Engine) -> int:
+        """Build a fresh index from the active products and swap it in
+
+        Returns the number of products indexed, or -1 if a rebuild was already
+        running.
+        """
+        if not self._rebuilding.acquire(blocking=False):
+            return -1
+        try:
+            # Writes that land while this runs go to the old index and are picked
+            # up again by the next rebuild
+            index = NgramIndex()
+            with Session(engine) as session:
+                for product in session.scalars(select(Product).where(Product.is_active)):
+                    index.put(product)
+            self.index = index
+            return index.live_count
+        finally:
+            self._rebuilding.release()
+
+    def refresh(self, engine: Engine) -> None:
+        """Background rebuild; on failure the current index keeps serving"""
+        try:
+            count = self.rebuild(engine)
+        except Exception as e:
+            logger.warning("Product search index rebuild failed: %s", e)
+            return
+        if count >= 0:
+            logger.info("Product search index rebuilt with %d products", count)
+
+    def put(self, product: Product) -> None:
+        if self.index is not None:
+            self.index.put(product)
+
+    def put_many(self, products: Iterable[Product]) -> None:
+        if self.index is not None:
+            self.index.put_many(products)
+
+    def remove(self, product_id: str) -> None:
+        if self.index is not None:
+            self.index.remove(product_id)
+
+    def search(self, q: str, limit: int) -> List[bytes]:
+        return self.index.search(q, limit) if self.index is not None else []
+
+    def clear(self) -> None:
+        self.index = None
+
+
+product_search_index = ProductSearchIndex(
+    refresh_seconds=settings.PRODUCT_SEARCH_INDEX_REFRESH_SECONDS
+)
+
+
+def warm_product_search_index(engine: Engine) -> int:
+    """Build the n-gram index at startup, if enabled"""
+    if not settings.PRODUCT_SEARCH_NGRAM_INDEX:
+        return 0
+    return product_search_index.rebuild(engine)
@@ -0,0 +1,311 @@
+"""
+Bulk product import from CSV or XLSX
+Rows are read from the upload as a stream and handled in batches: each batch is
+validated against ProductCreate, checked for duplicate SKUs and barcodes with
+one query per key, and loaded. On PostgreSQL through psycopg2 batches are
+COPYed into a temporary staging table and moved into products with a single
+INSERT ... ON CONFLICT DO NOTHING, so tens of thousands of rows load in one
+round trip per batch instead of several per product. Other drivers and SQLite
+load each batch with one executemany INSERT ... ON CONFLICT DO NOTHING. Either
+way, rows another user created in the meantime are reported, not fatal.
+"""
+
+import csv
+import io
+import uuid
+from collections.abc import Iterable, Iterator
+from enum import Enum
+from typing import IO, Any, Callable, Dict, List, Optional, Set, Tuple, Type
+
+from openpyxl import load_workbook
+from pydantic import ValidationError
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.metrics import registry
+from app.models.product import DosageForm, DrugType, Product
+from app.schemas.product import ProductCreate, ProductImportError, ProductImportResult
+
+BATCH_SIZE = 1000
+
+# Errors listed in the result; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+STAGING_TABLE = "product_import"
+
+# Python-side column defaults, which INSERT ... SELECT from staging would miss
+COLUMN_DEFAULTS = {
+    column.name: column.default.arg
+    for column in Product.__table__.columns
+    if column.default is not None
+    and column.default.is_scalar
+    and column.name not in ProductCreate.model_fields
+}
+
+# Columns loaded from the file, plus the generated id and the defaults
+COLUMNS = ("id", *ProductCreate.model_fields, *COLUMN_DEFAULTS)
+REQUIRED_COLUMNS = {
+    name for name, field in ProductCreate.model_fields.items() if field.is_required()
+}
+
+ENUM_FIELDS: Dict[str, Type[Enum]] = {"dosage_form": DosageForm, "drug_type": DrugType}
+
+# INSERT ... ON CONFLICT DO NOTHING, by dialect
+INSERTS: Dict[str, Callable[[Any], Any]] = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+rows_imported = registry.counter(
+    "product_import_rows_total", "Rows read by bulk product imports, by outcome"
+)
+
+
+class ImportFileError(ValueError):
+    """The upload cannot be read as a product sheet at all"""
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    # Spreadsheet numbers go through the same parsing as CSV text; barcodes
+    # typed as numbers come back as floats
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def _check_header(header: List[Any]) -> List[str]:
+    columns = [str(_cell(name) or "").lower() for name in header]
+    missing = REQUIRED_COLUMNS - set(columns)
+    if missing:
+        raise ImportFileError(f"Missing columns: {', '.join(sorted(missing))}")
+    unknown = set(columns) - set(ProductCreate.model_fields) - {""}
+    if unknown:
+        raise ImportFileError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    return columns
+
+
+def read_rows(file: IO[bytes], filename: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(sheet row number, non-empty cells by column) for each data row of the upload"""
+    if filename.lower().endswith(".xlsx"):
+        try:
+            workbook = load_workbook(file, read_only=True, data_only=True)
+        except Exception as e:
+            raise ImportFileError(f"Not a readable XLSX file: {e}") from e
+        rows: Iterator[Any] = workbook.active.iter_rows(values_only=True)
+    else:
+        rows = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+
+    try:
+        columns = _check_header(list(next(rows)))
+    except StopIteration:
+        raise ImportFileError("The file is empty")
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV files must be UTF-8")
+
+    try:
+        for number, values in enumerate(rows, start=2):
+            cells = {
+                column: value
+                for column, value in zip(columns, map(_cell, values))
+                if column and value is not None
+            }
+            if cells:
+                yield number, cells
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV files must be UTF-8")
+
+
+class ProductImporter:
+    """One bulk import in the caller's session; call ``run`` once, then commit"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        dialect = db.get_bind().dialect
+        # COPY FROM STDIN needs psycopg2's copy_expert
+        self.use_copy = dialect.name == "postgresql" and dialect.driver == "psycopg2"
+        self.result = ProductImportResult(rows=0, created=0, failed=0)
+        # Every failure; the result lists the first rows once all are known
+        self._errors: List[ProductImportError] = []
+        self._seen_skus: Set[str] = set()
+        self._seen_barcodes: Set[str] = set()
+        self._row_of_sku: Dict[str, int] = {}
+
+    def _fail(self, row: int, message: str) -> None:
+        self.result.failed += 1
+        self._errors.append(ProductImportError(row=row, message=message))
+
+    def _validate(self, number: int, cells: Dict[str, Any]) -> Optional[ProductCreate]:
+        try:
+            product = ProductCreate.model_validate(cells)
+        except ValidationError as e:
+            details = "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+            )
+            self._fail(number, details)
+            return None
+        for field, enum in ENUM_FIELDS.items():
+            value = getattr(product, field)
+            if value is None:
+                continue
+            try:
+                enum(value)
+            except ValueError:
+                allowed = ", ".join(member.value for member in enum)
+                self._fail(number, f"{field}: must be one of {allowed}")
+                return None
+        return product
+
+    def _existing(self, column: Any, values: Set[str]) -> Set[str]:
+        if not values:
+            return set()
+        return set(self.db.scalars(select(column).where(column.in_(values))))
+
+    def _check_batch(
+        self, batch: List[Tuple[int, Dict[str, Any]]]
+    ) -> List[Tuple[int, ProductCreate]]:
+        """Valid rows of a batch whose SKU and barcode are new to the file and the table"""
+        valid = []
+        for number, cells in batch:
+            product = self._validate(number, cells)
+            if product is not None:
+                valid.append((number, product))
+
+        skus = self._existing(Product.sku, {p.sku for _, p in valid})
+        barcodes = self._existing(Product.barcode, {p.barcode for _, p in valid if p.barcode})
+
+        accepted = []
+        for number, product in valid:
+            if product.sku in skus:
+                self._fail(number, f"SKU {product.sku} already exists")
+            elif product.sku in self._seen_skus:
+                self._fail(number, f"SKU {product.sku} appears earlier in the file")
+            elif product.barcode in barcodes:
+                self._fail(number, f"Barcode {product.barcode} already exists")
+            elif product.barcode and product.barcode in self._seen_barcodes:
+                self._fail(number, f"Barcode {product.barcode} appears earlier in the file")
+            else:
+                self._seen_skus.add(product.sku)
+                if product.barcode:
+                    self._seen_barcodes.add(product.barcode)
+                self._row_of_sku[product.sku] = number
+                accepted.append((number, product))
+        return accepted
+
+    def _record(self, product: ProductCreate) -> Dict[str, Any]:
+        return {"id": uuid.uuid4(), **product.model_dump(), **COLUMN_DEFAULTS}
+
+    def _load(self, products: List[ProductCreate]) -> None:
+        if not products:
+            return
+        if self.use_copy:
+            self._copy([self._record(p) for p in products])
+            return
+        insert = INSERTS[self.db.get_bind().dialect.name]
+        created = set(
+            self.db.scalars(
+                insert(Product).on_conflict_do_nothing().returning(Product.sku),
+                [self._record(p) for p in products],
+            )
+        )
+        self.result.created += len(created)
+        self._report_lost((p.sku for p in products), created)
+
+    def _report_lost(self, skus: Iterable[str], created: Set[str]) -> None:
+        """Fail accepted rows that lost a race to another writer"""
+        for sku in skus:
+            if sku not in created:
+                self._fail(
+                    self._row_of_sku[sku], f"SKU {sku} or its barcode was created by another user"
+                )
+
+    def _create_staging(self) -> None:
+        self.db.execute(
+            text(
+                f"CREATE TEMP TABLE {STAGING_TABLE} "
+                "(LIKE products INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+        )
+
+    def _copy(self, records: List[Dict[str, Any]]) -> None:
+        """COPY records into the staging table"""
+        dialect = self.db.get_bind().dialect
+        # Enum columns store member names; let the column type map values to them
+        processors = {
+            name: Product.__table__.c[name].type.bind_processor(dialect) for name in ENUM_FIELDS
+        }
+        buffer = io.StringIO()
+        for record in records:
+            fields = []
+            for name in COLUMNS:
+                value = record[name]
+                if value is not None and processors.get(name) is not None:
+                    value = processors[name](value)
+                fields.append(_copy_text(value))
+            buffer.write("\t".join(fields) + "\n")
+        buffer.seek(0)
+
+        driver_connection: Any = self.db.connection().connection.driver_connection
+        cursor = driver_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {STAGING_TABLE} ({', '.join(COLUMNS)}) FROM STDIN", buffer)
+        finally:
+            cursor.close()
+
+    def _merge_staging(self) -> None:
+        """Move staged rows into products; rows that lost a race to another writer are reported"""
+        column_list = ", ".join(COLUMNS)
+        created = set(
+            self.db.scalars(
+                text(
+                    f"INSERT INTO products ({column_list}) "
+                    f"SELECT {column_list} FROM {STAGING_TABLE} "
+                    "ON CONFLICT DO NOTHING RETURNING sku"
+                )
+            )
+        )
+        self.result.created += len(created)
+        self._report_lost(self._row_of_sku, created)
+
+    def run(self, rows: Iterator[Tuple[int, Dict[str, Any]]]) -> ProductImportResult:
+        if self.use_copy:
+            self._create_staging()
+
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        for row in rows:
+            batch.append(row)
+            self.result.rows += 1
+            if len(batch) >= BATCH_SIZE:
+                self._load([p for _, p in self._check_batch(batch)])
+                batch = []
+        if batch:
+            self._load([p for _, p in self._check_batch(batch)])
+
+        if self.use_copy:
+            self._merge_staging()
+        self._errors.sort(key=lambda error: error.row)
+        self.result.errors = self._errors[:MAX_REPORTED_ERRORS]
+
+        rows_imported.inc(self.result.created, outcome="created")
+        rows_imported.inc(self.result.failed, outcome="failed")
+        return self.result
+
+
+def _copy_text(value: Any) -> str:
+    """A value in COPY's text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
@@ -0,0 +1,145 @@
+"""
+Set-based product repricing
+A reprice is one UPDATE ... RETURNING over every product matching the filter,
+in one transaction, instead of a select, commit and refresh per product. The
+dry run selects the same expressions without writing, so the preview shows
+exactly what the update would do.
+"""
+
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, List, Mapping
+
+from sqlalchemy import and_, func, literal, select, update
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+from app.schemas.product import ProductRepriceRequest, RepricedProduct
+
+# Nothing is loaded in the session that the UPDATE could leave stale
+NO_SYNC = {"synchronize_session": False}
+
+
+def _filters(request: ProductRepriceRequest) -> List[Any]:
+    conditions = []
+    if request.product_ids is not None:
+        conditions.append(Product.id.in_(request.product_ids))
+    if request.category_id is not None:
+        conditions.append(Product.category_id == request.category_id)
+    if request.manufacturer is not None:
+        conditions.append(Product.manufacturer == request.manufacturer)
+    if request.drug_type is not None:
+        conditions.append(Product.drug_type == request.drug_type)
+    if request.is_active is not None:
+        conditions.append(Product.is_active == request.is_active)
+    return conditions
+
+
+def reprice_condition(request: ProductRepriceRequest) -> Any:
+    """Products selected by the request's filters that the operation can reprice"""
+    conditions = _filters(request)
+    if request.operation == "margin_over_cost":
+        # Without a cost price the margin would price the product at zero
+        conditions.append(Product.cost_price > 0)
+    return and_(*conditions)
+
+
+def count_skipped(db: Session, request: ProductRepriceRequest) -> int:
+    """Products selected by the filters that the operation leaves unchanged"""
+    if request.operation != "margin_over_cost":
+        return 0
+    statement = (
+        select(func.count())
+        .select_from(Product)
+        .where(and_(*_filters(request), Product.cost_price <= 0))
+    )
+    return db.scalar(statement) or 0
+
+
+def _percent_of(column: Any, percent: Decimal) -> Any:
+    factor = literal((100 + percent) / 100, Product.selling_price.type)
+    return func.round(column * factor, 2)
+
+
+def new_values(request: ProductRepriceRequest) -> Dict[str, Any]:
+    """SET clause of the reprice, as SQL expressions over the current row"""
+    if request.operation == "set_price":
+        return {"selling_price": literal(request.value, Product.selling_price.type)}
+    if request.operation == "percent_change":
+        return {"selling_price": _percent_of(Product.selling_price, request.value)}
+    if request.operation == "margin_over_cost":
+        return {"selling_price": _percent_of(Product.cost_price, request.value)}
+
+    values: Dict[str, Any] = {}
+    if request.vat_category is not None:
+        values["vat_category"] = literal(request.vat_category, Product.vat_category.type)
+    if request.vat_rate is not None:
+        values["vat_rate"] = literal(request.vat_rate, Product.vat_rate.type)
+    return values
+
+
+def preview(db: Session, request: ProductRepriceRequest) -> List[RepricedProduct]:
+    """What the reprice would change, without changing it"""
+    values = new_values(request)
+    statement = (
+        select(
+            Product.id,
+            Product.sku,
+            Product.name_th,
+            Product.selling_price.label("old_selling_price"),
+            values.get("selling_price", Product.selling_price).label("selling_price"),
+            values.get("vat_category", Product.vat_category).label("vat_category"),
+            values.get("vat_rate", Product.vat_rate).label("vat_rate"),
+        )
+        .where(reprice_condition(request))
+        .order_by(Product.sku)
+    )
+    return [RepricedProduct.model_validate(row._mapping) for row in db.execute(statement)]
+
+
+def _returning(*old_price: Any) -> tuple:
+    return (
+        Product.id,
+        Product.sku,
+        Product.name_th,
+        *old_price,
+        Product.selling_price,
+        Product.vat_category,
+        Product.vat_rate,
+    )
+
+
+def apply(db: Session, request: ProductRepriceRequest) -> List[RepricedProduct]:
+    """Reprice in one statement; the caller commits"""
+    # RETURNING only sees the new row, so the old price comes from a locked read
+    # of the same rows joined into the UPDATE
+    old = (
+        select(Product.id, Product.selling_price.label("old_selling_price"))
+        .where(reprice_condition(request))
+        .with_for_update()
+        .subquery()
+    )
+    rows: List[Mapping[Any, Any]]
+    if db.get_bind().dialect.name == "postgresql":
+        statement = (
+            update(Product)
+            .where(Product.id == old.c.id)
+            .values(new_values(request))
+            .returning(*_returning(old.c.old_selling_price))
+        )
+        rows = [row._mapping for row in db.execute(statement, execution_options=NO_SYNC)]
+    else:
+        # SQLite's RETURNING cannot reference joined tables: read the old prices
+        # first, in the same transaction
+        old_prices: Dict[uuid.UUID, Decimal] = dict(db.execute(select(old)).tuples().all())
+        statement = (
+            update(Product)
+            .where(Product.id.in_(old_prices))
+            .values(new_values(request))
+            .returning(*_returning())
+        )
+        rows = [
+            {**row._mapping, "old_selling_price": old_prices[row.id]}
+            for row in db.execute(statement, execution_options=NO_SYNC)
+        ]
+    return sorted((RepricedProduct.model_validate(row) for row in rows), key=lambda p: p.sku)
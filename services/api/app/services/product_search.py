@@ -0,0 +1,62 @@
+"""
+Product search for the POS search box and the product list
+On PostgreSQL the substring filters are served by the pg_trgm GIN indexes from
+migration 006 and results are ranked by trigram similarity, with exact SKU and
+barcode matches first. Other databases get the same filters without ranking.
+"""
+
+from typing import Any
+
+from sqlalchemy import case, func, literal, or_
+from sqlalchemy.sql import Select
+
+from app.models.product import Product
+
+# Queries shorter than a trigram cannot use the GIN indexes, and fuzzy matching
+# on one or two characters matches almost everything
+MIN_FUZZY_LENGTH = 3
+
+# Not a backslash: its quoting in ESCAPE depends on standard_conforming_strings
+LIKE_ESCAPE = "/"
+
+
+def _escape_like(value: str) -> str:
+    for char in (LIKE_ESCAPE, "%", "_"):
+        value = value.replace(char, LIKE_ESCAPE + char)
+    return value
+
+
+def match_condition(q: str, dialect_name: str) -> Any:
+    """Rows whose name, SKU or barcode contain ``q``, or whose name is close to it"""
+    pattern = f"%{_escape_like(q)}%"
+    conditions = [
+        Product.name_th.ilike(pattern, escape=LIKE_ESCAPE),
+        Product.name_en.ilike(pattern, escape=LIKE_ESCAPE),
+        Product.sku.ilike(pattern, escape=LIKE_ESCAPE),
+        Product.barcode.ilike(pattern, escape=LIKE_ESCAPE),
+    ]
+    if dialect_name == "postgresql" and len(q) >= MIN_FUZZY_LENGTH:
+        # name %> q: some word of the name is similar to q, which catches typos
+        conditions += [Product.name_th.op("%>")(q), Product.name_en.op("%>")(q)]
+    return or_(*conditions)
+
+
+def rank_order(q: str, dialect_name: str) -> list:
+    """ORDER BY clauses: exact SKU/barcode hits, then most similar names"""
+    exact = case((or_(Product.sku == q, Product.barcode == q), 0), else_=1)
+    if dialect_name != "postgresql":
+        return [exact, Product.name_th, Product.id]
+
+    query = literal(q)
+    similarity = func.greatest(
+        func.word_similarity(query, Product.name_th),
+        func.word_similarity(query, Product.name_en),
+        func.similarity(Product.sku, query),
+    )
+    return [exact, similarity.desc(), Product.name_th, Product.id]
+
+
+def apply_search(statement: Select, q: str, dialect_name: str) -> Select:
+    """Filter a select of products to matches for ``q``, best matches first"""
+    q = q.strip()
+    return statement.where(match_condition(q, dialect_name)).order_by(*rank_order(q, dialect_name))
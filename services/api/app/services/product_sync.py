@@ -0,0 +1,63 @@
+"""
+Catalog feed for POS terminals
+Terminals keep a local copy of the catalog: a first sync streams every active
+product, later syncs stream only the products created, repriced or deactivated
+after the watermark the previous sync returned. Rows are selected by
+coalesce(updated_at, created_at), which migration 008 indexes.
+"""
+
+import json
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import func, select
+
+from app.core import database
+from app.core.config import settings
+from app.models.product import Product
+from app.schemas.product import ProductSyncRecord
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 500
+
+# Never-updated products only have created_at
+changed_at = func.coalesce(Product.updated_at, Product.created_at)
+
+SYNC_COLUMNS = [getattr(Product, name) for name in ProductSyncRecord.model_fields if name != "id"]
+
+
+def parse_watermark(value: str) -> datetime:
+    """A watermark handed out by ``stream_changes``; raises ValueError otherwise"""
+    return datetime.fromisoformat(value)
+
+
+async def stream_changes(since: Optional[datetime]) -> AsyncIterator[bytes]:
+    """NDJSON: a header line with the next watermark, then one product per line
+
+    Without ``since`` the feed is a snapshot of the active products. The next
+    watermark trails the database clock by PRODUCT_SYNC_LAG_SECONDS, so
+    consecutive syncs overlap and a product may be sent twice; records are
+    idempotent upserts keyed by id.
+    """
+    # The feed owns its session: the generator runs while the response streams,
+    # after the endpoint has returned. Newer FastAPI releases close dependency
+    # sessions before the body is sent, so get_async_db would not outlive it.
+    async with database.AsyncSessionLocal() as db:
+        now: datetime = (await db.execute(select(func.now()))).scalar_one()
+        watermark = now - timedelta(seconds=settings.PRODUCT_SYNC_LAG_SECONDS)
+
+        statement = select(Product.id, *SYNC_COLUMNS)
+        if since is None:
+            statement = statement.where(Product.is_active)
+        else:
+            statement = statement.where(changed_at > since).order_by(changed_at, Product.id)
+
+        header = {"watermark": watermark.isoformat(), "snapshot": since is None}
+        yield json.dumps(header, separators=(",", ":")).encode() + b"\n"
+
+        result = await db.stream(statement.execution_options(yield_per=FETCH_SIZE))
+        async for rows in result.partitions():
+            yield b"".join(
+                ProductSyncRecord.model_validate(row._mapping).model_dump_json().encode() + b"\n"
+                for row in rows
+            )
@@ -0,0 +1,70 @@
+"""
+bcrypt throughput benchmark, for choosing BCRYPT_ROUNDS and PASSWORD_HASH_WORKERS
+Run with: python -m scripts.bench_bcrypt [--rounds 10 11 12 13] [--workers N]
+
+Reports hashes per second on one core and across a process pool, and the
+throughput per core of the pool
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.hash import bcrypt
+
+PASSWORD = "correct horse battery staple"
+
+
+def _hash(rounds: int) -> str:
+    return bcrypt.using(rounds=rounds).hash(PASSWORD)
+
+
+def single_core(rounds: int, count: int) -> float:
+    """Hashes per second hashing serially in this process"""
+    start = time.perf_counter()
+    for _ in range(count):
+        _hash(rounds)
+    return count / (time.perf_counter() - start)
+
+
+def pooled(executor: ProcessPoolExecutor, rounds: int, count: int) -> float:
+    """Hashes per second across the worker pool"""
+    start = time.perf_counter()
+    list(executor.map(_hash, [rounds] * count))
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=2.0, help="Target time per measurement")
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6}  {'ms/hash':>8}  {'1 core/s':>9}  {'pool/s':>8}  {'per core/s':>10}")
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as executor:
+        # Start the workers before timing anything
+        list(executor.map(_hash, [4] * args.workers))
+
+        for rounds in args.rounds:
+            # Size each run from one timed hash so every cost takes about as long
+            start = time.perf_counter()
+            _hash(rounds)
+            count = max(int(args.seconds / (time.perf_counter() - start)), 1)
+
+            serial = single_core(rounds, count)
+            parallel = pooled(executor, rounds, count * args.workers)
+            print(
+                f"{rounds:>6}  {1000 / serial:>8.1f}  {serial:>9.1f}  "
+                f"{parallel:>8.1f}  {parallel / args.workers:>10.1f}"
+            )
+
+    print(f"\nworkers={args.workers}. Login capacity per API worker is roughly")
+    print("PASSWORD_HASH_WORKERS x per core/s at the chosen BCRYPT_ROUNDS.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Product search benchmark against PostgreSQL
+Run with: python -m scripts.bench_product_search [--rows 100000] [--queries 500]
+
+Copies the products table definition (with the migration 006 trigram indexes)
+into a scratch schema, fills it with synthetic products, and times the POS
+search query for a mix of name prefixes, typos, SKUs and barcodes. The scratch
+schema is dropped afterwards. Target: p95 under 20 ms at 100k products.
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine, select, text
+
+from app.core.config import settings
+from app.models.product import Product
+from app.services.product_search import apply_search
+
+SCHEMA = "bench_product_search"
+
+DRUGS = [
+    "Paracetamol",
+    "Ibuprofen",
+    "Amoxicillin",
+    "Cetirizine",
+    "Loratadine",
+    "Omeprazole",
+    "Metformin",
+    "Amlodipine",
+    "Simvastatin",
+    "Losartan",
+    "Dextromethorphan",
+    "Guaifenesin",
+    "Chlorpheniramine",
+    "Diclofenac",
+    "Naproxen",
+    "Ranitidine",
+    "Domperidone",
+    "Loperamide",
+    "Salbutamol",
+    "Prednisolone",
+    "Clotrimazole",
+    "Mupirocin",
+    "Vitamin C",
+    "Zinc",
+]
+THAI = ["ยาแก้ปวด", "ยาลดไข้", "ยาแก้แพ้", "ยาแก้ไอ", "ยาธาตุน้ำขาว", "ยาดม", "ยาหม่อง", "วิตามิน"]
+STRENGTHS = ["100mg", "250mg", "500mg", "5mg/ml", "10mg", "20mg", "1g"]
+FORMS = ["Tablet", "Capsule", "Syrup", "Cream", "Injection", "Sachet"]
+
+FILL_SQL = """
+INSERT INTO products (id, sku, barcode, name_th, name_en, cost_price, selling_price, is_active)
+SELECT gen_random_uuid(),
+       'SKU' || lpad(i::text, 7, '0'),
+       '885' || lpad(i::text, 10, '0'),
+       (:thai)[1 + i % cardinality(:thai)] || ' ' || (:drugs)[1 + (i / 7) % cardinality(:drugs)]
+           || ' ' || i,
+       (:drugs)[1 + (i / 7) % cardinality(:drugs)] || ' ' || (:strengths)[1 + i % 7]
+           || ' ' || (:forms)[1 + (i / 3) % 6] || ' ' || i,
+       10, 20, true
+FROM generate_series(1, :rows) AS i
+"""
+
+
+def _typo(word: str) -> str:
+    i = random.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+
+
+def sample_queries(rows: int, count: int) -> list:
+    queries = []
+    for _ in range(count):
+        kind = random.random()
+        i = random.randint(1, rows)
+        if kind < 0.4:
+            queries.append(random.choice(DRUGS)[: random.randint(3, 8)])
+        elif kind < 0.55:
+            queries.append(_typo(random.choice(DRUGS)))
+        elif kind < 0.7:
+            queries.append(random.choice(THAI))
+        elif kind < 0.85:
+            queries.append(f"SKU{i:07d}")
+        else:
+            queries.append(f"885{i:010d}")
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the POS product search query")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL)
+    if engine.dialect.name != "postgresql":
+        sys.exit("The search benchmark needs PostgreSQL (DATABASE_URL)")
+
+    random.seed(42)
+    with engine.connect() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+        try:
+            conn.execute(text("CREATE TABLE products (LIKE public.products INCLUDING ALL)"))
+            print(f"Inserting {args.rows} products...")
+            conn.execute(
+                text(FILL_SQL),
+                {
+                    "thai": THAI,
+                    "drugs": DRUGS,
+                    "strengths": STRENGTHS,
+                    "forms": FORMS,
+                    "rows": args.rows,
+                },
+            )
+            conn.execute(text("ANALYZE products"))
+            conn.commit()
+
+            timings = []
+            for q in sample_queries(args.rows, args.queries):
+                statement = apply_search(
+                    select(Product).where(Product.is_active), q, "postgresql"
+                ).limit(args.limit)
+                start = time.perf_counter()
+                conn.execute(statement).all()
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"queries={len(timings)} limit={args.limit}")
+            p50 = statistics.median(timings)
+            print(f"p50={p50:.2f} ms  p95={p95:.2f} ms  max={timings[-1]:.2f} ms")
+        finally:
+            conn.rollback()
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -85,9 +85,15 @@ pg.JSONB = SQLiteCompatibleJSONB
 # Create test database engine BEFORE importing app
 # This ensures app uses the test database
 import os
+import tempfile
 
-# Use in-memory SQLite with shared cache for test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:?cache=shared"
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# Use a temporary SQLite file so the sync engine and the async (aiosqlite) engine
+# used by the POS endpoints see the same database
+_test_db_dir = tempfile.mkdtemp(prefix="pharmacy-test-")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{_test_db_dir}/test.db"
 
 # Create a single connection that will be reused
 test_engine = create_engine(
@@ -98,17 +104,44 @@ test_engine = create_engine(
 
 # Override database settings before importing app
 os.environ["DATABASE_URL"] = SQLALCHEMY_DATABASE_URL
+# Fail any request that runs more queries than its declared budget
+os.environ["QUERY_BUDGET_ENFORCE"] = "true"
+# Cheapest bcrypt cost; the hashing pool inherits it through the environment
+os.environ["BCRYPT_ROUNDS"] = "4"
+# Every test client runs the lifespan, which shuts the hashing pool down; hash
+# on the threadpool instead of spawning workers per test
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["REFRESH_TOKEN_STORE"] = "memory"
+os.environ["RESOURCE_VERSION_STORE"] = "memory"
 
 # Import database module and override its engine
 from app.core import database
 database.engine = test_engine
-database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+database.SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=test_engine
+)
+
+# NullPool: TestClient runs each test on a fresh event loop, so async connections
+# must not outlive the request that opened them
+test_async_engine = create_async_engine(
+    database.to_async_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool
+)
+database.async_engine = test_async_engine
+database.AsyncSessionLocal = async_sessionmaker(
+    bind=test_async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+)
 
 # Now import app modules AFTER patching and overriding database
 from fastapi.testclient import TestClient
 from app.main import app
-from app.core.database import Base, get_db
-from app.core.security import get_password_hash
+from app.core.database import Base, get_db, get_read_db
+from app.core.pagination import count_estimates_cache
+from app.core.principals import principal_cache
+from app.core.product_index import product_code_index
+from app.services.ngram_search import product_search_index
+from app.core.rate_limit import login_throttle
+from app.core.refresh_tokens import refresh_token_families
+from app.core.security import get_password_hash, token_cache
 from app.models.user import User, UserRole
 from app.models.product import Product, Category
 from app.models.inventory import Warehouse, WarehouseType, InventoryLot
@@ -120,6 +153,22 @@ from app.models.manufacturing import ManufacturingOrder, BillOfMaterials
 from app.models.audit import AuditLog
 
 
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    """Users are recreated for every test, so never reuse a cached principal or token"""
+    principal_cache.clear()
+    token_cache.clear()
+    refresh_token_families.store.clear()
+    refresh_token_families.revocations.reset()
+    login_throttle.buckets.clear()
+    product_code_index.clear()
+    product_search_index.clear()
+    count_estimates_cache.clear()
+    yield
+    principal_cache.clear()
+    token_cache.clear()
+
+
 @pytest.fixture(scope="function")
 def db_engine():
     """Create test database engine and tables"""
@@ -152,6 +201,7 @@ def client(db_session):
             pass
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -1,9 +1,42 @@
 """
 Authentication and Authorization Tests
 """
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
 import pytest
 from fastapi.testclient import TestClient
 
+from app.core import lifecycle
+from app.core.bloom import BloomFilter
+from app.core.hashing import (
+    PasswordHasher,
+    PasswordHasherBusyError,
+    hash_pool_restarts,
+    password_hasher,
+)
+from app.core.principals import Principal, PrincipalCache, principal_cache
+from app.core.rate_limit import MemoryTokenBuckets, RedisTokenBuckets, login_throttled
+from app.core.refresh_tokens import (
+    MemoryRefreshTokenStore,
+    RevocationFilter,
+    refresh_token_families,
+)
+from app.core.query_budget import QUERY_COUNT_HEADER
+from app.core.security import (
+    TokenCache,
+    create_access_token,
+    create_refresh_token,
+    decode_token,
+    pwd_context,
+    token_cache,
+    token_cache_hits,
+)
+from app.main import app
+from app.models.user import UserRole
+
 
 class TestAuthentication:
     """Test authentication endpoints"""
@@ -128,3 +161,434 @@ class TestTokenRefresh:
             json={"refresh_token": "invalid_token"}
         )
         assert response.status_code == 401
+
+
+class TestPrincipalCache:
+    """Test the cached principal behind get_current_user"""
+
+    def test_second_request_skips_user_query(self, client, auth_headers_admin, sample_product):
+        """Only the first authenticated request loads the users row"""
+        url = f"/api/v1/inventory/products/{sample_product.id}"
+        first = client.get(url, headers=auth_headers_admin)
+        second = client.get(url, headers=auth_headers_admin)
+        assert first.status_code == second.status_code == 200
+        assert int(second.headers[QUERY_COUNT_HEADER]) == int(first.headers[QUERY_COUNT_HEADER]) - 1
+        assert principal_cache.get("admin@test.com").role == UserRole.ADMIN
+
+    def test_cache_miss_loads_user_off_event_loop(self, client, auth_headers_admin, monkeypatch):
+        """The sync users query must not block the event loop"""
+        from app.api import deps
+
+        on_loop = []
+        load_principal = deps._load_principal
+
+        def recording_load(db, email):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            return load_principal(db, email)
+
+        monkeypatch.setattr(deps, "_load_principal", recording_load)
+        principal_cache.clear()
+        assert client.get("/api/v1/auth/me", headers=auth_headers_admin).status_code == 200
+        assert on_loop == [False]
+
+    def test_me_returns_full_user(self, client, auth_headers_admin):
+        client.get("/api/v1/auth/me", headers=auth_headers_admin)
+        response = client.get("/api/v1/auth/me", headers=auth_headers_admin)
+        assert response.status_code == 200
+        assert response.json()["full_name"] == "Admin Test"
+
+    def test_role_change_invalidates(
+        self, client, auth_headers_admin, auth_headers_cashier, cashier_user
+    ):
+        """Changing a role revokes tokens that carry the old one"""
+        assert client.get("/api/v1/users/", headers=auth_headers_cashier).status_code == 403
+
+        response = client.put(
+            f"/api/v1/users/{cashier_user.id}", headers=auth_headers_admin, json={"role": "admin"}
+        )
+        assert response.status_code == 200
+        assert client.get("/api/v1/users/", headers=auth_headers_cashier).status_code == 401
+
+        response = client.post(
+            "/api/v1/auth/login", data={"username": "cashier@test.com", "password": "cashier123"}
+        )
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        assert client.get("/api/v1/users/", headers=headers).status_code == 200
+
+    def test_deactivation_invalidates(
+        self, client, auth_headers_admin, auth_headers_cashier, cashier_user
+    ):
+        assert client.get("/api/v1/auth/me", headers=auth_headers_cashier).status_code == 200
+
+        response = client.delete(f"/api/v1/users/{cashier_user.id}", headers=auth_headers_admin)
+        assert response.status_code == 200
+        assert client.get("/api/v1/auth/me", headers=auth_headers_cashier).status_code == 400
+
+    def test_ttl_and_size_bound(self):
+        cache = PrincipalCache(ttl_seconds=0.05, max_size=2)
+        principals = [
+            Principal(id=str(i), email=f"user{i}@test.com", role=UserRole.CASHIER, is_active=True)
+            for i in range(3)
+        ]
+        for principal in principals:
+            cache.put(principal.email, principal)
+
+        assert len(cache) == 2
+        assert cache.get("user0@test.com") is None
+        assert cache.get("user2@test.com") == principals[2]
+
+        time.sleep(0.06)
+        assert cache.get("user2@test.com") is None
+
+
+class TestTokenClaims:
+    """Test self-contained access tokens and token-version revocation"""
+
+    def _login(self, client, username="cashier@test.com", password="cashier123"):
+        response = client.post(
+            "/api/v1/auth/login", data={"username": username, "password": password}
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    def test_tokens_carry_claims(self, client, cashier_user):
+        tokens = self._login(client)
+        claims = decode_token(tokens["access_token"])
+        assert claims["sub"] == "cashier@test.com"
+        assert claims["uid"] == str(cashier_user.id)
+        assert claims["role"] == "cashier"
+        assert claims["ver"] == 0
+
+    def test_admin_revokes_access_and_refresh_tokens(
+        self, client, auth_headers_admin, cashier_user
+    ):
+        tokens = self._login(client)
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+        response = client.post(
+            f"/api/v1/users/{cashier_user.id}/revoke-tokens", headers=auth_headers_admin
+        )
+        assert response.status_code == 200
+
+        response = client.get("/api/v1/auth/me", headers=headers)
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token has been revoked"
+
+        response = client.post(
+            "/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+        assert response.status_code == 401
+
+        # Logging in again issues tokens for the new version
+        tokens = self._login(client)
+        assert decode_token(tokens["access_token"])["ver"] == 1
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+    def test_revocation_seen_after_cache_expiry(
+        self, client, auth_headers_cashier, cashier_user, db_session
+    ):
+        """Other workers see a version bump once their cached entry expires"""
+        assert client.get("/api/v1/auth/me", headers=auth_headers_cashier).status_code == 200
+
+        # Bump the version behind this worker's back, as another worker would
+        cashier_user.token_version = 1
+        db_session.commit()
+        assert client.get("/api/v1/auth/me", headers=auth_headers_cashier).status_code == 200
+
+        principal_cache.clear()
+        assert client.get("/api/v1/auth/me", headers=auth_headers_cashier).status_code == 401
+
+
+class TestPasswordHashing:
+    """bcrypt runs on a bounded process pool"""
+
+    def test_register_hashes_with_configured_rounds(self, client):
+        """New hashes use BCRYPT_ROUNDS and verify through the pool on login"""
+        response = client.post(
+            "/api/v1/auth/register",
+            json={
+                "email": "new@test.com",
+                "password": "secret123",
+                "full_name": "New User",
+                "role": "cashier",
+            },
+        )
+        assert response.status_code == 201
+
+        response = client.post(
+            "/api/v1/auth/login", data={"username": "new@test.com", "password": "secret123"}
+        )
+        assert response.status_code == 200
+        assert pwd_context.to_dict()["bcrypt__rounds"] == 4
+        assert password_hasher.pending == 0
+
+    def test_full_pool_sheds_logins(self, client, admin_user, monkeypatch):
+        """Logins beyond the pending limit get 503 instead of queueing"""
+        monkeypatch.setattr(password_hasher, "max_pending", 0)
+        response = client.post(
+            "/api/v1/auth/login", data={"username": "admin@test.com", "password": "admin123"}
+        )
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+    def test_pending_limit_counts_queued_hashes(self):
+        """Only max_pending hashes may wait at once"""
+        hasher = PasswordHasher(workers=1, max_pending=2)
+
+        async def burst():
+            first = asyncio.ensure_future(hasher.hash("a"))
+            second = asyncio.ensure_future(hasher.hash("b"))
+            await asyncio.sleep(0)
+            assert hasher.pending == 2
+            with pytest.raises(PasswordHasherBusyError):
+                await hasher.hash("c")
+            assert await hasher.verify("a", await first)
+            await second
+            assert hasher.pending == 0
+
+        try:
+            asyncio.run(burst())
+        finally:
+            hasher.shutdown()
+
+
+    def test_broken_pool_is_replaced(self):
+        """A killed worker breaks the pool; the next hash runs on a new one"""
+        hasher = PasswordHasher(workers=1, max_pending=2)
+
+        async def kill_worker_then_hash():
+            await hasher.start()
+            broken = hasher._executor
+            with pytest.raises(BrokenProcessPool):
+                await asyncio.wrap_future(broken.submit(os._exit, 1))
+
+            assert await hasher.verify("a", await hasher.hash("a"))
+            assert hasher._executor is not broken
+
+        restarts = hash_pool_restarts.value()
+        try:
+            asyncio.run(kill_worker_then_hash())
+        finally:
+            hasher.shutdown()
+        assert hash_pool_restarts.value() == restarts + 1
+
+class TestTokenCache:
+    """Verified token payloads are cached until the token expires"""
+
+    def test_repeat_decode_hits_cache(self):
+        token = create_access_token({"sub": "pos@test.com"})
+        hits = token_cache_hits.value()
+
+        first = decode_token(token)
+        first["sub"] = "tampered"
+        second = decode_token(token)
+
+        assert second["sub"] == "pos@test.com"
+        assert token_cache_hits.value() == hits + 1
+        assert len(token_cache) == 1
+
+    def test_invalid_tokens_are_not_cached(self):
+        assert decode_token("not-a-token") is None
+        token = create_access_token({"sub": "pos@test.com"})
+        assert decode_token(token[:-2] + "xx") is None
+        assert len(token_cache) == 0
+
+    def test_entry_expires_with_token(self, monkeypatch):
+        cache = TokenCache(max_size=2)
+        now = time.time()
+        cache.put("a", {"sub": "a", "exp": now + 60})
+        cache.put("b", {"sub": "b", "exp": now + 60})
+        cache.put("c", {"sub": "c", "exp": now + 60})
+        assert cache.get("a") is None
+        assert cache.get("c")["sub"] == "c"
+
+        monkeypatch.setattr(time, "time", lambda: now + 60)
+        assert cache.get("c") is None
+        assert len(cache) == 1
+
+    def test_authenticated_requests_reuse_decoded_token(self, client, auth_headers_admin):
+        hits = token_cache_hits.value()
+        client.get("/api/v1/auth/me", headers=auth_headers_admin)
+        client.get("/api/v1/auth/me", headers=auth_headers_admin)
+        assert token_cache_hits.value() == hits + 1
+
+
+class TestRefreshTokenRotation:
+    """Refresh tokens rotate within a family; reuse revokes the family"""
+
+    def _login(self, client):
+        response = client.post(
+            "/api/v1/auth/login", data={"username": "admin@test.com", "password": "admin123"}
+        )
+        return response.json()
+
+    def _refresh(self, client, refresh_token):
+        return client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+
+    def test_refresh_rotates_within_family(self, client, admin_user):
+        tokens = self._login(client)
+        claims = decode_token(tokens["refresh_token"])
+
+        rotated = self._refresh(client, tokens["refresh_token"]).json()
+        rotated_claims = decode_token(rotated["refresh_token"])
+        assert rotated_claims["fam"] == claims["fam"]
+        assert rotated_claims["jti"] != claims["jti"]
+        assert decode_token(rotated["access_token"])["fam"] == claims["fam"]
+
+        assert self._refresh(client, rotated["refresh_token"]).status_code == 200
+
+    def test_reuse_revokes_family(self, client, admin_user):
+        tokens = self._login(client)
+        rotated = self._refresh(client, tokens["refresh_token"]).json()
+        headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+        # The old refresh token shows up again: somebody kept a copy
+        response = self._refresh(client, tokens["refresh_token"])
+        assert response.status_code == 401
+        assert "reuse" in response.json()["detail"]
+
+        # Both the legitimate holder's tokens and the stolen ones are dead
+        assert self._refresh(client, rotated["refresh_token"]).status_code == 401
+        response = client.get("/api/v1/auth/me", headers=headers)
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token has been revoked"
+
+        # Other sessions of the same user are unaffected
+        other = self._login(client)
+        headers = {"Authorization": f"Bearer {other['access_token']}"}
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+    def test_legacy_refresh_token_joins_a_family(self, client, admin_user):
+        tokens = self._login(client)
+        claims = decode_token(tokens["access_token"])
+        legacy = create_refresh_token(
+            {key: claims[key] for key in ("sub", "uid", "role", "ver")}
+        )
+
+        response = self._refresh(client, legacy)
+        assert response.status_code == 200
+        assert "fam" in decode_token(response.json()["refresh_token"])
+
+    def test_store_outage_answers_503(self, client, admin_user, monkeypatch):
+        """Login and refresh fail cleanly while the family store is unreachable"""
+        tokens = self._login(client)
+
+        class UnreachableStore(MemoryRefreshTokenStore):
+            def start_family(self, *args):
+                raise ConnectionError("Connection refused")
+
+            def rotate(self, *args):
+                raise ConnectionError("Connection refused")
+
+        monkeypatch.setattr(refresh_token_families, "store", UnreachableStore())
+
+        response = client.post(
+            "/api/v1/auth/login", data={"username": "admin@test.com", "password": "admin123"}
+        )
+        assert response.status_code == 503
+        assert "retry-after" in response.headers
+
+        assert self._refresh(client, tokens["refresh_token"]).status_code == 503
+
+        # Access tokens already issued keep working
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+    def test_filter_answers_unrevoked_families_locally(self):
+        store = MemoryRefreshTokenStore()
+        revocations = RevocationFilter(store, sync_seconds=60, capacity=100, error_rate=0.001)
+        store.revoke_family("stolen", ttl_seconds=60)
+
+        # First check syncs; afterwards clean families need no store round trip
+        assert revocations.is_revoked("stolen") is True
+        assert revocations.needs_lookup("clean") is False
+        assert revocations.needs_lookup("stolen") is True
+
+        # Revoked on another worker: invisible until the next sync
+        store.revoke_family("elsewhere", ttl_seconds=60)
+        assert revocations.needs_lookup("elsewhere") is False
+        revocations.sync_seconds = 0
+        assert revocations.is_revoked("elsewhere") is True
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        items = [f"family-{i}" for i in range(1000)]
+        bloom = BloomFilter.from_items(items, capacity=1000, error_rate=0.01)
+        assert all(item in bloom for item in items)
+
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 300
+
+
+class TestLoginThrottle:
+    """Login attempts are rate limited before any password hashing"""
+
+    def _attempt(self, client, username, password="wrong-password"):
+        return client.post("/api/v1/auth/login", data={"username": username, "password": password})
+
+    def test_failing_account_is_throttled_before_hashing(self, client, admin_user, monkeypatch):
+        for _ in range(5):
+            assert self._attempt(client, "admin@test.com").status_code == 401
+
+        throttled = login_throttled.value(bucket="account")
+
+        async def fail_verify(*args):
+            raise AssertionError("throttled logins must not hash")
+
+        monkeypatch.setattr(password_hasher, "verify", fail_verify)
+        response = self._attempt(client, "Admin@Test.com")
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+        assert login_throttled.value(bucket="account") == throttled + 1
+
+    def test_spraying_accounts_from_one_ip_is_throttled(self, client):
+        for i in range(20):
+            assert self._attempt(client, f"nobody{i}@test.com").status_code == 401
+        assert self._attempt(client, "someone-else@test.com").status_code == 429
+
+    def test_terminals_behind_proxy_have_own_buckets(self, client):
+        """Through a trusted proxy each terminal's address gets its own bucket"""
+        config = lifecycle.server_config(
+            app, "127.0.0.1", 8000, drain_timeout=1, forwarded_allow_ips="testclient"
+        )
+        config.load()
+        proxied = TestClient(config.loaded_app)
+
+        def attempt(terminal_ip, username):
+            return proxied.post(
+                "/api/v1/auth/login",
+                data={"username": username, "password": "wrong-password"},
+                headers={"X-Forwarded-For": terminal_ip},
+            )
+
+        for i in range(20):
+            assert attempt("10.0.0.1", f"nobody{i}@test.com").status_code == 401
+        assert attempt("10.0.0.1", "someone-else@test.com").status_code == 429
+        assert attempt("10.0.0.2", "someone-else@test.com").status_code == 401
+
+    def test_redis_outage_fails_open(self):
+        class UnreachableRedis:
+            def register_script(self, script):
+                def run(keys, args):
+                    raise ConnectionError("Connection refused")
+
+                return run
+
+        assert RedisTokenBuckets(UnreachableRedis()).take("ip:10.0.0.1", 1, 1) == 0
+
+    def test_bucket_refills(self, monkeypatch):
+        buckets = MemoryTokenBuckets()
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        assert buckets.take("k", 2, 0.5) == 0
+        assert buckets.take("k", 2, 0.5) == 0
+        assert buckets.take("k", 2, 0.5) == pytest.approx(2.0)
+
+        monkeypatch.setattr(time, "monotonic", lambda: now + 2)
+        assert buckets.take("k", 2, 0.5) == 0
@@ -0,0 +1,582 @@
+"""
+Database Engine and Session Tests
+"""
+import asyncio
+import itertools
+import signal
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+import uvicorn
+from conftest import test_async_engine, test_engine
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.api import deps
+from app.core import database, db_metrics, lifecycle, query_budget, statements
+from app.main import app, statement_timeouts
+from app.models.sales import (
+    OrderStatus,
+    PaymentMethod,
+    PaymentStatus,
+    SalesOrder,
+    SalesOrderItem,
+)
+
+
+class TestReadReplicaRouting:
+    """Test read-only session routing"""
+
+    def test_read_db_falls_back_to_primary(self, db_session, monkeypatch):
+        """Without replicas, the request's primary session is reused"""
+        monkeypatch.setattr(database, "_read_session_cycle", None)
+        assert next(database.get_read_db(db_session)) is db_session
+
+    def test_read_db_round_robins_replicas(self, monkeypatch):
+        """Replica sessions are handed out round-robin"""
+        replicas = [create_engine("sqlite://"), create_engine("sqlite://")]
+        makers = [sessionmaker(bind=replica) for replica in replicas]
+        monkeypatch.setattr(database, "_read_session_cycle", itertools.cycle(makers))
+
+        binds = []
+        for _ in range(4):
+            session = next(database.get_read_db(None))
+            binds.append(session.get_bind())
+            session.close()
+
+        assert binds == [replicas[0], replicas[1], replicas[0], replicas[1]]
+
+
+class TestRequestScopedSession:
+    """Test that a request uses a single pooled connection"""
+
+    def test_one_checkout_per_authenticated_request(
+        self, client, auth_headers_admin, sample_product, db_session
+    ):
+        """Authentication and the endpoint share one session and one connection"""
+        db_session.close()
+        # Use the real session dependency instead of the test session override
+        app.dependency_overrides.clear()
+
+        checkouts = []
+
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            checkouts.append(connection_record)
+
+        event.listen(test_engine, "checkout", on_checkout)
+        try:
+            response = client.get(
+                f"/api/v1/inventory/products/{sample_product.id}", headers=auth_headers_admin
+            )
+        finally:
+            event.remove(test_engine, "checkout", on_checkout)
+
+        assert response.status_code == 200
+        assert len(checkouts) == 1
+
+
+class TestPoolTelemetry:
+    """Test connection pool metrics"""
+
+    def test_checkout_wait_and_saturation_recorded(self, tmp_path):
+        """Checkouts are timed and saturation gauges follow the pool"""
+        engine = create_engine(
+            f"sqlite:///{tmp_path}/pool.db",
+            poolclass=db_metrics.InstrumentedQueuePool,
+            pool_size=2,
+            max_overflow=1,
+        )
+        db_metrics.instrument_engine(engine, "test-pool")
+        waits_before = db_metrics.checkout_wait.count(pool="test-pool")
+
+        connections = [engine.connect() for _ in range(3)]
+        status = db_metrics.pool_status()["test-pool"]
+        assert status["checked_out"] == 3
+        assert status["overflow"] == 1
+        assert db_metrics.checked_out.value(pool="test-pool") == 3
+        assert db_metrics.checkout_wait.count(pool="test-pool") == waits_before + 3
+
+        for connection in connections:
+            connection.close()
+        assert db_metrics.checked_out.value(pool="test-pool") == 0
+
+        engine.dispose()
+        assert db_metrics.connection_lifetime.count(pool="test-pool") >= 1
+
+    def test_checkout_timeouts_counted_apart_from_errors(self, tmp_path):
+        """Only waits that run out count as timeouts; failed connects are errors"""
+        state = {"refuse": False}
+
+        def connect():
+            if state["refuse"]:
+                raise sqlite3.OperationalError("connection refused")
+            return sqlite3.connect(f"{tmp_path}/pool.db")
+
+        engine = create_engine(
+            "sqlite://",
+            creator=connect,
+            poolclass=db_metrics.InstrumentedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.01,
+        )
+        db_metrics.instrument_engine(engine, "timeout-pool")
+        timeouts = db_metrics.checkout_timeouts.value(pool="timeout-pool")
+        errors = db_metrics.checkout_errors.value(pool="timeout-pool")
+
+        held = engine.connect()
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        held.close()
+        engine.dispose()
+        state["refuse"] = True
+        with pytest.raises(OperationalError):
+            engine.connect()
+
+        assert db_metrics.checkout_timeouts.value(pool="timeout-pool") == timeouts + 1
+        assert db_metrics.checkout_errors.value(pool="timeout-pool") == errors + 1
+        engine.dispose()
+
+    def test_metrics_endpoint_admin_only(self, client, auth_headers_admin, auth_headers_cashier):
+        """Pool metrics are exposed on the internal endpoint for admins"""
+        response = client.get("/api/v1/internal/metrics", headers=auth_headers_admin)
+        assert response.status_code == 200
+        data = response.json()
+        assert "pools" in data
+        assert "db_pool_checkout_wait_seconds" in data["metrics"]
+
+        response = client.get("/api/v1/internal/metrics", headers=auth_headers_cashier)
+        assert response.status_code == 403
+
+
+class TestQueryBudget:
+    """Test per-request query counting and N+1 budgets"""
+
+    def _completed_order(self, db_session, product, lot, number, cashier=None):
+        order = SalesOrder(
+            order_number=f"SO-TEST-{number}",
+            cashier_id=cashier.id if cashier else None,
+            subtotal=100,
+            tax_amount=7,
+            total_amount=107,
+            paid_amount=107,
+            status=OrderStatus.COMPLETED,
+            payment_status=PaymentStatus.PAID,
+            payment_method=PaymentMethod.CASH,
+        )
+        order.items = [
+            SalesOrderItem(
+                product_id=product.id,
+                lot_id=lot.id,
+                quantity=1,
+                unit_price=100,
+                line_total=107,
+                vat_amount=7,
+                price_before_vat=100,
+                price_including_vat=107,
+            )
+        ]
+        db_session.add(order)
+        db_session.commit()
+        return order
+
+    def test_query_count_header(self, client, auth_headers_admin, sample_product):
+        """Every response reports how many statements it ran"""
+        response = client.get(
+            f"/api/v1/inventory/products/{sample_product.id}", headers=auth_headers_admin
+        )
+        assert response.status_code == 200
+        assert int(response.headers[query_budget.QUERY_COUNT_HEADER]) == 2
+
+    def test_budget_enforced(self, db_session):
+        """Going over the budget fails in enforcing mode"""
+        stats = query_budget.QueryStats()
+        stats.budget = 1
+        token = query_budget._current_stats.set(stats)
+        try:
+            db_session.execute(text("SELECT 1"))
+            with pytest.raises(query_budget.QueryBudgetExceededError):
+                db_session.execute(text("SELECT 1"))
+        finally:
+            query_budget._current_stats.reset(token)
+            db_session.rollback()
+
+    def test_vat_sales_report_query_count_constant(
+        self, client, auth_headers_admin, sample_product, sample_inventory_lot, db_session
+    ):
+        """The VAT sales report does not run a query per order"""
+        for number in range(5):
+            self._completed_order(db_session, sample_product, sample_inventory_lot, number)
+
+        response = client.get(
+            "/api/v1/reports/vat-sales",
+            headers=auth_headers_admin,
+            params={
+                "start_date": str(date.today() - timedelta(days=1)),
+                "end_date": str(date.today() + timedelta(days=1)),
+            },
+        )
+        assert response.status_code == 200
+        assert response.json()["total_transactions"] == 5
+        assert int(response.headers[query_budget.QUERY_COUNT_HEADER]) <= 5
+
+    def test_receipt_query_count_constant(
+        self, client, auth_headers_admin, admin_user, sample_product, sample_inventory_lot, db_session
+    ):
+        """The receipt loads customer, cashier and products without lazy loads"""
+        order = self._completed_order(
+            db_session, sample_product, sample_inventory_lot, 1, cashier=admin_user
+        )
+
+        response = client.get(
+            f"/api/v1/sales/orders/{order.id}/receipt/pdf", headers=auth_headers_admin
+        )
+        assert response.status_code == 200
+        assert int(response.headers[query_budget.QUERY_COUNT_HEADER]) <= 6
+
+
+class _QueryCanceled(Exception):
+    pgcode = database.QUERY_CANCELED_SQLSTATE
+
+
+class TestStatementTimeouts:
+    """Test per-route statement timeouts for reports"""
+
+    def test_route_override(self, monkeypatch):
+        """Routes without an override use the report default"""
+        monkeypatch.setattr(deps.settings, "REPORT_STATEMENT_TIMEOUT_MS", 30000)
+        monkeypatch.setattr(
+            deps.settings, "STATEMENT_TIMEOUT_OVERRIDES_MS", {"get_cogs_report": 60000}
+        )
+        assert deps.statement_timeout_for("get_cogs_report") == 60000
+        assert deps.statement_timeout_for("get_vat_sales_report") == 30000
+
+    def test_timeout_returns_504(self, client, auth_headers_admin):
+        """A statement timeout becomes a 504 and is counted"""
+
+        def timed_out_db():
+            raise OperationalError("SELECT 1", {}, _QueryCanceled())
+
+        app.dependency_overrides[deps.get_report_db] = timed_out_db
+        before = statement_timeouts.value(route="/api/v1/reports/cogs-report")
+
+        response = client.get(
+            "/api/v1/reports/cogs-report",
+            headers=auth_headers_admin,
+            params={"start_date": "2025-01-01", "end_date": "2025-12-31"},
+        )
+
+        assert response.status_code == 504
+        assert statement_timeouts.value(route="/api/v1/reports/cogs-report") == before + 1
+
+    def test_completed_report_not_cancelled(self, client, auth_headers_admin, monkeypatch):
+        """The disconnect watcher stops before the response is sent"""
+        watcher_states = []
+
+        async def recording_app(scope, receive, send):
+            async def recording_send(message):
+                if message["type"] == "http.response.start":
+                    watcher = scope["state"]["disconnect_watcher"]
+                    watcher_states.append(watcher.done() or watcher.cancelling() > 0)
+                await send(message)
+
+            await app(scope, receive, recording_send)
+
+        monkeypatch.setattr(deps, "DISCONNECT_POLL_SECONDS", 0)
+        before = deps.queries_cancelled.value(route="/api/v1/reports/dashboard-summary")
+
+        response = TestClient(recording_app).get(
+            "/api/v1/reports/dashboard-summary", headers=auth_headers_admin
+        )
+
+        assert response.status_code == 200
+        assert watcher_states == [True]
+        assert deps.queries_cancelled.value(route="/api/v1/reports/dashboard-summary") == before
+
+
+class TestCachedStatements:
+    """Test the pre-built hot lookup statements"""
+
+    def test_warm_statement_cache(self, db_engine):
+        """Every cached statement compiles and runs against the schema"""
+        warmed = statements.warm_statement_cache(db_engine)
+        assert warmed == len(statements._warmup_statements())
+
+    def test_lookups_return_rows(self, db_session, sample_product, admin_user):
+        """Cached statements bind their parameters on every call"""
+        assert db_session.scalars(statements.product_by_id(sample_product.id)).one().sku == "TEST001"
+        assert db_session.scalars(statements.product_by_sku("TEST001")).one().id == sample_product.id
+        assert db_session.scalars(statements.product_by_sku("OTHER")).first() is None
+        assert db_session.scalars(statements.user_by_email("admin@test.com")).one().id == admin_user.id
+        found = db_session.scalars(statements.products_by_ids([sample_product.id])).all()
+        assert [product.id for product in found] == [sample_product.id]
+
+
+class TestPgBouncerMode:
+    """Test the transaction-pooling compatible engine configuration"""
+
+    def test_null_pool_without_prepared_statements(self, monkeypatch):
+        """By default PgBouncer mode holds no client connections and caches no statements"""
+        monkeypatch.setattr(database.settings, "DB_PGBOUNCER", True)
+        monkeypatch.setattr(database.settings, "DB_PGBOUNCER_POOL_SIZE", 0)
+
+        kwargs = database._engine_kwargs("postgresql://pharmacy_user@pgbouncer:6432/pharmacy_db")
+        assert kwargs["poolclass"] is NullPool
+        assert "pool_size" not in kwargs
+        assert kwargs["connect_args"] == {}
+
+        async_kwargs = database._async_engine_kwargs(
+            "postgresql+asyncpg://pharmacy_user@pgbouncer:6432/pharmacy_db"
+        )
+        connect_args = async_kwargs["connect_args"]
+        assert connect_args["statement_cache_size"] == 0
+        assert connect_args["prepared_statement_cache_size"] == 0
+        name_func = connect_args["prepared_statement_name_func"]
+        assert name_func() != name_func()
+
+        engine = create_async_engine(
+            "postgresql+asyncpg://pharmacy_user@pgbouncer:6432/pharmacy_db", **async_kwargs
+        )
+        assert isinstance(engine.sync_engine.pool, NullPool)
+
+    def test_small_pool(self, monkeypatch):
+        """A non-zero size keeps a small pool with no overflow"""
+        monkeypatch.setattr(database.settings, "DB_PGBOUNCER", True)
+        monkeypatch.setattr(database.settings, "DB_PGBOUNCER_POOL_SIZE", 2)
+
+        engine = create_engine(
+            "postgresql://pharmacy_user@pgbouncer:6432/pharmacy_db",
+            **database._engine_kwargs("postgresql://pharmacy_user@pgbouncer:6432/pharmacy_db"),
+        )
+        assert isinstance(engine.pool, db_metrics.InstrumentedQueuePool)
+        assert engine.pool.size() == 2
+        assert engine.pool._max_overflow == 0
+
+    def test_checkout_locks_and_updates_in_one_transaction(
+        self, client, auth_headers_admin, sample_product, sample_inventory_lot
+    ):
+        """Row locks and the writes they protect share one transaction
+
+        PgBouncer may hand each transaction a different server connection, so a
+        lock taken in one transaction protects nothing in the next.
+        """
+        response = client.post(
+            "/api/v1/sales/orders/",
+            headers=auth_headers_admin,
+            json={"items": [{"product_id": str(sample_product.id), "quantity": 1}]},
+        )
+        assert response.status_code == 201
+        order_id = response.json()["id"]
+
+        log = []
+        sync_engine = test_async_engine.sync_engine
+        listeners = [
+            ("begin", lambda conn: log.append(("begin", None))),
+            ("commit", lambda conn: log.append(("commit", None))),
+            ("rollback", lambda conn: log.append(("rollback", None))),
+            (
+                "before_cursor_execute",
+                lambda conn, cursor, statement, *args: log.append(("sql", statement)),
+            ),
+        ]
+        for name, listener in listeners:
+            event.listen(sync_engine, name, listener)
+        try:
+            response = client.post(
+                f"/api/v1/sales/orders/{order_id}/complete",
+                headers=auth_headers_admin,
+                json={"payment_method": "cash", "paid_amount": 500},
+            )
+        finally:
+            for name, listener in listeners:
+                event.remove(sync_engine, name, listener)
+        assert response.status_code == 200
+
+        transactions = []
+        for kind, statement in log:
+            if kind == "begin":
+                transactions.append([])
+            elif kind == "sql":
+                transactions[-1].append(statement)
+
+        writes = [txn for txn in transactions if any(s.startswith("UPDATE") for s in txn)]
+        assert len(writes) == 1
+        assert any("FROM sales_orders" in s for s in writes[0])
+        assert any("FROM inventory_lots" in s for s in writes[0])
+        assert any(s.startswith("UPDATE inventory_lots") for s in writes[0])
+        assert [kind for kind, _ in log].count("commit") == 1
+
+
+class TestWriteRoundTrips:
+    """Test that write endpoints respond from memory instead of reloading rows"""
+
+    def test_create_and_update_product_without_refresh(
+        self, client, auth_headers_admin, sample_category, db_session
+    ):
+        """Server defaults come back with INSERT/UPDATE ... RETURNING"""
+        db_session.close()
+        # Use the real session dependency, which does not expire on commit
+        app.dependency_overrides.clear()
+
+        response = client.post(
+            "/api/v1/inventory/products/",
+            headers=auth_headers_admin,
+            json={
+                "sku": "RT001",
+                "barcode": "8850000000001",
+                "name_th": "ยาทดสอบ",
+                "category_id": str(sample_category.id),
+                "cost_price": "10.00",
+                "selling_price": "15.00",
+            },
+        )
+        assert response.status_code == 201
+        product = response.json()
+        assert product["created_at"]
+        # User, SKU check, barcode check, INSERT
+        assert int(response.headers[query_budget.QUERY_COUNT_HEADER]) == 4
+
+        response = client.put(
+            f"/api/v1/inventory/products/{product['id']}",
+            headers=auth_headers_admin,
+            json={"selling_price": "16.00"},
+        )
+        assert response.status_code == 200
+        assert response.json()["updated_at"]
+        # Product, UPDATE (the user is cached after the first request)
+        assert int(response.headers[query_budget.QUERY_COUNT_HEADER]) == 2
+
+    def test_checkout_responds_from_memory(
+        self, client, auth_headers_admin, sample_product, sample_inventory_lot
+    ):
+        """Creating and completing an order does not reload the order and its items"""
+        response = client.post(
+            "/api/v1/sales/orders/",
+            headers=auth_headers_admin,
+            json={"items": [{"product_id": str(sample_product.id), "quantity": 2}]},
+        )
+        assert response.status_code == 201
+        order = response.json()
+        assert len(order["items"]) == 1
+        assert order["items"][0]["created_at"]
+        assert order["created_at"]
+        # User, products, lot lock, INSERT order, INSERT item, UPDATE lot
+        assert int(response.headers[query_budget.QUERY_COUNT_HEADER]) == 6
+
+        response = client.post(
+            f"/api/v1/sales/orders/{order['id']}/complete",
+            headers=auth_headers_admin,
+            json={"payment_method": "cash", "paid_amount": 500},
+        )
+        assert response.status_code == 200
+        completed = response.json()
+        assert completed["status"] == "completed"
+        assert completed["updated_at"]
+        assert len(completed["items"]) == 1
+        # Order lock, items, lot lock, UPDATE order, UPDATE lot (user is cached)
+        assert int(response.headers[query_budget.QUERY_COUNT_HEADER]) == 5
+
+
+class TestLifecycle:
+    """Test startup warm-up and shutdown draining"""
+
+    def test_warm_pool_opens_connections(self, tmp_path):
+        """Warm-up leaves connections checked in and ready"""
+        engine = create_engine(
+            f"sqlite:///{tmp_path}/warm.db",
+            poolclass=db_metrics.InstrumentedQueuePool,
+            pool_size=3,
+            max_overflow=0,
+        )
+        assert lifecycle.warm_pool(engine, 5) == 3
+        assert engine.pool.checkedin() == 3
+        assert engine.pool.checkedout() == 0
+
+    def test_warm_pool_skips_null_pool(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path}/warm.db", poolclass=NullPool)
+        assert lifecycle.warm_pool(engine, 2) == 0
+
+    def test_wait_idle_times_out(self):
+        tracker = lifecycle.RequestTracker()
+        tracker.active = 1
+        assert asyncio.run(tracker.wait_idle(0.1)) is False
+        tracker.active = 0
+        assert asyncio.run(tracker.wait_idle(0.1)) is True
+
+    def test_draining_rejects_new_requests(self, client, auth_headers_admin):
+        """While draining, readiness fails and new work is refused"""
+        lifecycle.tracker.start_draining()
+        try:
+            response = client.get("/health/ready")
+            assert response.status_code == 503
+            assert response.json()["status"] == "draining"
+
+            response = client.get("/api/v1/inventory/products/", headers=auth_headers_admin)
+            assert response.status_code == 503
+            assert response.headers["retry-after"] == "1"
+
+            assert client.get("/health").status_code == 200
+        finally:
+            lifecycle.tracker.reset()
+
+    def test_sigterm_drains_before_server_shutdown(self, monkeypatch):
+        """SIGTERM flips readiness first; uvicorn shuts down once requests finish"""
+        monkeypatch.setattr(lifecycle, "DRAIN_POLL_SECONDS", 0.01)
+        server = lifecycle.DrainingServer(uvicorn.Config(app), drain_timeout=10)
+
+        async def scenario():
+            lifecycle.tracker.active = 1
+            server.handle_exit(signal.SIGTERM, None)
+            await asyncio.sleep(0.05)
+            assert lifecycle.tracker.draining
+            assert not server.should_exit
+
+            lifecycle.tracker.active = 0
+            await server.drain_task
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            lifecycle.tracker.reset()
+
+        assert server.should_exit
+        assert server.config.timeout_graceful_shutdown <= 10
+
+    def test_sigint_skips_drain(self):
+        server = lifecycle.DrainingServer(uvicorn.Config(app), drain_timeout=10)
+        server.handle_exit(signal.SIGINT, None)
+        assert server.should_exit
+        assert not lifecycle.tracker.draining
+
+    def test_shutdown_waits_for_in_flight_requests(self, db_session, monkeypatch):
+        """Engines are disposed only after in-flight requests finish"""
+        from app.main import _drain_and_dispose
+
+        events = []
+        monkeypatch.setattr(lifecycle, "DRAIN_POLL_SECONDS", 0.01)
+        monkeypatch.setattr(
+            "app.main.dispose_engine", lambda engine: events.append(("dispose", engine))
+        )
+
+        async def scenario():
+            lifecycle.tracker.active = 1
+
+            async def finish_request():
+                await asyncio.sleep(0.05)
+                events.append(("finished", None))
+                lifecycle.tracker.active = 0
+
+            await asyncio.gather(finish_request(), _drain_and_dispose())
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            lifecycle.tracker.reset()
+
+        assert events[0] == ("finished", None)
+        assert ("dispose", database.engine) in events
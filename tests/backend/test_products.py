@@ -1,6 +1,10 @@
 """
 Product Management Tests
 """
+import json
+import uuid
+from datetime import datetime
+
 import pytest
 
 
@@ -91,6 +95,663 @@ class TestProductCRUD:
         products = response.json()
         assert len(products) > 0
 
+    def test_get_product_by_barcode(self, client, auth_headers_admin, sample_product):
+        """Test exact barcode lookup used by the POS scanner"""
+        response = client.get(
+            f"/api/v1/inventory/products/barcode/{sample_product.barcode}",
+            headers=auth_headers_admin
+        )
+        assert response.status_code == 200
+        assert response.json()["sku"] == sample_product.sku
+
+    def test_get_product_by_unknown_barcode(self, client, auth_headers_admin, sample_product):
+        """Test barcode lookup for a code that does not exist"""
+        response = client.get(
+            "/api/v1/inventory/products/barcode/0000000000000",
+            headers=auth_headers_admin
+        )
+        assert response.status_code == 404
+
+
+class TestProductSearch:
+    """Ranked product search"""
+
+    @pytest.fixture
+    def search_products(self, db_session, sample_product):
+        from app.models.product import Product
+
+        products = [
+            Product(sku="PARA500", barcode="8850000000500", name_th="พาราเซตามอล 500",
+                    name_en="Paracetamol 500mg", cost_price=1, selling_price=2),
+            Product(sku="TEST001-B", barcode="8850000000999", name_th="ยาทดสอบ บี",
+                    name_en="Test Medicine B", cost_price=1, selling_price=2),
+            Product(sku="PCT_10", barcode="8850000000010", name_th="ยา 10%",
+                    name_en="Percent 10", cost_price=1, selling_price=2),
+        ]
+        db_session.add_all(products)
+        db_session.commit()
+        return products
+
+    def test_exact_sku_ranked_first(self, client, auth_headers_admin, search_products):
+        response = client.get(
+            "/api/v1/inventory/products/search",
+            headers=auth_headers_admin,
+            params={"q": "TEST001"}
+        )
+        assert response.status_code == 200
+        skus = [p["sku"] for p in response.json()]
+        assert skus == ["TEST001", "TEST001-B"]
+
+    def test_exact_barcode_ranked_first_in_list(
+        self, client, auth_headers_admin, search_products
+    ):
+        response = client.get(
+            "/api/v1/inventory/products/",
+            headers=auth_headers_admin,
+            params={"search": "8850000000999"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 1
+        assert data["items"][0]["sku"] == "TEST001-B"
+
+    def test_like_wildcards_are_literal(self, client, auth_headers_admin, search_products):
+        for q, expected in (("_", ["PCT_10"]), ("10%", ["PCT_10"])):
+            response = client.get(
+                "/api/v1/inventory/products/search",
+                headers=auth_headers_admin,
+                params={"q": q}
+            )
+            assert [p["sku"] for p in response.json()] == expected
+
+    def test_postgres_query_ranks_by_similarity(self):
+        from sqlalchemy import select
+        from sqlalchemy.dialects import postgresql
+
+        from app.models.product import Product
+        from app.services.product_search import apply_search
+
+        sql = str(
+            apply_search(select(Product.id), "parac", "postgresql").compile(
+                dialect=postgresql.dialect()
+            )
+        )
+        assert "word_similarity" in sql
+        assert "%%>" in sql
+
+        # Too short for trigrams: plain substring match only
+        sql = str(
+            apply_search(select(Product.id), "pa", "postgresql").compile(
+                dialect=postgresql.dialect()
+            )
+        )
+        assert "%%>" not in sql
+
+
+class TestProductCodeLookup:
+    """Exact barcode/SKU scans served from the in-process index"""
+
+    def _scan(self, client, headers, code):
+        return client.get(f"/api/v1/inventory/products/barcode/{code}", headers=headers)
+
+    def test_scan_by_barcode_and_sku(self, client, auth_headers_admin, sample_product):
+        for code in (sample_product.barcode, sample_product.sku):
+            response = self._scan(client, auth_headers_admin, code)
+            assert response.status_code == 200
+            data = response.json()
+            assert data["id"] == str(sample_product.id)
+            assert data["sku"] == "TEST001"
+            assert float(data["selling_price"]) == 100.00
+
+    def test_repeat_scan_needs_no_query(self, client, auth_headers_admin, sample_product):
+        from app.core.query_budget import QUERY_COUNT_HEADER
+
+        assert self._scan(client, auth_headers_admin, sample_product.barcode).status_code == 200
+        response = self._scan(client, auth_headers_admin, sample_product.barcode)
+        assert response.status_code == 200
+        assert response.headers[QUERY_COUNT_HEADER] == "0"
+
+    def test_writes_update_the_index(self, client, auth_headers_admin, sample_product):
+        assert self._scan(client, auth_headers_admin, sample_product.sku).status_code == 200
+
+        client.put(
+            f"/api/v1/inventory/products/{sample_product.id}",
+            headers=auth_headers_admin,
+            json={"selling_price": 80.00}
+        )
+        response = self._scan(client, auth_headers_admin, sample_product.sku)
+        assert float(response.json()["selling_price"]) == 80.00
+
+        client.delete(f"/api/v1/inventory/products/{sample_product.id}", headers=auth_headers_admin)
+        assert self._scan(client, auth_headers_admin, sample_product.sku).status_code == 404
+
+    def test_unknown_code(self, client, auth_headers_admin, sample_product):
+        assert self._scan(client, auth_headers_admin, "0000000000000").status_code == 404
+
+
+class TestNgramSearch:
+    """In-process n-gram search over Thai and English product names"""
+
+    def _product(self, sku, name_th, name_en=None, **fields):
+        from app.models.product import Product
+
+        # Column defaults only apply on INSERT; these products are never saved
+        defaults = dict(
+            cost_price=1, selling_price=2, is_vat_applicable=True, vat_rate=7,
+            vat_category="standard", unit_of_measure="unit", minimum_stock=0,
+            reorder_point=0, is_prescription_required=False, is_controlled_substance=False,
+        )
+        return Product(
+            id=uuid.uuid4(), sku=sku, name_th=name_th, name_en=name_en, is_active=True,
+            created_at=datetime(2026, 1, 1), **{**defaults, **fields}
+        )
+
+    def _skus(self, bodies):
+        return [json.loads(body)["sku"] for body in bodies]
+
+    def test_partial_thai_name_ranks_best_match_first(self):
+        from app.services.ngram_search import NgramIndex
+
+        index = NgramIndex()
+        index.put(self._product("P1", "ยาแก้ปวดพาราเซตามอล", "Paracetamol"))
+        index.put(self._product("P2", "ยาแก้ไอน้ำดำ", "Cough syrup"))
+        index.put(self._product("P3", "ยาแก้แพ้", "Loratadine", active_ingredient="ลอราทาดีน"))
+
+        assert self._skus(index.search("พาราเซ", 10)) == ["P1"]
+        assert self._skus(index.search("แก้ไอ", 10)) == ["P2"]
+        assert self._skus(index.search("ลอราทา", 10)) == ["P3"]
+        assert self._skus(index.search("PARACET", 10)) == ["P1"]
+        assert index.search("ก", 10) == []
+
+    def test_updates_and_removals(self):
+        from app.services.ngram_search import NgramIndex
+
+        index = NgramIndex()
+        products = [self._product(f"P{i}", f"วิตามินซี {i}") for i in range(8)]
+        for product in products:
+            index.put(product)
+
+        # Renames supersede the old document; enough of them trigger compaction
+        for product in products[:4]:
+            product.name_th = "ยาหม่อง"
+            index.put(product)
+        products[4].is_active = False
+        index.put(products[4])
+
+        assert sorted(self._skus(index.search("วิตามิน", 10))) == ["P5", "P6", "P7"]
+        assert sorted(self._skus(index.search("หม่อง", 10))) == ["P0", "P1", "P2", "P3"]
+        assert index.live_count == 7
+
+    def test_ngram_search_endpoint(self, client, auth_headers_admin, sample_category):
+        response = client.post(
+            "/api/v1/inventory/products/",
+            headers=auth_headers_admin,
+            json={
+                "sku": "NG001",
+                "name_th": "ยาธาตุน้ำขาว",
+                "generic_name": "Mist. Carminative",
+                "cost_price": 10.0,
+                "selling_price": 35.0
+            }
+        )
+        assert response.status_code == 201
+
+        response = client.get(
+            "/api/v1/inventory/products/search/ngram",
+            headers=auth_headers_admin,
+            params={"q": "ธาตุน้ำ"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [p["sku"] for p in data] == ["NG001"]
+        assert float(data[0]["selling_price"]) == 35.0
+
+        # Same shape as the database search, which short queries fall back to
+        response = client.get(
+            "/api/v1/inventory/products/search",
+            headers=auth_headers_admin,
+            params={"q": "NG001"}
+        )
+        assert response.json() == data
+        response = client.get(
+            "/api/v1/inventory/products/search/ngram",
+            headers=auth_headers_admin,
+            params={"q": "N"}
+        )
+        assert response.json() == data
+
+        client.delete(f"/api/v1/inventory/products/{data[0]['id']}", headers=auth_headers_admin)
+        response = client.get(
+            "/api/v1/inventory/products/search/ngram",
+            headers=auth_headers_admin,
+            params={"q": "ธาตุน้ำ"}
+        )
+        assert response.json() == []
+
+
+class TestProductPagination:
+    """Keyset (cursor) pagination of the product list"""
+
+    @pytest.fixture
+    def many_products(self, db_session, sample_category):
+        from app.models.product import Product
+
+        products = [
+            Product(sku=f"PAGE{i:03d}", name_th=f"สินค้า {i}", category_id=sample_category.id,
+                    cost_price=1, selling_price=2)
+            for i in range(7)
+        ]
+        db_session.add_all(products)
+        db_session.commit()
+        return products
+
+    def test_walk_pages_by_cursor(self, client, auth_headers_admin, many_products):
+        seen, cursor = [], None
+        for _ in range(10):
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            response = client.get(
+                "/api/v1/inventory/products/", headers=auth_headers_admin, params=params
+            )
+            assert response.status_code == 200
+            data = response.json()
+            seen += [item["sku"] for item in data["items"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == sorted(p.sku for p in many_products)
+
+    def test_invalid_cursor(self, client, auth_headers_admin, many_products):
+        response = client.get(
+            "/api/v1/inventory/products/",
+            headers=auth_headers_admin,
+            params={"cursor": "not-a-cursor"},
+        )
+        assert response.status_code == 400
+
+    def test_cursor_from_another_list(self, client, auth_headers_admin, many_products):
+        from app.api.v1.endpoints.customers import CUSTOMER_KEYSET
+
+        foreign = CUSTOMER_KEYSET.cursor_for(type("Row", (), {"code": "C001"})())
+        response = client.get(
+            "/api/v1/inventory/products/",
+            headers=auth_headers_admin,
+            params={"cursor": foreign},
+        )
+        assert response.status_code == 400
+
+    def test_total_none_reports_has_more(self, client, auth_headers_admin, many_products):
+        url = "/api/v1/inventory/products/"
+        first = client.get(url, headers=auth_headers_admin, params={"limit": 6, "total": "none"})
+        assert first.status_code == 200
+        assert first.json()["total"] is None
+        assert len(first.json()["items"]) == 6
+        assert first.json()["has_more"] is True
+
+        last = client.get(url, headers=auth_headers_admin, params={"limit": 7, "total": "none"})
+        assert last.json()["has_more"] is False
+        assert last.json()["next_cursor"] is None
+
+    def test_total_estimate_is_cached(self, client, auth_headers_admin, many_products):
+        from app.core.pagination import count_estimates
+
+        url = "/api/v1/inventory/products/"
+        hits = count_estimates.value(source="cache")
+        first = client.get(url, headers=auth_headers_admin, params={"total": "estimate"})
+        assert first.json()["total"] == 7
+
+        second = client.get(url, headers=auth_headers_admin, params={"total": "estimate"})
+        assert second.json()["total"] == 7
+        assert count_estimates.value(source="cache") == hits + 1
+
+    def test_planner_estimate_binds_in_lists(self, db_session):
+        """EXPLAIN of a query filtered by an IN list compiles like the query itself"""
+        from sqlalchemy.dialects import postgresql
+
+        from app.core.pagination import ExplainJSON
+        from app.models.product import DrugType, Product
+
+        ids = [uuid.uuid4(), uuid.uuid4()]
+        query = db_session.query(Product).filter(
+            Product.id.in_(ids), Product.drug_type.in_([DrugType.OTC, DrugType.CONTROLLED])
+        )
+        compiled = ExplainJSON(query.statement).compile(
+            dialect=postgresql.psycopg2.dialect(), compile_kwargs={"render_postcompile": True}
+        )
+        sql = str(compiled)
+        assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT")
+        assert "POSTCOMPILE" not in sql
+        assert sorted(value for value in compiled.params.values() if value in ids) == sorted(ids)
+        assert {value for value in compiled.params.values() if isinstance(value, DrugType)} == {
+            DrugType.OTC, DrugType.CONTROLLED
+        }
+
+    def test_unknown_total_mode(self, client, auth_headers_admin, many_products):
+        response = client.get(
+            "/api/v1/inventory/products/", headers=auth_headers_admin, params={"total": "maybe"}
+        )
+        assert response.status_code == 422
+
+
+class TestConditionalGet:
+    """ETags and 304 responses for the product list"""
+
+    URL = "/api/v1/inventory/products/"
+
+    def test_not_modified_without_query(self, client, auth_headers_admin, sample_product):
+        from app.core.query_budget import QUERY_COUNT_HEADER
+
+        first = client.get(self.URL, headers=auth_headers_admin)
+        etag = first.headers["ETag"]
+
+        response = client.get(self.URL, headers={**auth_headers_admin, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        assert response.headers[QUERY_COUNT_HEADER] == "0"
+
+    def test_write_changes_etag(self, client, auth_headers_admin, sample_product):
+        etag = client.get(self.URL, headers=auth_headers_admin).headers["ETag"]
+        client.put(
+            f"/api/v1/inventory/products/{sample_product.id}",
+            headers=auth_headers_admin,
+            json={"selling_price": 80.00}
+        )
+
+        response = client.get(self.URL, headers={**auth_headers_admin, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert float(response.json()["items"][0]["selling_price"]) == 80.00
+
+    def test_etag_depends_on_query(self, client, auth_headers_admin, sample_product):
+        etag = client.get(self.URL, headers=auth_headers_admin).headers["ETag"]
+        response = client.get(
+            self.URL,
+            headers={**auth_headers_admin, "If-None-Match": etag},
+            params={"limit": 1},
+        )
+        assert response.status_code == 200
+
+    def test_auth_checked_before_not_modified(self, client, auth_headers_admin, sample_product):
+        etag = client.get(self.URL, headers=auth_headers_admin).headers["ETag"]
+        response = client.get(self.URL, headers={"If-None-Match": etag})
+        assert response.status_code == 401
+
+
+class TestProductImport:
+    """Bulk product import from CSV and XLSX"""
+
+    URL = "/api/v1/inventory/products/import"
+
+    def _upload(self, client, headers, content, filename="products.csv"):
+        return client.post(self.URL, headers=headers, files={"file": (filename, content)})
+
+    def test_csv_import_reports_bad_rows(self, client, auth_headers_admin, sample_product):
+        content = (
+            "sku,barcode,name_th,selling_price,drug_type\n"
+            "IMP001,8850000100001,ยานำเข้า 1,25.50,otc\n"
+            "IMP002,,ยานำเข้า 2,abc,otc\n"
+            "TEST001,,ซ้ำกับสินค้าเดิม,10,otc\n"
+            "IMP003,8850000100001,บาร์โค้ดซ้ำ,10,otc\n"
+            "IMP004,,ประเภทผิด,10,herbal\n"
+            "IMP005,,ยานำเข้า 5,12,prescription\n"
+        ).encode()
+        response = self._upload(client, auth_headers_admin, content)
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["rows"], data["created"], data["failed"]) == (6, 2, 4)
+        assert [error["row"] for error in data["errors"]] == [3, 4, 5, 6]
+        assert "selling_price" in data["errors"][0]["message"]
+        assert "already exists" in data["errors"][1]["message"]
+        assert "earlier in the file" in data["errors"][2]["message"]
+
+        listed = client.get(
+            "/api/v1/inventory/products/", headers=auth_headers_admin, params={"search": "IMP"}
+        ).json()
+        assert sorted(item["sku"] for item in listed["items"]) == ["IMP001", "IMP005"]
+        assert float(listed["items"][0]["selling_price"]) == 25.50
+
+    def test_xlsx_import(self, client, auth_headers_admin, sample_category):
+        from io import BytesIO
+
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["sku", "barcode", "name_th", "category_id", "cost_price"])
+        sheet.append(["XLS001", 8850000200001, "ยาจากเอ็กเซล", str(sample_category.id), 7.25])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        response = self._upload(client, auth_headers_admin, buffer.getvalue(), "products.xlsx")
+        assert response.status_code == 200
+        assert response.json()["created"] == 1
+
+        scan = client.get(
+            "/api/v1/inventory/products/barcode/8850000200001", headers=auth_headers_admin
+        )
+        assert scan.json()["sku"] == "XLS001"
+
+    def test_copy_only_through_psycopg2(self, db_session):
+        """COPY needs psycopg2; other databases and drivers insert in batches"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import Session
+
+        from app.services.product_import import ProductImporter
+
+        engine = create_engine("postgresql+psycopg2://pharmacy_user@localhost/pharmacy_db")
+        assert ProductImporter(Session(engine)).use_copy is True
+        assert ProductImporter(db_session).use_copy is False
+
+    def test_rows_lost_to_another_writer_are_reported(
+        self, client, auth_headers_admin, sample_product, monkeypatch
+    ):
+        """A SKU created after the duplicate check fails its row, not the import"""
+        from app.services import product_import
+
+        # The duplicate check runs before TEST001 exists, as in a race
+        monkeypatch.setattr(product_import.ProductImporter, "_existing", lambda *args: set())
+        monkeypatch.setattr(product_import, "MAX_REPORTED_ERRORS", 1)
+        content = (
+            "sku,name_th,drug_type\n"
+            "TEST001,ซ้ำกับสินค้าเดิม,otc\n"
+            "IMP101,ประเภทผิด,herbal\n"
+            "IMP102,ยานำเข้า,otc\n"
+        ).encode()
+        response = self._upload(client, auth_headers_admin, content)
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["rows"], data["created"], data["failed"]) == (3, 1, 2)
+        assert [error["row"] for error in data["errors"]] == [2]
+        assert "another user" in data["errors"][0]["message"]
+
+    def test_missing_required_column(self, client, auth_headers_admin):
+        response = self._upload(client, auth_headers_admin, b"sku,name_en\nX1,Test\n")
+        assert response.status_code == 400
+        assert "name_th" in response.json()["detail"]
+
+    def test_requires_manager(self, client, auth_headers_cashier):
+        response = self._upload(client, auth_headers_cashier, b"sku,name_th\nX1,Test\n")
+        assert response.status_code == 403
+
+
+class TestBulkReprice:
+    """Set-based repricing"""
+
+    URL = "/api/v1/inventory/products/reprice"
+
+    @pytest.fixture
+    def priced_products(self, db_session, sample_category):
+        from decimal import Decimal
+
+        from app.models.product import Product
+
+        products = [
+            Product(sku="RP001", name_th="ยา 1", category_id=sample_category.id,
+                    manufacturer="GPO", cost_price=Decimal("10.00"),
+                    selling_price=Decimal("20.00")),
+            Product(sku="RP002", name_th="ยา 2", category_id=sample_category.id,
+                    manufacturer="GPO", cost_price=Decimal("3.33"),
+                    selling_price=Decimal("5.55")),
+            Product(sku="RP003", name_th="ยา 3", manufacturer="Other",
+                    cost_price=Decimal("1.00"), selling_price=Decimal("2.00")),
+        ]
+        db_session.add_all(products)
+        db_session.commit()
+        return products
+
+    def _prices(self, client, headers):
+        items = client.get(
+            "/api/v1/inventory/products/", headers=headers, params={"search": "RP"}
+        ).json()["items"]
+        return {item["sku"]: float(item["selling_price"]) for item in items}
+
+    def test_dry_run_changes_nothing(self, client, auth_headers_admin, priced_products):
+        response = client.post(
+            self.URL,
+            headers=auth_headers_admin,
+            json={"manufacturer": "GPO", "operation": "percent_change", "value": 10,
+                  "dry_run": True},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["dry_run"] is True
+        assert data["matched"] == 2
+        assert [float(item["selling_price"]) for item in data["items"]] == [22.00, 6.11]
+        assert self._prices(client, auth_headers_admin) == {
+            "RP001": 20.00, "RP002": 5.55, "RP003": 2.00
+        }
+
+    def test_percent_change(self, client, auth_headers_admin, priced_products):
+        url = "/api/v1/inventory/products/"
+        etag = client.get(url, headers=auth_headers_admin).headers["ETag"]
+        scan = client.get(f"{url}barcode/RP001", headers=auth_headers_admin)
+        assert float(scan.json()["selling_price"]) == 20.00
+
+        response = client.post(
+            self.URL,
+            headers=auth_headers_admin,
+            json={"category_id": str(priced_products[0].category_id),
+                  "operation": "percent_change", "value": 10},
+        )
+        data = response.json()
+        assert data["matched"] == 2
+        assert [float(item["old_selling_price"]) for item in data["items"]] == [20.00, 5.55]
+        assert self._prices(client, auth_headers_admin) == {
+            "RP001": 22.00, "RP002": 6.11, "RP003": 2.00
+        }
+        scan = client.get(f"{url}barcode/RP001", headers=auth_headers_admin)
+        assert float(scan.json()["selling_price"]) == 22.00
+        assert client.get(url, headers=auth_headers_admin).headers["ETag"] != etag
+
+    def test_margin_over_cost_and_vat(self, client, auth_headers_admin, priced_products):
+        ids = [str(priced_products[0].id), str(priced_products[2].id)]
+        response = client.post(
+            self.URL,
+            headers=auth_headers_admin,
+            json={"product_ids": ids, "operation": "margin_over_cost", "value": 50},
+        )
+        assert response.json()["matched"] == 2
+        assert self._prices(client, auth_headers_admin) == {
+            "RP001": 15.00, "RP002": 5.55, "RP003": 1.50
+        }
+
+        response = client.post(
+            self.URL,
+            headers=auth_headers_admin,
+            json={"product_ids": ids, "operation": "set_vat", "vat_category": "exempt",
+                  "vat_rate": 0},
+        )
+        items = response.json()["items"]
+        assert [(item["vat_category"], float(item["vat_rate"])) for item in items] == [
+            ("exempt", 0.0), ("exempt", 0.0)
+        ]
+
+    def test_margin_over_cost_skips_products_without_cost(
+        self, client, auth_headers_admin, priced_products, db_session
+    ):
+        from decimal import Decimal
+
+        from app.models.product import Product
+
+        db_session.add(Product(sku="RP004", name_th="ยา 4", manufacturer="GPO",
+                               selling_price=Decimal("9.00")))
+        db_session.commit()
+
+        for dry_run in (True, False):
+            response = client.post(
+                self.URL,
+                headers=auth_headers_admin,
+                json={"manufacturer": "GPO", "operation": "margin_over_cost", "value": 50,
+                      "dry_run": dry_run},
+            )
+            data = response.json()
+            assert (data["matched"], data["skipped"]) == (2, 1)
+            assert [item["sku"] for item in data["items"]] == ["RP001", "RP002"]
+        assert self._prices(client, auth_headers_admin)["RP004"] == 9.00
+
+    def test_requires_filter_and_value(self, client, auth_headers_admin, priced_products):
+        response = client.post(
+            self.URL, headers=auth_headers_admin, json={"operation": "set_price", "value": 1}
+        )
+        assert response.status_code == 422
+        response = client.post(
+            self.URL, headers=auth_headers_admin,
+            json={"manufacturer": "GPO", "operation": "set_price"},
+        )
+        assert response.status_code == 422
+        response = client.post(
+            self.URL, headers=auth_headers_admin,
+            json={"drug_type": "herbal", "operation": "set_price", "value": 1},
+        )
+        assert response.status_code == 422
+
+
+class TestProductChanges:
+    """Catalog feed for terminals"""
+
+    URL = "/api/v1/inventory/products/changes"
+
+    def _feed(self, client, headers, **params):
+        response = client.get(self.URL, headers=headers, params=params)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        header, *records = [json.loads(line) for line in response.text.splitlines()]
+        return header, {record["sku"]: record for record in records}
+
+    def test_snapshot_then_changes(self, client, auth_headers_admin, sample_product, db_session):
+        from app.models.product import Product
+
+        db_session.add(Product(sku="OLD001", name_th="เลิกขาย", is_active=False,
+                               cost_price=1, selling_price=2))
+        db_session.commit()
+
+        header, records = self._feed(client, auth_headers_admin)
+        assert header["snapshot"] is True
+        assert set(records) == {"TEST001"}
+        assert records["TEST001"]["is_active"] is True
+
+        client.put(
+            f"/api/v1/inventory/products/{sample_product.id}",
+            headers=auth_headers_admin,
+            json={"selling_price": 80.00}
+        )
+        header, records = self._feed(client, auth_headers_admin, since=header["watermark"])
+        assert header["snapshot"] is False
+        assert float(records["TEST001"]["selling_price"]) == 80.00
+
+        client.delete(f"/api/v1/inventory/products/{sample_product.id}", headers=auth_headers_admin)
+        _, records = self._feed(client, auth_headers_admin, since=header["watermark"])
+        assert records["TEST001"]["is_active"] is False
+
+    def test_nothing_changed_since(self, client, auth_headers_admin, sample_product):
+        _, records = self._feed(client, auth_headers_admin, since="2999-01-01T00:00:00")
+        assert records == {}
+
+    def test_invalid_watermark(self, client, auth_headers_admin):
+        response = client.get(self.URL, headers=auth_headers_admin, params={"since": "yesterday"})
+        assert response.status_code == 400
+
 
 class TestVATCalculations:
     """Test VAT calculations on products"""
@@ -30,6 +30,59 @@ class TestSalesOrder:
         expected_total = 200 * 1.07
         assert abs(float(data["total_amount"]) - expected_total) < 0.01
 
+    def test_create_sales_order_uppercase_product_id(self, client, auth_headers_admin, sample_product, sample_inventory_lot):
+        """Product ids are matched however the UUID is written"""
+        response = client.post(
+            "/api/v1/sales/orders/",
+            headers=auth_headers_admin,
+            json={
+                "items": [
+                    {
+                        "product_id": str(sample_product.id).upper(),
+                        "quantity": 1,
+                        "unit_price": 100.00
+                    }
+                ]
+            }
+        )
+        assert response.status_code in [200, 201]
+        assert response.json()["items"][0]["product_id"] == str(sample_product.id)
+
+    def test_create_sales_order_amounts_as_stored(self, client, auth_headers_admin, sample_product, sample_inventory_lot):
+        """Amounts in the response are rounded to the column scale, as the database stores them"""
+        response = client.post(
+            "/api/v1/sales/orders/",
+            headers=auth_headers_admin,
+            json={
+                "items": [
+                    {
+                        "product_id": str(sample_product.id),
+                        "quantity": 1,
+                        "unit_price": 10.55
+                    }
+                ]
+            }
+        )
+        assert response.status_code in [200, 201]
+        data = response.json()
+        # 10.55 * 7% = 0.7385
+        assert data["items"][0]["vat_amount"] == "0.74"
+        assert data["tax_amount"] == "0.74"
+        assert data["total_amount"] == "11.29"
+        assert data["tax_rate"] == "7.00"
+
+        complete_response = client.post(
+            f"/api/v1/sales/orders/{data['id']}/complete",
+            headers=auth_headers_admin,
+            json={
+                "payment_method": "cash",
+                "paid_amount": 20.005
+            }
+        )
+        assert complete_response.status_code == 200
+        assert complete_response.json()["paid_amount"] == "20.01"
+        assert complete_response.json()["change_amount"] == "8.72"
+
     def test_create_sales_order_mixed_vat(self, client, auth_headers_admin, sample_product, sample_inventory_lot, sample_category, sample_warehouse, db_session):
         """Test sales order with mixed VAT/Non-VAT items"""
         # Create non-VAT product